@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import shutil
+import argparse
+import time
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as cg
+from crossroadsdescription.tiling import TileScheduler, getTiles, splitLargeTiles, downloadGraph
+
+#
+# Configuration
+#
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Describe every crossroad of a large area (OSM file or bounding box), processing it tile by tile with a bounded memory. Crossroads on the borders of the tiles are described once, and all the descriptions are written to the same outputs.")
+parser.add_argument('-f', '--file', nargs=1, help='Describe the crossroads of this .osm file (possibly compressed in .bz2 or .gz, or .osm.pbf if pyosmium is installed)', type=str)
+parser.add_argument('--bbox', nargs=4, help='Describe the crossroads of this bounding box (north, south, east, west), downloaded tile by tile from the OSM api, or clip the file to it', type=float)
+parser.add_argument('-o', '--output', nargs='+', help='Output files (in the output folder), in text, JSON, GeoJSON, .ndjson or .geojsons format according to their extension (see main.py)', type=str, default=["area.ndjson"])
+parser.add_argument('--json-encoder', help='JSON encoder of the outputs : json (standard library) or orjson (faster, if installed, without spaces)', type=str, choices=["json", "orjson"], default=cg.json_encoder)
+parser.add_argument('--resume', help='Resume an interrupted run written to .ndjson or .geojsons files : crossroads already in the files are not written again', action='store_true')
+parser.add_argument('--tile-size', nargs=1, help='Size of the tiles, in meters (default %s)'%cg.area_tile_size, type=float, default=[cg.area_tile_size])
+parser.add_argument('--buffer', nargs=1, help='Margin loaded around each tile, in meters, larger than a crossroad (default %s)'%cg.area_tile_buffer, type=float, default=[cg.area_tile_buffer])
+parser.add_argument('--max-nodes', nargs=1, help='With a file, split the tiles having more nodes (default %s)'%cg.area_tile_max_nodes, type=int, default=[cg.area_tile_max_nodes])
+parser.add_argument('-w', '--workers', nargs=1, help='Number of tiles processed in parallel (default 1)', type=int, default=[1])
+parser.add_argument('--memory-limit', nargs=1, help='Memory a tile can use, in MB, on top of what it shares with the main process : a tile going over it is split in four (Linux only, no limit by default)', type=int)
+args = parser.parse_args()
+
+if not args.file and not args.bbox:
+    print("You need to give an OSM file or a bounding box.")
+    exit()
+
+# only streaming outputs can be resumed
+if args.resume and not all([cd.isResumable(path) for path in args.output]):
+    print("Only a run written to .ndjson or .geojsons files can be resumed.")
+    exit()
+
+if not args.resume:
+    shutil.rmtree("output", ignore_errors=True)
+shutil.os.makedirs("output", exist_ok=True)
+
+#
+# Tiles
+#
+
+# with a file, its network is read once and kept in the main process : the processes of the tiles share it
+start = time.perf_counter()
+if args.file:
+    with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        extract = cd.NetworkExtract(args.file[0])
+    print("%s : %s ways, %s nodes read in %.1f s"%(args.file[0], len(extract.ways), len(extract.nodes), time.perf_counter() - start))
+    bbox = args.bbox if args.bbox else extract.getBounds()
+    tiles = splitLargeTiles(getTiles(bbox, args.tile_size[0], args.buffer[0]), extract.countNodes, args.max_nodes[0])
+    loadGraph = extract.getGraph
+else:
+    tiles = getTiles(args.bbox, args.tile_size[0], args.buffer[0])
+    loadGraph = downloadGraph
+print("%s tiles"%len(tiles))
+
+#
+# Descriptions
+#
+
+outputs = cd.Outputs(["output/"+path for path in args.output], resume=args.resume, encoder=cd.getJSONEncoder(args.json_encoder))
+done = outputs.getDone()
+# tiles done, recorded once their crossroads are written, so that a resumed run skips them
+tiles_done = cd.NDJSONWriter("output/tiles_done.ndjson", key=lambda record: tuple(record["tile"]), resume=args.resume)
+if done or tiles_done.done:
+    print("Resuming : %s crossroads already described, %s tiles done"%(len(done), len(tiles_done.done)))
+
+scheduler = TileScheduler(loadGraph, outputs.getFormats(), args.workers[0], args.memory_limit[0] if args.memory_limit else None, done=tiles_done.done)
+for i, (tile, results, duration) in enumerate(scheduler.run(tiles)):
+    for key, coordinates, text, data, features in results:
+        if tuple(coordinates) not in done:
+            outputs.writeParts(coordinates, text, data, features)
+    tiles_done.write({"tile" : list(tile.getKey()), "crossroads" : len(results)})
+    print("Tile %s %s : %s crossroads in %.1f s"%(i + 1, tile, len(results), duration))
+outputs.close()
+tiles_done.close()
+
+print("%(crossroads)s crossroads described in %(tiles)s tiles (%(skipped)s already done, %(duplicates)s on tile borders, %(errors)s errors, %(split)s tiles split)"%scheduler.stats)
+print("Done in %.1f s"%(time.perf_counter() - start))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import osmnx as ox
+import crseg.segmentation as cs
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as config
+
+#
+# Configuration
+#
+
+FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark")
+FIXTURES = ["simple", "signalized", "islands", "roundabout", "dual_carriageway"]
+MODEL_STEPS = ["load_segmentation", "junctions", "ways", "context", "border_path", "branches", "sidewalks", "islands", "crossings"]
+TEXT_STEPS = ["text.introduction", "text.branches", "text.crossings"]
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Time each stage of the description of the crossroads of the benchmark fixtures (offline).")
+parser.add_argument('-f', '--fixtures', nargs='+', help='Fixtures to run (default all : %s), or paths of .osm files.'%", ".join(FIXTURES), type=str, default=FIXTURES)
+parser.add_argument('-n', '--repeat', nargs=1, help='Number of timed runs of each fixture (default 5).', type=int, default=[5])
+parser.add_argument('-w', '--warmup', nargs=1, help='Number of untimed runs of each fixture before timing it (default 1).', type=int, default=[1])
+parser.add_argument('-o', '--output', nargs=1, help='Output the results to this JSON file (default benchmark/results.json).', type=str, default=[os.path.join(FOLDER, "results.json")])
+parser.add_argument('-s', '--save-baseline', help='Also save the results as the baseline (benchmark/baseline.json, or the file given by -c).', action='store_true')
+parser.add_argument('-c', '--compare', nargs='?', help='Compare the results with a baseline (default benchmark/baseline.json). Exits with status 1 on regression.', type=str, const=os.path.join(FOLDER, "baseline.json"))
+parser.add_argument('-t', '--tolerance', nargs=1, help='Relative slowdown of the median of a stage flagged as a regression (default 0.2).', type=float, default=[0.2])
+parser.add_argument('-m', '--min-delta', nargs=1, help='Slowdowns under this duration, in milliseconds, are ignored (default 0.5).', type=float, default=[0.5])
+args = parser.parse_args()
+
+#
+# Benchmark
+#
+
+# Describe every crossroad of an .osm file, timing each stage
+# Returns : the durations of the stages in seconds, and the number of crossroads
+def runFixture(path):
+    durations = {}
+    def record(stage, duration):
+        durations[stage] = durations.get(stage, 0) + duration
+
+    start = time.perf_counter()
+    with cd.osmnxTags(config.way_tags_to_keep, config.node_tags_to_keep):
+        G = cd.graphFromFile(path)
+    record("load_graph", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    G = cs.Segmentation.prepare_network(G)
+    record("prepare_network", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    seg = cs.Segmentation(ox.utils_graph.get_undirected(G), **config.segmentation_parameters)
+    seg.process()
+    crossroads = cd.SegmentationReader(seg).data
+    record("segmentation", time.perf_counter() - start)
+
+    for i in range(len(crossroads)):
+        desc = cd.Description()
+        sink = cd.MemorySink()
+        desc.instrumentation = cd.Instrumentation(sink)
+
+        start = time.perf_counter()
+        desc.computeModel(G, crossroads, i)
+        record("computeModel", time.perf_counter() - start)
+        steps = sink.getDurations()
+        for step in MODEL_STEPS:
+            record("computeModel.%s"%step, steps.get(step, 0))
+        sink.clear()
+
+        start = time.perf_counter()
+        description = desc.generateDescription()
+        record("generateDescription", time.perf_counter() - start)
+        steps = sink.getDurations()
+        for step in TEXT_STEPS:
+            record("generateDescription.%s"%step[len("text."):], steps.get(step, 0))
+
+        start = time.perf_counter()
+        desc.descriptionToJSON(description["structure"])
+        record("descriptionToJSON", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        desc.getGeoJSON(description["structure"])
+        record("getGeoJSON", time.perf_counter() - start)
+
+    return durations, len(crossroads)
+
+# Statistics of the durations of a stage, in milliseconds
+def summarize(durations):
+    return {
+        "median" : statistics.median(durations)*1000,
+        "min" : min(durations)*1000,
+        "mean" : statistics.mean(durations)*1000,
+        "runs" : len(durations)
+    }
+
+results = {
+    "date" : time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "python" : platform.python_version(),
+    "platform" : platform.platform(),
+    "repeat" : args.repeat[0],
+    "fixtures" : {}
+}
+
+for fixture in args.fixtures:
+    path = fixture if fixture.endswith(".osm") else os.path.join(FOLDER, "fixtures", "%s.osm"%fixture)
+    name = os.path.splitext(os.path.basename(path))[0]
+
+    for i in range(args.warmup[0]):
+        runFixture(path)
+    runs = []
+    for i in range(args.repeat[0]):
+        durations, n_crossroads = runFixture(path)
+        runs.append(durations)
+
+    stages = {stage : summarize([run[stage] for run in runs]) for stage in runs[0]}
+    results["fixtures"][name] = {"crossroads" : n_crossroads, "stages" : stages}
+
+    print("%s (%s crossroads)"%(name, n_crossroads))
+    for stage, stats in stages.items():
+        print("  %-32s %10.3f ms (min %.3f ms)"%(stage, stats["median"], stats["min"]))
+
+with open(args.output[0], "w") as f:
+    json.dump(results, f, indent=2)
+print("Results written to %s"%args.output[0])
+
+#
+# Baseline
+#
+
+if args.save_baseline:
+    baseline_path = args.compare if args.compare else os.path.join(FOLDER, "baseline.json")
+    with open(baseline_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Baseline written to %s"%baseline_path)
+
+elif args.compare:
+    with open(args.compare) as f:
+        baseline = json.load(f)
+
+    # a stage regresses when its median is slower than the baseline by more than the tolerance and the minimum delta
+    regressions = []
+    print("Comparison with %s (%s)"%(args.compare, baseline["date"]))
+    for name, fixture in results["fixtures"].items():
+        if name not in baseline["fixtures"]:
+            print("%s : not in the baseline"%name)
+            continue
+        print(name)
+        for stage, stats in fixture["stages"].items():
+            if stage not in baseline["fixtures"][name]["stages"]:
+                continue
+            before = baseline["fixtures"][name]["stages"][stage]["median"]
+            after = stats["median"]
+            ratio = after/before if before > 0 else float("inf")
+            regression = after > before*(1 + args.tolerance[0]) and after - before > args.min_delta[0]
+            if regression:
+                regressions.append("%s %s"%(name, stage))
+            print("  %-32s %10.3f ms -> %10.3f ms  x%.2f%s"%(stage, before, after, ratio, "  REGRESSION" if regression else ""))
+
+    if regressions:
+        print("%s regression(s) : %s"%(len(regressions), ", ".join(regressions)))
+        sys.exit(1)
+    print("No regression")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# Generate the .osm extracts used by the benchmark. They are synthetic crossroads built around the coordinates of
+# https://www.openstreetmap.org/#map=19/45.77351/3.09015, tagged like OSM data, so that the benchmark runs offline.
+# The generated files are committed : this script only needs to be run again to change them.
+
+import math
+import os
+
+LATITUDE = 45.77351
+LONGITUDE = 3.09015
+
+CROSSWALK = {"highway" : "crossing", "crossing" : "uncontrolled", "tactile_paving" : "yes"}
+SIGNALIZED_CROSSWALK = {"highway" : "crossing", "crossing" : "traffic_signals", "tactile_paving" : "yes", "traffic_signals:sound" : "yes"}
+
+#
+# OSM extract
+#
+# Nodes are given in meters from the reference coordinates. Nodes at the same position are merged.
+#
+
+class Extract():
+
+    def __init__(self):
+        self.nodes = {}
+        self.node_ids = {}
+        self.ways = []
+
+    def node(self, x, y, **tags):
+        key = (round(x, 2), round(y, 2))
+        if key not in self.node_ids:
+            self.node_ids[key] = 1001 + len(self.node_ids)
+            latitude = LATITUDE + y/111320.0
+            longitude = LONGITUDE + x/(111320.0*math.cos(math.radians(LATITUDE)))
+            self.nodes[self.node_ids[key]] = (latitude, longitude, {})
+        node_id = self.node_ids[key]
+        self.nodes[node_id][2].update(tags)
+        return node_id
+
+    def way(self, points, **tags):
+        self.ways.append(([self.node(*point) for point in points], tags))
+
+    def write(self, path):
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6" generator="crossroadsdescription benchmark">']
+        for node_id, (latitude, longitude, tags) in self.nodes.items():
+            if tags:
+                lines.append('  <node id="%d" visible="true" version="1" lat="%.7f" lon="%.7f">'%(node_id, latitude, longitude))
+                lines += ['    <tag k="%s" v="%s"/>'%(key, value) for key, value in tags.items()]
+                lines.append('  </node>')
+            else:
+                lines.append('  <node id="%d" visible="true" version="1" lat="%.7f" lon="%.7f"/>'%(node_id, latitude, longitude))
+        for i, (nodes, tags) in enumerate(self.ways):
+            lines.append('  <way id="%d" visible="true" version="1">'%(5001 + i))
+            lines += ['    <nd ref="%d"/>'%node_id for node_id in nodes]
+            lines += ['    <tag k="%s" v="%s"/>'%(key, value) for key, value in tags.items()]
+            lines.append('  </way>')
+        lines.append('</osm>')
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+# Points of a straight line every step meters, with the given stops (distances from start) added
+def line(start, end, step = 20, stops = []):
+    (x1, y1), (x2, y2) = start, end
+    length = math.hypot(x2 - x1, y2 - y1)
+    distances = set([0, length] + [d for d in stops if 0 < d < length])
+    d = step
+    while d < length - 1e-6:
+        distances.add(d)
+        d += step
+    return [(x1 + (x2 - x1)*d/length, y1 + (y2 - y1)*d/length) for d in sorted(distances)]
+
+#
+# Crossroads
+#
+
+# 4-way crossroad of two streets
+def simple(extract, signalized = False):
+    if signalized:
+        extract.node(0, 0, highway="traffic_signals")
+    for (dx, dy, name) in [(0, 1, "Rue Blatin"), (1, 0, "Avenue Carnot"), (0, -1, "Rue Blatin"), (-1, 0, "Avenue Carnot")]:
+        extract.node(dx*12, dy*12, **(SIGNALIZED_CROSSWALK if signalized else CROSSWALK))
+        tags = {"highway" : "residential", "name" : name}
+        if signalized:
+            tags.update({"lanes" : "3", "lanes:forward" : "1", "lanes:backward" : "2"})
+        else:
+            tags["lanes"] = "2"
+        extract.way([(0, 0), (dx*12, dy*12), (dx*40, dy*40), (dx*90, dy*90), (dx*180, dy*180)], **tags)
+
+# 4-way signalized crossroad
+def signalized(extract):
+    simple(extract, True)
+
+# two dual carriageways crossing each other : a central island, and branches crossed in two times
+def islands(extract, half_width = 7, crosswalk = 12):
+    stops = [200 - half_width - crosswalk, 200 - half_width, 200 + half_width, 200 + half_width + crosswalk]
+    extract.way(line((-200, half_width), (200, half_width), stops=stops), highway="primary", name="Boulevard Gergovia", oneway="yes", lanes="2")
+    extract.way(line((200, -half_width), (-200, -half_width), stops=stops), highway="primary", name="Boulevard Gergovia", oneway="yes", lanes="2")
+    extract.way(line((half_width, 200), (half_width, -200), stops=stops), highway="secondary", name="Avenue de la République", oneway="yes", lanes="2")
+    extract.way(line((-half_width, -200), (-half_width, 200), stops=stops), highway="secondary", name="Avenue de la République", oneway="yes", lanes="2")
+    for s in (-1, 1):
+        for t in (-1, 1):
+            extract.node(s*(half_width + crosswalk), t*half_width, **SIGNALIZED_CROSSWALK)
+            extract.node(t*half_width, s*(half_width + crosswalk), **SIGNALIZED_CROSSWALK)
+
+# roundabout with 4 branches
+def roundabout(extract, radius = 22, n = 12):
+    ring = [(radius*math.sin(2*math.pi*i/n), radius*math.cos(2*math.pi*i/n)) for i in range(n)]
+    extract.way(ring + [ring[0]], highway="primary", junction="roundabout", name="Place Delille", lanes="2")
+    names = ["Rue du Port", "Boulevard Trudaine", "Avenue Marx Dormoy", "Rue Ballainvilliers"]
+    for k, i in enumerate(range(0, n, 3)):
+        x, y = ring[i]
+        ux, uy = x/radius, y/radius
+        extract.node(x + ux*10, y + uy*10, **CROSSWALK)
+        extract.way([(x + ux*d, y + uy*d) for d in (0, 10, 40, 100, 180)], highway="secondary", name=names[k], lanes="2")
+
+# dual carriageway (two oneways 14 m apart) crossed by a two-way street
+def dual_carriageway(extract):
+    stops = [188, 212]
+    extract.way(line((-200, 7), (200, 7), stops=stops), highway="primary", name="Boulevard Gergovia", oneway="yes", lanes="2")
+    extract.way(line((200, -7), (-200, -7), stops=stops), highway="primary", name="Boulevard Gergovia", oneway="yes", lanes="2")
+    for x in (-12, 12):
+        extract.node(x, 7, **SIGNALIZED_CROSSWALK)
+        extract.node(x, -7, **SIGNALIZED_CROSSWALK)
+    extract.way([(0, -180), (0, -90), (0, -40), (0, -7), (0, 7), (0, 40), (0, 90), (0, 180)], highway="tertiary", name="Rue Fontgiève", lanes="2")
+
+FIXTURES = [simple, signalized, islands, roundabout, dual_carriageway]
+
+if __name__ == "__main__":
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for fixture in FIXTURES:
+        extract = Extract()
+        fixture(extract)
+        extract.write(os.path.join(folder, "%s.osm"%fixture.__name__))
+        print("%s.osm"%fixture.__name__)
@@ -49,4 +49,63 @@ node_tags_to_keep = [
     'kerb',
     #island informations
     'crossing:island'
-]
\ No newline at end of file
+]
+# OSM tiles cache (downloaded graphs, see tileCache.py)
+tile_cache_folder = 'tiles'
+# size of the tiles the coordinates are snapped to, in meters
+tile_size = 100
+# maximum size of the cache on disk, in bytes
+tile_cache_max_size = 500 * 1024 * 1024
+# time after which a tile is downloaded again, in seconds
+tile_cache_ttl = 7 * 24 * 3600
+
+# prepared graphs and segmentations cache (see segmentationCache.py)
+segmentation_cache_folder = 'segmentations'
+# maximum size of the cache on disk, in bytes
+segmentation_cache_max_size = 1024 * 1024 * 1024
+# time after which an entry is computed again, in seconds
+segmentation_cache_ttl = 7 * 24 * 3600
+
+# parameters of the crossroads segmentation (crseg)
+segmentation_parameters = {"C0" : 2, "C1" : 2, "C2" : 4, "max_cycle_elements" : 10}
+
+# island detection : "faces" (walk of the faces of the planar graph) or "cycle_basis" (minimum cycle basis, former algorithm)
+# both find the same islands, but number them differently : "cycle_basis" gives the island ids (left_island and
+# right_island of the GeoJSON output) of the former versions, on which the QGIS models join
+islands_algorithm = 'faces'
+
+# OSM files reader (see osmReader.py) : ways that are not read, being always removed by crseg when preparing the network
+ignored_highways = ['cycleway', 'path', 'pedestrian', 'steps']
+ignored_services = ['parking_aisle']
+
+# incremental updates (see updates.py) : tags read by crseg. A change of any other tag keeps the segmentation, so only
+# the description of the crossroads using the changed element is generated again.
+segmentation_node_tags = ['highway']
+segmentation_way_tags = ['highway', 'name', 'ref', 'oneway', 'junction', 'service', 'psv', 'footway', 'width', 'lanes', 'cycleway', 'cycleway:left', 'cycleway:right']
+# radius of the graph segmented again around a crossroad whose topology changed, in meters
+update_radius = 150
+# maximum distance from its coordinates to the center of a crossroad segmented again without any of its former nodes, in meters
+update_match_distance = 20
+
+# JSON encoder of the outputs : "json" (standard library) or "orjson" (faster, needs orjson)
+json_encoder = "json"
+
+# tiled processing of large areas (see tiling.py and area.py) : size of the tiles, in meters, and margin loaded around
+# each one, larger than a crossroad so that the crossroads whose center is in a tile are entirely in its graph
+area_tile_size = 1000
+area_tile_buffer = 150
+# tiles of an OSM file having more nodes (with their margin) are split
+area_tile_max_nodes = 20000
+
+# concurrent downloads (see prefetcher.py) : urls of the APIs, number of requests sent at the same time, maximum number of
+# requests per second to each API, and retries of a failed request, the first one after prefetch_backoff seconds, the
+# delay doubling at each retry
+osm_api_url = "https://www.openstreetmap.org/api/0.6"
+overpass_url = "https://overpass-api.de/api"
+prefetch_workers = 4
+prefetch_rate = {"osm" : 2, "overpass" : 1}
+prefetch_retries = 5
+prefetch_backoff = 1
+prefetch_timeout = 180
+# overlapping areas are merged into one request while it is smaller than this size, in meters
+prefetch_max_size = 1000
@@ -1,23 +1,74 @@
 from .model import *
 from .segmentationReader import *
 from .utils import *
-from pyrealb import *
-import networkx as nx
-from geojson import Point, LineString, Feature, FeatureCollection, dumps
+from .realization import *
+from .instrumentation import *
+from .writers import *
+from .osmReader import *
+from .renderer import *
+from .serialization import *
 
 class Description:
 
     def __init__(self):
 
         self.crossroad = None
-        Junction._junctions = {}
+        # junctions of the crossroad being computed, by node id. Owned by this description so that several descriptions can run concurrently.
+        self.junctions = {}
+        # Instrumentation recording the stages of the model computation and of the text generation as spans, if any
+        self.instrumentation = None
+        # elements of the last generated description, shared by the output formats
+        self.elements = None
 
-    def computeModel(self, G, segmentation_file):
+    #
+    # Compute the model of one crossroad of the segmentation
+    #
+    # Params :
+    #   G : osmnx graph
+    #   segmentation : path of the JSON file produced by crseg, its content already loaded, or the crseg Segmentation itself
+    #   crossroad : index of the crossroad in the segmentation
+    #   table : junction table of G, if any (see JunctionTable). Junctions are read from G otherwise.
+    #
+
+    def computeModel(self, G, segmentation, crossroad = 0, table = None):
+        self.startSteps(crossroad=crossroad)
+        seg_crossroads = SegmentationReader(segmentation).getCrossroads()
+        self.step("load_segmentation")
+        self.computeCrossroadModel(G, seg_crossroads[crossroad], table)
+
+    #
+    # Compute the model and the description of several crossroads sharing the same graph and segmentation
+    #
+    # Params :
+    #   G : osmnx graph, shared by every crossroad
+    #   segmentation : path of the JSON file produced by crseg, its content already loaded, or the crseg Segmentation itself
+    #   crossroads : indexes of the crossroads to describe in the segmentation. All the crossroads if None.
+    #   table : junction table of G, built once for all the crossroads if None
+    # Yields : the description of each crossroad, as returned by generateDescription. self.crossroad is the model of
+    # the yielded crossroad, so descriptionToJSON and getGeoJSON can be used before asking for the next one.
+    #
+
+    def computeModels(self, G, segmentation, crossroads = None, table = None):
+        self.startSteps(crossroad=None)
+        seg_crossroads = SegmentationReader(segmentation).getCrossroads()
+        self.step("load_segmentation")
+        if crossroads is None:
+            crossroads = range(len(seg_crossroads))
+        if table is None:
+            table = JunctionTable(G)
+            self.step("junction_table")
+        for crossroad in crossroads:
+            self.startSteps(crossroad=crossroad)
+            self.computeCrossroadModel(G, seg_crossroads[crossroad], table)
+            yield self.generateDescription()
+
+    def computeCrossroadModel(self, G, seg_crossroad, table = None):
         #
         # Model completion
         #
 
-        seg_crossroad = SegmentationReader(segmentation_file).getCrossroads()[0]
+        # junctions are shared by the ways of one crossroad only
+        self.junctions = {}
 
         # intersection center. Computed by mean coordinates, may use convex hull + centroid later
         crossroad_center = meanCoordinates(G, seg_crossroad.border_nodes)
@@ -27,28 +78,35 @@ class Description:
         crossroad_border_nodes = {}
         crossroad_external_nodes = {}
         for node_id in seg_crossroad.inner_nodes:
-            crossroad_inner_nodes[node_id] = createJunction(node_id, G.nodes[node_id])
+            crossroad_inner_nodes[node_id] = createJunction(node_id, G.nodes[node_id], self.junctions, table)
         for node_id in seg_crossroad.border_nodes:
-            crossroad_border_nodes[node_id] = createJunction(node_id, G.nodes[node_id])
+            crossroad_border_nodes[node_id] = createJunction(node_id, G.nodes[node_id], self.junctions, table)
         for branch in seg_crossroad.branches :
             for node_id in branch.border_nodes:
                 if node_id not in (list(crossroad_inner_nodes.keys()) + list(crossroad_border_nodes.keys())):
-                    crossroad_external_nodes[node_id] = createJunction(node_id, G.nodes[node_id])
+                    crossroad_external_nodes[node_id] = createJunction(node_id, G.nodes[node_id], self.junctions, table)
+
+        self.step("junctions")
 
         #crossroad edges creation
-        crossroad_edges = {}
+        crossroad_edges = EdgeIndex()
         for edge in seg_crossroad.edges_by_nodes:
-            edge_id = "%s%s"%(edge[0],edge[1])
-            crossroad_edges[edge_id] = createWay(edge, G)
+            crossroad_edges.add(edge[0], edge[1], createWay(edge, G, self.junctions, table=table))
         for branch in seg_crossroad.branches:
             for edge in branch.edges_by_nodes:
-                edge_id = "%s%s"%(edge[0],edge[1])
-                crossroad_edges[edge_id] = createWay(edge, G, seg_crossroad.border_nodes)    
+                crossroad_edges.add(edge[0], edge[1], createWay(edge, G, self.junctions, seg_crossroad.border_nodes, table))
+
+        self.step("ways")
+
+        # view of the crossroad and its branches, shared by the geometric computations below
+        context = CrossroadContext(G, crossroad_edges, crossroad_inner_nodes.keys(), crossroad_border_nodes.keys(), crossroad_external_nodes.keys())
+        self.step("context")
 
         # Get border path of the intersection, then keep only the border nodes (the external nodes of the branches)
-        border_path = getBorderPath(G, crossroad_inner_nodes, crossroad_border_nodes, crossroad_external_nodes, crossroad_edges)
-        external_nodes = [junction.id for junction in crossroad_external_nodes.values()] #list(dict.fromkeys(filter(lambda node : node in  list(crossroad_external_nodes.keys()), border_path)))
+        border_path = getBorderPath(context)
+        external_nodes = context.external_nodes
         branch_edges = getBranchesEdges(border_path, seg_crossroad.branches, external_nodes)
+        self.step("border_path")
 
         # create branches
         branches = {}
@@ -56,7 +114,7 @@ class Description:
             if not edge["branch_id"] in branches:
                 branches[edge["branch_id"]] = Branch(edge["branch_id"], None, None, None, [])
             branch = branches[edge["branch_id"]]
-            branch.ways.append(crossroad_edges[edge["edge_id"]])
+            branch.ways.append(crossroad_edges.get(*edge["edge"]))
 
         # add branches attributes
         min = None
@@ -69,7 +127,7 @@ class Description:
                 if way.junctions[0].id not in nodes : nodes.append(way.junctions[0].id)
                 if way.junctions[1].id not in nodes : nodes.append(way.junctions[1].id)
             # compute branch bearing
-            branch.angle = meanAngle(G, nodes, crossroad_center)
+            branch.angle = meanAngle(context, nodes, crossroad_center)
             if min is None: min,max = branch,branch
             if branch.angle < min.angle: min = branch
             if branch.angle > max.angle: max = branch
@@ -83,14 +141,16 @@ class Description:
         for i in range(len(branches)):
             branches[i].number = i + 1
 
+        self.step("branches")
+
         #
         # Sidewalks and islands generation
         #
 
-        sidewalk_paths = getSidewalks(border_path, branches, external_nodes)
+        sidewalk_paths = getSidewalks(context, border_path, branches)
 
-        # graph cleaning to remove edges that are not part of the crossroads
-        G = cleanGraph(G, crossroad_edges)
+        # only the edges of the crossroads are used from now on
+        G = context.graph
 
         # Get sidewalks
         sidewalks = []
@@ -101,15 +161,11 @@ class Description:
                 if j < len(sidewalk_path)-1:
                     n1 = sidewalk_path[j]
                     n2 = sidewalk_path[j+1]
-                    way = None
-                    ids = ["%s%s"%(n1,n2), "%s%s"%(n2,n1)]
-                    for id in ids:
-                        if id in crossroad_edges:
-                            way = crossroad_edges[id]
+                    way = crossroad_edges.get(n1, n2)
                     # if the way does not exist we create it (may not happen but sometimes it is)
                     if not way:
-                        way = createWay([n1,n2], G)
-                        crossroad_edges[id] = way
+                        way = createWay([n1,n2], G, self.junctions, table=table)
+                        crossroad_edges.add(n1, n2, way)
                     # if the sidewalk goes in the same direction as the way, it's the left sidewalk. Otherwise it's the right one.
                     if way.junctions[0].id == n1:
                         way.sidewalks[0] = sidewalk
@@ -117,16 +173,16 @@ class Description:
                         way.sidewalks[1] = sidewalk
                     # add pedestrian nodes to the crosswalks in the way
                     for junction in way.junctions:
-                        if "Crosswalk" in junction.type:
+                        if junction.has(CROSSWALK):
                             if sidewalk not in junction.pedestrian_nodes:
                                 junction.pedestrian_nodes.append(sidewalk)
 
+        self.step("sidewalks")
+
         # Get islands in the crossroads
         islands = []
-        for island_id, island_path in enumerate(getIslands(G, branches, crossroad_border_nodes)):
-            if not isPolygonClockwiseOrdered(island_path, G):
-                island_path = list(reversed(island_path))
-            # island is not closed by NetworkX, we close it
+        for island_id, island_path in enumerate(getIslands(context, branches)):
+            # island paths are clockwise but not closed, we close them
             island_path.append(island_path[0])
             island = Island(island_id)
             islands.append(island)
@@ -134,11 +190,7 @@ class Description:
                 if j < len(island_path)-1:
                     n1 = island_path[j]
                     n2 = island_path[j+1]
-                    way = None
-                    ids = ["%s%s"%(n1,n2), "%s%s"%(n2,n1)]
-                    for id in ids:
-                        if id in crossroad_edges:
-                            way = crossroad_edges[id]
+                    way = crossroad_edges.get(n1, n2)
                     if way:
                         if way.junctions[0].id == n1:
                             way.islands[1] = island
@@ -146,71 +198,19 @@ class Description:
                             way.islands[0] = island
                         # add pedestrian nodes to the crosswalks in the way
                         for junction in way.junctions:
-                            if "Crosswalk" in junction.type:
+                            if junction.has(CROSSWALK):
                                 if island not in junction.pedestrian_nodes:
                                     junction.pedestrian_nodes.append(island)
 
+        self.step("islands")
+
         #
         # Crossings creation
         #
 
-        crosswalks = Junction.getJunctions("Crosswalk")
-
-
-        # if two crosswalks share the same pedestrian nodes, choose the nearest to the crossroads
-        to_delete = []
-        for c1 in crosswalks:
-            for c2 in crosswalks:
-                if c1 != c2:
-                    if c1.pedestrian_nodes == c2.pedestrian_nodes or c1.pedestrian_nodes[::-1] == c2.pedestrian_nodes:
-                        if c1.id in [n.id for n in crossroad_border_nodes.values()]:
-                            to_delete.append(c2)
-        for d in to_delete: crosswalks.remove(d)
-
-        # create dual graph
-        pG = nx.Graph()
-        for crosswalk in crosswalks:
-            pG.add_edge(
-                "s%s"%crosswalk.pedestrian_nodes[0].id if isinstance(crosswalk.pedestrian_nodes[0], Sidewalk) else "i%s"%crosswalk.pedestrian_nodes[0].id, 
-                "s%s"%crosswalk.pedestrian_nodes[1].id if isinstance(crosswalk.pedestrian_nodes[1], Sidewalk) else "i%s"%crosswalk.pedestrian_nodes[1].id, 
-                crosswalk=crosswalk
-            )
-
-        # compute crossings
-        crossings = {}
-        for sidewalk_start in sidewalks:
-            for sidewalk_end in list(set(sidewalks) - set([sidewalk_start])):
-                try:
-                    crossing = nx.shortest_path(pG, "s%s"%sidewalk_start.id, "s%s"%sidewalk_end.id)
-                except: # this sidewalk can't be reached
-                    continue
-                crossing_id = ";".join(crossing)
-                if crossing_id.count("s") <= 2: # we keep paths that don't go through other sidewalks
-                    if crossing_id not in crossings.keys() and ";".join(crossing_id.split(";")[::-1]) not in crossings.keys():
-                        crosswalk_list = [pG[crossing[i]][crossing[i+1]]["crosswalk"] for i in range(len(crossing)-1)]
-                        crossings[crossing_id] = Crossing(crossing_id, crosswalk_list)
-
-        # attach crossings to a branch
-        for branch in branches:
-
-            # Retrieve branch sidewalks
-            branch_sidewalks = []
-            for items in [way.sidewalks for way in branch.ways]:
-                for sidewalk in items:
-                    if sidewalk is not None and sidewalk not in branch_sidewalks:
-                        branch_sidewalks.append(sidewalk)
-            
-            # Retrieve crossing sidewalks
-            for crossing in crossings.values():
-                crossing_sidewalks = []
-                for crosswalk in crossing.crosswalks:
-                    for pedestrian_node in crosswalk.pedestrian_nodes:
-                        if isinstance(pedestrian_node, Sidewalk):
-                            crossing_sidewalks.append(pedestrian_node)
-                # If the branch and the crossing share the same sidewalks, it's the branch's corssing
-                if branch_sidewalks == crossing_sidewalks or branch_sidewalks[::-1] == crossing_sidewalks:
-                    branch.set_crossing(crossing)
-                    break
+        crosswalks = Junction.getJunctions(self.junctions, CROSSWALK)
+        crossings = createCrossings(crosswalks, sidewalks, branches, crossroad_border_nodes)
+        self.step("crossings")
 
         #
         # Crossroad creation
@@ -221,6 +221,16 @@ class Description:
         self.crossroad.ways = crossroad_edges
         self.crossroad.crossings = crossings
 
+    # Start timing a sequence of steps, when instrumented
+    def startSteps(self, **attributes):
+        if self.instrumentation is not None:
+            self.instrumentation.start(**attributes)
+
+    # Record the end of a step, when instrumented
+    def step(self, name):
+        if self.instrumentation is not None:
+            self.instrumentation.step(name)
+
     #
     # Text generation
     #
@@ -229,15 +239,10 @@ class Description:
 
     def generateDescription(self):
 
-        # Load PyRealB french lexicon and add missing words
-        loadFr()
-        addToLexicon("pyramide", {"N":{"g":"f","tab":"n17"}})
-        addToLexicon("croisement", {"N":{"g":"m","tab":"n3"}})
-        addToLexicon("îlot", {"N":{"g":"m","tab":"n3"}})
-        addToLexicon("tourne-à-gauche", {"N":{"g":"m","tab":"n3"}})
-        addToLexicon("tourne-à-droite", {"N":{"g":"m","tab":"n3"}})
-        addToLexicon("entrant", {"A":{"tab":"n28"}})
-        addToLexicon("sortant", {"A":{"tab":"n28"}})
+        self.startSteps()
+
+        # Load PyRealB french lexicon (once per process)
+        loadLexicon()
 
         # if a branch does not have a name, we name it "rue qui n'a pas de nom"
         for branch in self.crossroad.branches:
@@ -249,19 +254,9 @@ class Description:
         streets = []
         for branch in self.crossroad.branches:
             if branch.street_name not in streets : streets.append(branch.street_name) 
-        s = CP(C("et"))
-        for street in streets:
-            s.add(
-                PP(
-                    P("de"), 
-                    NP(
-                        D("le"), 
-                        N(street[0]), 
-                        Q(street[1])
-                    )
-                )
-            )
+        s = realizeStreets(tuple([tuple(street) for street in streets]))
         general_desc = "Le carrefour à l'intersection %s est un carrefour à %s branches."%(s, len(self.crossroad.branches))
+        self.step("text.introduction")
 
         #
         # Branches description
@@ -271,25 +266,14 @@ class Description:
         for branch in self.crossroad.branches:
 
             # branch number
-            number = NO(branch.number).dOpt({"nat": True})
+            number = realizeNumber(branch.number)
 
             name = " ".join(branch.street_name)
             
             channels = []
             for way in branch.ways:
                 channels += way.channels
-            n_voies = PP(
-                P("de"),
-                NP(
-                    NO(len(channels)).dOpt({"nat": True}), 
-                    N("voie")
-                )
-            )
-            # temporary fix for pyrealb issue 4 (https://github.com/lapalme/pyrealb/issues/4)
-            if len(channels) == 8 : n_voies = "de huit voies"
-
-            channels_in_desc = CP(C("et"))
-            channels_out_desc = CP(C("et"))
+            n_voies = realizeLanesNumber(len(channels))
 
             # count number of channels per type
             channels_in = {}
@@ -307,39 +291,19 @@ class Description:
                     c[type] = 0
                 c[type] += 1
 
-            n = None
-            for type,n in channels_in.items():
-                channels_in_desc.add(
-                    NP(
-                        NO(n).dOpt({"nat": True}),
-                        N("voie"),
-                        PP(
-                            P("de"),
-                            N(tr(type))
-                        )
-                    )
-                )
+            # the plural of the direction follows the number of lanes of the last type
+            channels_in_desc = realizeChannels(tuple(channels_in.items()))
             if channels_in:
                 word = "entrante"
                 
-                if n > 1:
+                if list(channels_in.values())[-1] > 1:
                     word += "s"
                 channels_in_desc = "%s %s"%(channels_in_desc, word)
 
-            for type,n in channels_out.items():
-                channels_out_desc.add(
-                    NP(
-                        NO(n).dOpt({"nat": True}),
-                        N("voie"),
-                        PP(
-                            P("de"),
-                            N(tr(type))
-                        )
-                    )
-                )
+            channels_out_desc = realizeChannels(tuple(channels_out.items()))
             if channels_out:
                 word = "sortante"
-                if n > 1:
+                if list(channels_out.values())[-1] > 1:
                     word += "s"
                 channels_out_desc = "%s %s"%(channels_out_desc, word)
 
@@ -361,6 +325,8 @@ class Description:
             
             branches_desc.append(branch_desc)
 
+        self.step("text.branches")
+
         #
         # Traffic light cycle
         # right turn on red are barely modelized in OSM, see https://wiki.openstreetmap.org/w/index.php?title=Red_turn&oldid=2182526
@@ -381,7 +347,7 @@ class Description:
 
         for branch in self.crossroad.branches:
 
-            number = NO(branch.number).dOpt({"nat": True})
+            number = realizeNumber(branch.number)
 
             name = " ".join(branch.street_name)
             crosswalks = branch.crossing.crosswalks if branch.crossing is not None else []
@@ -389,7 +355,7 @@ class Description:
             crossing_desc = ""
             if len(crosswalks):
 
-                n_crosswalks = NP(NO(len(crosswalks)).dOpt({"nat": True})).g("f") # followed by "fois", which is f.
+                n_crosswalks = realizeFeminineNumber(len(crosswalks)) # followed by "fois", which is f.
                 n_podotactile = 0
                 n_ptl = 0
                 n_ptl_sound = 0
@@ -399,7 +365,7 @@ class Description:
                         n_podotactile += 1
                     if crosswalk.cw_tactile_paving == "incorrect":
                         incorrect = True
-                    if "Pedestrian_traffic_light" in crosswalk.type:
+                    if crosswalk.has(PEDESTRIAN_TRAFFIC_LIGHT):
                         n_ptl += 1
                         if crosswalk.ptl_sound == "yes":
                             n_ptl_sound += 1
@@ -424,6 +390,8 @@ class Description:
                 
             crossings_desc.append("La branche numéro %s %s. %s"%(number, "se traverse en %s fois"%n_crosswalks if len(crosswalks) else "ne se traverse pas", crossing_desc))
 
+        self.step("text.crossings")
+
         #
         # Print description
         #
@@ -450,155 +418,29 @@ class Description:
     # Returns : the JSON as a string
 
     def descriptionToJSON(self, description_structure):
+        return(json.dumps(self.getJSONData(description_structure), ensure_ascii=False))
 
-        data = {}
-        general_desc = description_structure["general_desc"]
-        branches_desc = description_structure["branches_desc"]
-        crossings_desc = description_structure["crossings_desc"]
-        branches = self.crossroad.branches
-        junctions = self.crossroad.junctions
-        
-        data["introduction"] = general_desc
-        
-        data["branches"] = []
-        for (branch, branch_desc, crossing_desc) in zip(branches, branches_desc, crossings_desc):
-            crossing_desc = crossing_desc.split(" ")[4:]
-            crossing_desc.insert(0, "Elle")
-            nodes = []
-            for way in branch.ways:
-                nodes.append([junction.id for junction in way.junctions])
-            data["branches"].append({
-                "nodes" : nodes,
-                "text" : branch_desc + " " + " ".join(crossing_desc),
-                "tags" : {
-                    "auto" : "yes"
-                }
-            })
-        
-        crosswalks = []
-        for junction in junctions.values():
-            if "Crosswalk" in junction.type:
-                crosswalks.append(junction)
-
-        data["crossings"] = []
-        for crosswalk in crosswalks:
-            crosswalk_desc = "Le passage piéton "
-
-            if "Pedestrian_traffic_light" in crosswalk.type:
-                crosswalk_desc += "est protégé par un feu"
-                if crosswalk.ptl_sound == "yes":
-                    crosswalk_desc += " sonore. "
-                else :
-                    crosswalk_desc += ". "
-            else:
-                crosswalk_desc += "n'est pas protégé par un feu. "
-
-            if crosswalk.cw_tactile_paving == "yes":
-                crosswalk_desc += "Il y a des bandes d'éveil de vigilance."
-            elif crosswalk.cw_tactile_paving == "incorrect":
-                crosswalk_desc += "Il manque des bandes d'éveil de vigilance ou celles-ci sont dégradées."
-            else:
-                crosswalk_desc += "Il n'y a pas de bandes d'éveil de vigilance."
-
-            data["crossings"].append({
-                "node" : crosswalk.id,
-                "text" : crosswalk_desc,
-                "tags" : {
-                    "auto" : "yes"
-                }
-            })
-
-        return(json.dumps(data, ensure_ascii=False))
+    # Same as descriptionToJSON, the JSON being returned as a dict (for the streaming writers)
+    def getJSONData(self, description_structure):
+        return self.getElements(description_structure).getJSONData()
+
+    #
+    # Generate a GeoJSON of the crossroad elements and their descriptions
+    #
+    # Dependencies : the non-concatenated description
+    # Returns : the GeoJSON FeatureCollection as a string
+    #
 
     def getGeoJSON(self, description_structure):
-        features = []
-
-        # Crossroad general description
-        features.append(Feature(geometry=Point([self.crossroad.center["x"], self.crossroad.center["y"]]), properties={
-            "id" : None,
-            "type" : "crossroads",
-            "description" : description_structure["general_desc"]
-        }))
-
-        # Crossroad branch description
-        branches_ways = []
-        for (branch, branch_desc) in zip(self.crossroad.branches, description_structure["branches_desc"]):
-            for way in branch.ways:
-                n1 = way.junctions[0]
-                n2 = way.junctions[1]
-                features.append(Feature(geometry=LineString([(n1.x, n1.y), (n2.x, n2.y)]), properties={
-                    "id" : "%s;%s"%(n1.id, n2.id),
-                    "type" : "branch",
-                    "name" : "branch n°%s | %s"%(branch.number,way.name),
-                    "description" : branch_desc,
-                    "left_sidewalk" : way.sidewalks[0].id if way.sidewalks[0] else "",
-                    "right_sidewalk" : way.sidewalks[1].id if way.sidewalks[1] else "",
-                    "left_island" : way.islands[0].id if way.islands[0] else "",
-                    "right_island" : way.islands[1].id if way.islands[1] else ""
-                }))
-                branches_ways.append(way)
-        
-        # Crossroad ways
-        for way in self.crossroad.ways.values():
-            if way not in branches_ways:
-                n1 = way.junctions[0]
-                n2 = way.junctions[1]
-                features.append(Feature(geometry=LineString([(n1.x, n1.y), (n2.x, n2.y)]), properties={
-                    "id" : "%s;%s"%(n1.id, n2.id),
-                    "type" : "way",
-                    "name" : way.name,
-                    "left_sidewalk" : way.sidewalks[0].id if way.sidewalks[0] else "",
-                    "right_sidewalk" : way.sidewalks[1].id if way.sidewalks[1] else "",
-                    "left_island" : way.islands[0].id if way.islands[0] else "",
-                    "right_island" : way.islands[1].id if way.islands[1] else ""
-                }))
-
-        # Single crosswalks descriptions
-        crosswalks = []
-        for junction in self.crossroad.junctions.values():
-            if "Crosswalk" in junction.type:
-                crosswalks.append(junction)
-        for crosswalk in crosswalks:
-            crosswalk_desc = "Le passage piéton "
-
-            if "Pedestrian_traffic_light" in crosswalk.type:
-                crosswalk_desc += "est protégé par un feu"
-                if crosswalk.ptl_sound == "yes":
-                    crosswalk_desc += " sonore. "
-                else :
-                    crosswalk_desc += ". "
-            else:
-                crosswalk_desc += "n'est pas protégé par un feu. "
-
-            if crosswalk.cw_tactile_paving == "yes":
-                crosswalk_desc += "Il y a des bandes d'éveil de vigilance."
-            elif crosswalk.cw_tactile_paving == "incorrect":
-                crosswalk_desc += "Il manque des bandes d'éveil de vigilance ou celles-ci sont dégradées."
-            else:
-                crosswalk_desc += "Il n'y a pas de bandes d'éveil de vigilance."
-            features.append(Feature(geometry=Point([crosswalk.x, crosswalk.y]), properties={
-                "id" : crosswalk.id,
-                "type" : "crosswalk",
-                "description" : crosswalk_desc
-            }))
-
-        # Crossings description
-        for crossing, crossing_desc in zip([branch.crossing for branch in self.crossroad.branches], description_structure["crossings_desc"]):
-            if crossing is None:
-                continue
-            crosswalks = crossing.crosswalks
-            geom = None
-            id = None
-            if len(crosswalks) > 1:
-                id = ";".join(map(str,[crosswalks[i].id for i in range(len(crosswalks))]))
-                geom = LineString([(crosswalks[i].x, crosswalks[i].y) for i in range(len(crosswalks))])
-            else:
-                id = crosswalks[0].id
-                geom = Point([crosswalks[0].x, crosswalks[0].y])
-            features.append(Feature(geometry=geom, properties={
-                "id" : id,
-                "type" : "crossing",
-                "description" : crossing_desc
-            }))
-
-        return(dumps(FeatureCollection(features)))
\ No newline at end of file
+        return(json.dumps({"type" : "FeatureCollection", "features" : self.getFeatures(description_structure)}, ensure_ascii=False))
+
+    # Same as getGeoJSON, the features being returned as a list (for the streaming writers)
+    def getFeatures(self, description_structure):
+        return self.getElements(description_structure).getFeatures()
+
+    # Texts and geometries of the elements of the description, computed once for all the output formats (see
+    # DescriptionElements)
+    def getElements(self, description_structure):
+        if self.elements is None or self.elements.structure is not description_structure:
+            self.elements = DescriptionElements(self.crossroad, description_structure)
+        return self.elements
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+#
+# Instrumentation
+#
+# Named spans timing the stages of a computation. Each finished span is sent to a sink : an in-memory collector, a
+# JSON-lines file, or any object with a record(span) method. The attributes of the instrumentation (the crossroad being
+# described for instance) are copied into each span.
+#
+
+# offset between the performance counter and the epoch, so that spans can be dated
+_epoch_offset = time.time() - time.perf_counter()
+
+class Span():
+
+    __slots__ = ("name", "start", "duration", "attributes")
+
+    def __init__(self, name, start, duration, attributes):
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.attributes = attributes
+
+    # Returns : the span as a dict, dated in seconds since the epoch, its duration being in seconds
+    def toJSON(self):
+        data = {"name" : self.name, "start" : self.start + _epoch_offset, "duration" : self.duration}
+        data.update(self.attributes)
+        return data
+
+# Keeps the spans in memory
+class MemorySink():
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    # Sum of the durations of the spans by name, optionally only for the spans having the given attributes
+    def getDurations(self, **attributes):
+        durations = {}
+        with self.lock:
+            for span in self.spans:
+                if all(span.attributes.get(key) == value for key, value in attributes.items()):
+                    durations[span.name] = durations.get(span.name, 0) + span.duration
+        return durations
+
+    # Sum of the durations of the spans by name, for each value of an attribute (in order of appearance)
+    def getDurationsBy(self, attribute):
+        durations = {}
+        with self.lock:
+            for span in self.spans:
+                value = durations.setdefault(span.attributes.get(attribute), {})
+                value[span.name] = value.get(span.name, 0) + span.duration
+        return durations
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+
+# Writes each span as a line of JSON
+# Params :
+#   file : path of the file (its content is replaced) or file object
+class JSONLinesSink():
+
+    def __init__(self, file):
+        self.owned = isinstance(file, str)
+        self.file = open(file, "w") if self.owned else file
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        line = json.dumps(span.toJSON(), ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        if self.owned:
+            self.file.close()
+
+# Sends the spans to several sinks
+class MultiSink():
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def record(self, span):
+        for sink in self.sinks:
+            sink.record(span)
+
+# Format durations by name (in seconds) as a line of text
+def formatDurations(durations):
+    return ", ".join(["%s %.2f ms"%(name, duration*1000) for name, duration in durations.items()])
+
+class Instrumentation():
+
+    # Params :
+    #   sink : where the spans are recorded, a MemorySink if None
+    #   attributes : attributes of the spans
+    def __init__(self, sink = None, **attributes):
+        self.sink = sink if sink is not None else MemorySink()
+        self.attributes = attributes
+        self.mark = time.perf_counter()
+
+    # Start a sequence of steps, replacing the attributes of the spans if any are given
+    def start(self, **attributes):
+        if attributes:
+            self.attributes = attributes
+        self.mark = time.perf_counter()
+
+    # Record a span named after the step that ends now, started at the end of the previous step (or at start)
+    def step(self, name):
+        now = time.perf_counter()
+        self.sink.record(Span(name, self.mark, now - self.mark, dict(self.attributes)))
+        self.mark = now
+
+    # Record a span around a block of code
+    @contextmanager
+    def span(self, name, **attributes):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.sink.record(Span(name, start, now - start, {**self.attributes, **attributes}))
+            self.mark = now
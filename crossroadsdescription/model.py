@@ -1,4 +1,5 @@
 from .utils import *
+from collections import deque
 
 #
 # Pedestrian nodes
@@ -6,78 +7,116 @@ from .utils import *
 
 class PedestrianNode():
 
+    __slots__ = ("id",)
+
     def __init__(self, id):
         self.id = id
 
 class Sidewalk(PedestrianNode):
 
+    __slots__ = ()
+
     def __init__(self, id):
         PedestrianNode.__init__(self, id)
 
 class Island(PedestrianNode):
 
+    __slots__ = ()
+
     def __init__(self, id):
         PedestrianNode.__init__(self, id)
 
 #
 # Junctions
 #
-# Use the decorator design pattern, that enables having one class per concrete object with its own semantic attributes to create a complex junction
+# A junction is a compact record : its features (crosswalk, traffic lights) are the flags of an integer bitmask, and the
+# attributes of each feature are fields left to None when the junction does not have the feature
 
-# Abstract junction
-class AbstractJunction():
-    pass
+CROSSWALK = 1
+PEDESTRIAN_TRAFFIC_LIGHT = 2
+TRAFFIC_LIGHT = 4
 
-# Concrete junction
-class Junction(AbstractJunction):
+FEATURE_NAMES = {CROSSWALK : "Crosswalk", PEDESTRIAN_TRAFFIC_LIGHT : "Pedestrian_traffic_light", TRAFFIC_LIGHT : "Traffic_light"}
 
-    _junctions = {}
+class Junction():
 
-    def __init__(self, id, x, y):
-        super().__init__()
+    __slots__ = ("id", "x", "y", "features", "cw_tactile_paving", "pedestrian_nodes", "ptl_sound", "tl_direction")
+
+    def __init__(self, id, x, y, features = 0, cw_tactile_paving = None, ptl_sound = None, tl_direction = None):
         self.id = id
         self.x = x
         self.y = y
-        self.type = []
-
-    def getJunctions(type = None):
-        if type :
-            return list(filter(lambda junction: type in junction.type , Junction.getJunctions().values()))
-        return Junction._junctions
-
-# Junction decorator
-class JunctionDecorator(AbstractJunction):
-
-    _junction : AbstractJunction = None
-
-    def __init__(self, junction : AbstractJunction, attrs = {}):
-        self._junction = junction
-        self._junction.type.append(type(self).__name__)
-        for key in attrs:
-            setattr(self._junction, key, attrs[key])
-
-    def __getattr__(self, name):
-       return getattr(self._junction, name)
+        self.features = features
+        # crosswalk
+        self.cw_tactile_paving = cw_tactile_paving
+        self.pedestrian_nodes = [] if features & CROSSWALK else None
+        # pedestrian traffic light
+        self.ptl_sound = ptl_sound
+        # traffic light
+        self.tl_direction = tl_direction
+
+    def has(self, feature):
+        return self.features & feature != 0
+
+    # names of the features of the junction
+    @property
+    def type(self):
+        return [name for feature, name in FEATURE_NAMES.items() if self.features & feature]
+
+    # Get the junctions of a registry (junctions by node id), optionally filtered by feature
+    def getJunctions(junctions, feature = None):
+        if feature :
+            return [junction for junction in junctions.values() if junction.features & feature]
+        return junctions
 
-# Concrete decorators
-
-# Crosswalk decorator
-class Crosswalk(JunctionDecorator):
-
-    def __init__(self, decorated_junction, cw_tactile_paving):
-        super().__init__(decorated_junction, {'cw_tactile_paving' : cw_tactile_paving, 'pedestrian_nodes' : []})
-
-# Pedestrian traffic light decorator
-class Pedestrian_traffic_light(JunctionDecorator):
-
-    def __init__(self, decorated_junction, ptl_sound):
-        super().__init__(decorated_junction, {'ptl_sound' : ptl_sound})
-
-# Traffic light decorator
-class Traffic_light(JunctionDecorator):
-
-    def __init__(self, decorated_junction, tl_phase, tl_direction):
-        super().__init__(decorated_junction, {'tl_phase' : tl_phase, 'tl_direction' : tl_direction})
+#
+# Junction table
+#
+# Junctions of a whole graph stored by columns in numpy arrays, for batch runs holding many junctions. Values of the
+# string fields are stored as indices in a shared list of values.
+
+class JunctionTable():
+
+    def __init__(self, G):
+        self.values = [None]
+        value_codes = {None : 0}
+        def encode(value):
+            if value not in value_codes:
+                value_codes[value] = len(self.values)
+                self.values.append(value)
+            return value_codes[value]
+
+        rows = []
+        for node_id, node in G.nodes(data=True):
+            features, cw_tactile_paving, ptl_sound, tl_direction = getJunctionFeatures(node)
+            rows.append((node_id, node["x"], node["y"], features, encode(cw_tactile_paving), encode(ptl_sound), encode(tl_direction)))
+        rows.sort(key=operator.itemgetter(0))
+
+        columns = list(zip(*rows)) if rows else [[]] * 7
+        self.ids = np.array(columns[0], dtype=np.int64)
+        self.x = np.array(columns[1], dtype=np.float64)
+        self.y = np.array(columns[2], dtype=np.float64)
+        self.features = np.array(columns[3], dtype=np.uint8)
+        self.cw_tactile_paving = np.array(columns[4], dtype=np.uint16)
+        self.ptl_sound = np.array(columns[5], dtype=np.uint16)
+        self.tl_direction = np.array(columns[6], dtype=np.uint16)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        i = np.searchsorted(self.ids, node_id)
+        return i < len(self.ids) and self.ids[i] == node_id
+
+    # Create the junction record of a node
+    def getJunction(self, node_id):
+        i = np.searchsorted(self.ids, node_id)
+        if i == len(self.ids) or self.ids[i] != node_id:
+            raise KeyError(node_id)
+        return Junction(node_id, float(self.x[i]), float(self.y[i]), int(self.features[i]),
+            cw_tactile_paving = self.values[self.cw_tactile_paving[i]],
+            ptl_sound = self.values[self.ptl_sound[i]],
+            tl_direction = self.values[self.tl_direction[i]])
 
 #
 # Crossings
@@ -85,6 +124,8 @@ class Traffic_light(JunctionDecorator):
 
 class Crossing:
 
+    __slots__ = ("id", "crosswalks")
+
     def __init__(self, id, crosswalks = []):
         self.id = id
         self.crosswalks = crosswalks
@@ -95,27 +136,37 @@ class Crossing:
 
 class Channel():
 
+    __slots__ = ("id", "direction")
+
     def __init__(self, id, direction):
         self.id = id
         self.direction = direction
 
 class Road(Channel):
 
+    __slots__ = ()
+
     def __init__(self, id, direction):
         super().__init__(id, direction)
 
 class Bus(Channel):
 
+    __slots__ = ()
+
     def __init__(self, id, direction):
         super().__init__(id, direction)
 
 class Bicycle(Channel):
 
+    __slots__ = ()
+
     def __init__(self, id, direction):
         super().__init__(id, direction)
 
 class Way():
 
+    __slots__ = ("id", "name", "junctions", "channels", "sidewalks", "islands")
+
     def __init__(self, id, name, junctions : Junction, channels : Channel, sidewalks : Sidewalk, islands : Island):
         self.id = id
         self.name = name
@@ -130,6 +181,8 @@ class Way():
 
 class Branch():
 
+    __slots__ = ("id", "number", "angle", "direction_name", "street_name", "ways", "crossing")
+
     def __init__(self, id, angle, direction_name, street_name, ways : Way):
         self.id = id
         self.number = None
@@ -157,44 +210,46 @@ class Intersection():
 # Object creation function
 #
 
-def createCrosswalk(junction, node):
-    # Does it have a tactile paving ?
-    cw_tactile_paving = "no"
-    if "tactile_paving" in node:
-        cw_tactile_paving = node["tactile_paving"]
-    junction = Crosswalk(junction, cw_tactile_paving)
-    # Does it have a traffic light ?
-    if node["crossing"] == "traffic_signals":
-        ptl_sound = "no"
-        # Does it have sound ?
-        if "traffic_signals:sound" in node and node["traffic_signals:sound"] == "yes":
-            ptl_sound = "yes"
-        junction = Pedestrian_traffic_light(junction, ptl_sound)
-    return junction
-
-def createTrafficSignal(junction, node):
-    tl_direction = "forward"
-    if "traffic_signals:direction" in node:
-        tl_direction = node["traffic_signals:direction"]
-    junction = Traffic_light(junction, None, tl_direction)
-    return junction
-
-def createJunction(node_id, node):
+# Read the features of a junction in the tags of its node
+# Returns : the features bitmask, and the tactile paving, sound and direction of the features
+def getJunctionFeatures(node):
+    features = 0
+    cw_tactile_paving = None
+    ptl_sound = None
+    tl_direction = None
+
+    # is it a crosswalk ?
+    if "crossing" in node and node["crossing"] != "no":
+        features |= CROSSWALK
+        # Does it have a tactile paving ?
+        cw_tactile_paving = node["tactile_paving"] if "tactile_paving" in node else "no"
+        # Does it have a traffic light ?
+        if node["crossing"] == "traffic_signals":
+            features |= PEDESTRIAN_TRAFFIC_LIGHT
+            # Does it have sound ?
+            ptl_sound = "yes" if "traffic_signals:sound" in node and node["traffic_signals:sound"] == "yes" else "no"
+
+    # is it a traffic light ?
+    if "traffic_signals" in node:
+        features |= TRAFFIC_LIGHT
+        tl_direction = node["traffic_signals:direction"] if "traffic_signals:direction" in node else "forward"
+
+    return features, cw_tactile_paving, ptl_sound, tl_direction
+
+# junctions : registry of the junctions already created (junctions by node id), owned by the caller
+# table : junction table of the graph, if any, the junction being read from the node otherwise
+def createJunction(node_id, node, junctions, table = None):
     junction = None
-    if node_id in Junction._junctions.keys():
-        junction = Junction._junctions[node_id]
+    if node_id in junctions.keys():
+        junction = junctions[node_id]
     else :
-        junction = Junction(node_id, node["x"], node["y"])
-            
-        # is it a crosswalk ?
-        if "crossing" in node and node["crossing"] != "no":
-            junction = createCrosswalk(junction, node)
-
-        # is it a traffic light ?
-        if "traffic_signals" in node:
-            junction = createTrafficSignal(junction, node)
+        if table is not None:
+            junction = table.getJunction(node_id)
+        else:
+            features, cw_tactile_paving, ptl_sound, tl_direction = getJunctionFeatures(node)
+            junction = Junction(node_id, node["x"], node["y"], features, cw_tactile_paving = cw_tactile_paving, ptl_sound = ptl_sound, tl_direction = tl_direction)
 
-        Junction._junctions[node_id] = junction
+        junctions[node_id] = junction
 
     return junction
 
@@ -225,7 +280,7 @@ def createUndirectedLanes(edge, way, way_out):
         if edge["highway"]=="service" and "psv" in edge and edge["psv"]=="yes": type = "Bus"
         createLane(type, way, way_out)
 
-def createWay(edge, G, border_nodes=[]):
+def createWay(edge, G, junctions, border_nodes=[], table=None):
     n1 = edge[0]
     n2 = edge[1]
 
@@ -239,15 +294,14 @@ def createWay(edge, G, border_nodes=[]):
     # Note : access node attributes
     # ex. for x : G.nodes[n1].x
     # Junctions creation
-    junctions = []
+    way_junctions = []
     for node_id, node in [ [n1,G.nodes[n1]] , [n2,G.nodes[n2]] ]:
-        junctions.append(createJunction(node_id, node))
+        way_junctions.append(createJunction(node_id, node, junctions, table))
 
     # ways creation
-    # if an edge does not have a name, we set the name to None
-    if not "name" in edge:
-        edge["name"] = None
-    way = Way(edge["osmid"], edge["name"], junctions, channels = [], sidewalks=[None, None], islands=[None, None])
+    # if an edge does not have a name, we set the name to None (the graph is left untouched as it may be shared)
+    name = edge["name"] if "name" in edge else None
+    way = Way(edge["osmid"], name, way_junctions, channels = [], sidewalks=[None, None], islands=[None, None])
 
     # if n2 is a border node, it means the way is drawn as outgoing from the direction.
     way_out = None
@@ -267,4 +321,124 @@ def createWay(edge, G, border_nodes=[]):
         else:
             createLane("Road", way, way_out)
 
-    return way
\ No newline at end of file
+    return way
+
+#
+# Crossings computation
+#
+
+# Name of a pedestrian node in the pedestrian graph
+def getPedestrianNodeName(pedestrian_node):
+    return "s%s"%pedestrian_node.id if isinstance(pedestrian_node, Sidewalk) else "i%s"%pedestrian_node.id
+
+# Key of a sequence read in both directions
+def getUndirectedKey(sequence):
+    sequence = tuple(sequence)
+    return min(sequence, sequence[::-1])
+
+# Remove the crosswalks sharing the same pedestrian nodes as a crosswalk of the crossroad border (the nearest to the crossroad)
+def removeDuplicateCrosswalks(crosswalks, border_nodes):
+    crosswalks_by_nodes = {}
+    for crosswalk in crosswalks:
+        key = getUndirectedKey([getPedestrianNodeName(pedestrian_node) for pedestrian_node in crosswalk.pedestrian_nodes])
+        crosswalks_by_nodes.setdefault(key, []).append(crosswalk)
+
+    to_delete = set()
+    for duplicates in crosswalks_by_nodes.values():
+        if len(duplicates) > 1:
+            for c1 in duplicates:
+                if c1.id in border_nodes:
+                    to_delete.update(c2.id for c2 in duplicates if c2 is not c1)
+
+    return [crosswalk for crosswalk in crosswalks if crosswalk.id not in to_delete]
+
+# Dual graph of the crossroad : pedestrian nodes (sidewalks and islands) linked by the crosswalks
+def createPedestrianGraph(crosswalks):
+    import networkx as nx
+    pG = nx.Graph()
+    for crosswalk in crosswalks:
+        pG.add_edge(
+            getPedestrianNodeName(crosswalk.pedestrian_nodes[0]),
+            getPedestrianNodeName(crosswalk.pedestrian_nodes[1]),
+            crosswalk=crosswalk
+        )
+    return pG
+
+# Breadth-first search of the pedestrian graph from a sidewalk
+# Returns : the parent of each reached node in a shortest path, preferring paths that do not go through other sidewalks,
+# and whether the shortest paths to each node all go through other sidewalks
+def searchPedestrianGraph(pG, source):
+    parents = {source : None}
+    distances = {source : 0}
+    through_sidewalk = {source : False}
+    queue = deque([source])
+    while queue:
+        node = queue.popleft()
+        node_through_sidewalk = through_sidewalk[node] or (node != source and node[0] == "s")
+        for neighbor in pG.adj[node]:
+            if neighbor not in distances:
+                parents[neighbor] = node
+                distances[neighbor] = distances[node] + 1
+                through_sidewalk[neighbor] = node_through_sidewalk
+                queue.append(neighbor)
+            elif distances[neighbor] == distances[node] + 1 and through_sidewalk[neighbor] and not node_through_sidewalk:
+                parents[neighbor] = node
+                through_sidewalk[neighbor] = False
+    return parents, through_sidewalk
+
+# Compute the crossings, shortest paths between two sidewalks of the pedestrian graph that only go through islands, and
+# attach them to the branch having the same sidewalks
+# Params :
+#   crosswalks : crosswalks of the crossroad
+#   sidewalks : sidewalks of the crossroad
+#   branches : branches of the crossroad
+#   border_nodes : ids of the crossroad border nodes
+# Returns : the crossings by id
+def createCrossings(crosswalks, sidewalks, branches, border_nodes):
+    pG = createPedestrianGraph(removeDuplicateCrosswalks(crosswalks, border_nodes))
+
+    # one search per sidewalk, one crossing per pair of sidewalks
+    crossings = {}
+    crossings_by_sidewalks = {}
+    for sidewalk_start in sidewalks:
+        source = getPedestrianNodeName(sidewalk_start)
+        if source not in pG:
+            continue
+        parents, through_sidewalk = searchPedestrianGraph(pG, source)
+        for sidewalk_end in sidewalks:
+            target = getPedestrianNodeName(sidewalk_end)
+            if target == source or target not in parents or through_sidewalk[target]:
+                continue
+            pair = getUndirectedKey([sidewalk_start.id, sidewalk_end.id])
+            if pair in crossings_by_sidewalks:
+                continue
+            crossing = [target]
+            while crossing[-1] != source:
+                crossing.append(parents[crossing[-1]])
+            crossing.reverse()
+            crossing_id = ";".join(crossing)
+            crosswalk_list = [pG[crossing[i]][crossing[i+1]]["crosswalk"] for i in range(len(crossing)-1)]
+            crossings[crossing_id] = crossings_by_sidewalks[pair] = Crossing(crossing_id, crosswalk_list)
+
+    # index the crossings by the sidewalks they link, as found along their crosswalks
+    crossings_by_branch_sidewalks = {}
+    for crossing in crossings.values():
+        crossing_sidewalks = []
+        for crosswalk in crossing.crosswalks:
+            for pedestrian_node in crosswalk.pedestrian_nodes:
+                if isinstance(pedestrian_node, Sidewalk):
+                    crossing_sidewalks.append(pedestrian_node.id)
+        crossings_by_branch_sidewalks.setdefault(getUndirectedKey(crossing_sidewalks), crossing)
+
+    # if the branch and the crossing share the same sidewalks, it's the branch's crossing
+    for branch in branches:
+        branch_sidewalks = []
+        for items in [way.sidewalks for way in branch.ways]:
+            for sidewalk in items:
+                if sidewalk is not None and sidewalk.id not in branch_sidewalks:
+                    branch_sidewalks.append(sidewalk.id)
+        crossing = crossings_by_branch_sidewalks.get(getUndirectedKey(branch_sidewalks))
+        if crossing is not None:
+            branch.set_crossing(crossing)
+
+    return crossings
@@ -0,0 +1,205 @@
+import bz2
+import gzip
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import quoteattr
+import numpy as np
+from . import config
+
+#
+# Streaming reader of OSM files
+#
+# ox.graph_from_xml builds every element of a file with all its tags, before prepare_network removes most of them. This
+# reader streams the file twice instead : the first pass keeps the ways that can be part of the network (and, when a
+# bounding box is given, that have a node inside it), the second one only reads the nodes of these ways. Only the tags
+# kept by OSMnx (see osmnxTags) are stored, so that the graph is the one ox.graph_from_xml builds from the same ways.
+# .osm files can be compressed (.bz2, .gz). .osm.pbf files are read with pyosmium, if it is installed.
+# Files are expected to be sorted (nodes, then ways, then relations), as OSM extracts are.
+#
+
+# Whether a way can be part of the network prepared by crseg : it must be a highway, and not one of the ways that
+# Segmentation.prepare_network always removes. Ways with a footway tag are kept, their nodes being marked as crossings.
+def isNetworkWay(tags):
+    if "highway" not in tags:
+        return False
+    if "footway" in tags or tags.get("psv") == "yes":
+        return True
+    return tags["highway"] not in config.ignored_highways and tags.get("service") not in config.ignored_services
+
+def openFile(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+# Stream the elements of an OSM XML file
+# Params :
+#   path : path of the file
+#   nodes : read the nodes
+#   ways : read the ways
+#   node_ids : only read the nodes having these ids, if given
+# Returns : a generator of ("node", id, (lat, lon), tags) and ("way", id, node ids, tags)
+def iterateXML(path, nodes = True, ways = True, node_ids = None):
+    with openFile(path) as f:
+        context = iterparse(f, events=("start", "end"))
+        event, root = next(context)
+        for event, element in context:
+            if event != "end":
+                continue
+            if element.tag == "node":
+                if nodes:
+                    node_id = int(element.get("id"))
+                    if node_ids is None or node_id in node_ids:
+                        tags = {tag.get("k") : tag.get("v") for tag in element.iter("tag")}
+                        yield "node", node_id, (float(element.get("lat")), float(element.get("lon"))), tags
+                # the elements already read are dropped, so that the memory does not grow with the file
+                root.clear()
+            elif element.tag == "way":
+                if not ways:
+                    return
+                tags = {tag.get("k") : tag.get("v") for tag in element.iter("tag")}
+                yield "way", int(element.get("id")), [int(nd.get("ref")) for nd in element.iter("nd")], tags
+                root.clear()
+            elif element.tag == "relation":
+                return
+
+# Stream the elements of an OSM PBF file, like iterateXML
+def iteratePBF(path, nodes = True, ways = True, node_ids = None):
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError("Reading .osm.pbf files requires pyosmium (pip install osmium)")
+
+    entities = (osmium.osm.NODE if nodes else 0) | (osmium.osm.WAY if ways else 0)
+    for element in osmium.FileProcessor(path, entities):
+        if element.is_node():
+            if node_ids is None or element.id in node_ids:
+                tags = {tag.k : tag.v for tag in element.tags}
+                yield "node", element.id, (element.location.lat, element.location.lon), tags
+        elif element.is_way():
+            tags = {tag.k : tag.v for tag in element.tags}
+            yield "way", element.id, [node.ref for node in element.nodes], tags
+
+# Read the ways of the network of an OSM file and their nodes, keeping only the tags kept by OSMnx
+# Params :
+#   path : path of the file (.osm, .osm.bz2, .osm.gz or .osm.pbf)
+#   bbox : only keep the ways having a node in this bounding box (north, south, east, west), as given by
+#   ox.utils_geo.bbox_from_point
+# Returns : the nodes and the ways, as OSM elements of the Overpass JSON format
+def readNetwork(path, bbox = None):
+    import osmnx as ox
+    path = str(path)
+    iterate = iteratePBF if path.endswith(".pbf") else iterateXML
+    way_tags = set(ox.settings.useful_tags_way)
+    node_tags = set(ox.settings.useful_tags_node)
+
+    # first pass : the ways of the network, and the nodes inside the bounding box
+    inside = set()
+    ways = []
+    node_ids = set()
+    for element_type, element_id, data, tags in iterate(path, nodes = bbox is not None):
+        if element_type == "node":
+            north, south, east, west = bbox
+            if south <= data[0] <= north and west <= data[1] <= east:
+                inside.add(element_id)
+        elif isNetworkWay(tags) and (bbox is None or any([node_id in inside for node_id in data])):
+            ways.append({"type" : "way", "id" : element_id, "nodes" : data, "tags" : {k : v for k, v in tags.items() if k in way_tags}})
+            node_ids.update(data)
+    inside = None
+
+    # second pass : the nodes of these ways
+    nodes = []
+    for element_type, element_id, data, tags in iterate(path, ways = False, node_ids = node_ids):
+        nodes.append({"type" : "node", "id" : element_id, "lat" : data[0], "lon" : data[1], "tags" : {k : v for k, v in tags.items() if k in node_tags}})
+        if len(nodes) == len(node_ids):
+            break
+
+    # nodes missing from the file (at the border of an extract) are removed from their ways
+    if len(nodes) < len(node_ids):
+        found = set([node["id"] for node in nodes])
+        for way in ways:
+            way["nodes"] = [node_id for node_id in way["nodes"] if node_id in found]
+        ways = [way for way in ways if len(way["nodes"]) > 1]
+
+    return nodes, ways
+
+# Build a graph from OSM elements, as ox.graph_from_xml does
+def createGraph(nodes, ways):
+    import osmnx as ox
+    return ox.graph._create_graph([{"elements" : nodes + ways}], retain_all=False, bidirectional=False)
+
+# Build the graph of the network of an OSM file, as ox.graph_from_xml(path, simplify=False) would, but only reading the
+# ways of the network and their nodes. Like ox.graph_from_xml, it must be called within osmnxTags to keep the tags
+# used by the description.
+# Params : see readNetwork
+# Returns : the graph
+def graphFromFile(path, bbox = None):
+    return createGraph(*readNetwork(path, bbox))
+
+#
+# Network of an OSM file kept in memory
+#
+# The ways of the network and their nodes are read once (see readNetwork), then the graphs of parts of the file are
+# built from them, as graphFromFile(path, bbox) would, without reading the file again. Nodes coordinates and ways
+# bounding boxes are kept in numpy arrays to find the ways of a part quickly.
+#
+
+class NetworkExtract():
+
+    # Like readNetwork, it must be called within osmnxTags
+    def __init__(self, path):
+        self.nodes, self.ways = readNetwork(path)
+        self.node_index = {node["id"] : i for i, node in enumerate(self.nodes)}
+        self.latitudes = np.array([node["lat"] for node in self.nodes])
+        self.longitudes = np.array([node["lon"] for node in self.nodes])
+
+        # bounding box of each way : (north, south, east, west)
+        self.way_boxes = np.zeros((len(self.ways), 4))
+        for i, way in enumerate(self.ways):
+            indexes = [self.node_index[node_id] for node_id in way["nodes"]]
+            latitudes, longitudes = self.latitudes[indexes], self.longitudes[indexes]
+            self.way_boxes[i] = (latitudes.max(), latitudes.min(), longitudes.max(), longitudes.min())
+
+    # Returns : the bounding box of the network (north, south, east, west)
+    def getBounds(self):
+        return self.latitudes.max(), self.latitudes.min(), self.longitudes.max(), self.longitudes.min()
+
+    # Returns : a mask of the nodes inside a bounding box
+    def getInside(self, bbox):
+        north, south, east, west = bbox
+        return (self.latitudes >= south) & (self.latitudes <= north) & (self.longitudes >= west) & (self.longitudes <= east)
+
+    def countNodes(self, bbox):
+        return int(self.getInside(bbox).sum())
+
+    # Ways having a node in a bounding box, and their nodes, as readNetwork(path, bbox) would read them
+    def getElements(self, bbox):
+        north, south, east, west = bbox
+        inside = set([self.nodes[i]["id"] for i in np.flatnonzero(self.getInside(bbox))])
+        boxes = self.way_boxes
+        candidates = np.flatnonzero((boxes[:, 0] >= south) & (boxes[:, 1] <= north) & (boxes[:, 2] >= west) & (boxes[:, 3] <= east))
+        ways = [self.ways[i] for i in candidates if any([node_id in inside for node_id in self.ways[i]["nodes"]])]
+        node_ids = set([node_id for way in ways for node_id in way["nodes"]])
+        nodes = [self.nodes[i] for i in sorted([self.node_index[node_id] for node_id in node_ids])]
+        return nodes, ways
+
+    # Build the graph of the ways having a node in a bounding box, as graphFromFile(path, bbox) would. It must be called
+    # within osmnxTags.
+    # Returns : the graph, or None if there is no way in the bounding box
+    def getGraph(self, bbox):
+        nodes, ways = self.getElements(bbox)
+        if not ways:
+            return None
+        return createGraph(nodes, ways)
+
+# Write OSM elements (see readNetwork) as an OSM XML document, sorted as OSM files are
+# Returns : the document, encoded in UTF-8
+def writeXML(nodes, ways):
+    tag = lambda element: "".join(['<tag k=%s v=%s/>'%(quoteattr(k), quoteattr(str(v))) for k, v in element["tags"].items()])
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6" generator="crossroadsdescription">']
+    for node in nodes:
+        lines.append('<node id="%s" lat="%s" lon="%s">%s</node>'%(node["id"], node["lat"], node["lon"], tag(node)))
+    for way in ways:
+        lines.append('<way id="%s">%s%s</way>'%(way["id"], "".join(['<nd ref="%s"/>'%node_id for node_id in way["nodes"]]), tag(way)))
+    lines.append('</osm>')
+    return "\n".join(lines).encode("utf-8")
@@ -0,0 +1,329 @@
+import math
+import time
+import random
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qsl
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from . import config
+
+#
+# Concurrent downloads of OSM data
+#
+# Many areas (the tiles of a list of crossroads, see TileCache.prefetch) are downloaded at once, by a pool of threads
+# sharing a pool of HTTP connections. Overlapping areas are first merged into fewer requests, and the graph of each area
+# is then built from the data of the request covering it, as crseg.utils.Util.get_osm_data builds it from its own
+# download, so that the graphs are the ones TileCache.getGraph downloads.
+# Requests are sent at the rate allowed by the API, and retried with an exponential backoff when it is busy or
+# unreachable. Responses can be recorded to be replayed by the local stand-in of the APIs (see replayServer.py).
+#
+
+# statuses of an API asking to come back later : every request waits (Retry-After header, or the backoff delay)
+BUSY_STATUSES = [429, 509]
+# statuses of temporary failures : the request is retried after the backoff delay
+RETRY_STATUSES = [500, 502, 503, 504]
+# earth radius of EPSG:3857 (web mercator), in meters
+MERCATOR_RADIUS = 6378137
+# margin downloaded around the area of a graph from Overpass, to be truncated afterwards, in meters (clean_periphery of
+# ox.graph_from_polygon, plus a margin for the projection it is computed in)
+OVERPASS_BUFFER = 510
+
+# Bounding box (north, south, east, west) around a point, as ox.utils_geo.bbox_from_point gives it
+# Params :
+#   distance : distance from the point to the sides of the box, in meters
+def getBoundingBox(latitude, longitude, distance):
+    from .utils import EARTH_RADIUS
+    delta_lat = math.degrees(distance / EARTH_RADIUS)
+    delta_lon = math.degrees(distance / EARTH_RADIUS) / math.cos(math.radians(latitude))
+    return latitude + delta_lat, latitude - delta_lat, longitude + delta_lon, longitude - delta_lon
+
+# Bounding box (north, south, east, west) around a point, as crseg.utils.Util.get_osm_data requests it from the OSM api :
+# the envelope of a buffer in EPSG:3857, whose meters are shorter than on the ground away from the equator
+# Params :
+#   distance : distance from the point to the sides of the box, in EPSG:3857 meters
+def getMercatorBoundingBox(latitude, longitude, distance):
+    x = math.radians(longitude) * MERCATOR_RADIUS
+    y = math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2)) * MERCATOR_RADIUS
+    getLatitude = lambda y: math.degrees(2 * math.atan(math.exp(y / MERCATOR_RADIUS)) - math.pi / 2)
+    getLongitude = lambda x: math.degrees(x / MERCATOR_RADIUS)
+    return getLatitude(y + distance), getLatitude(y - distance), getLongitude(x + distance), getLongitude(x - distance)
+
+# Bounding box with a margin around it
+# Params :
+#   margin : margin, in meters
+def getBufferedBox(bbox, margin):
+    north, south, east, west = bbox
+    delta_lat = margin / 111320
+    delta_lon = margin / (111320 * math.cos(math.radians(max(abs(north), abs(south)))))
+    return north + delta_lat, south - delta_lat, east + delta_lon, west - delta_lon
+
+# Size of a bounding box, in meters
+# Returns : height and width
+def getBoxSize(bbox):
+    north, south, east, west = bbox
+    return (north - south) * 111320, (east - west) * 111320 * math.cos(math.radians((north + south) / 2))
+
+def intersects(a, b):
+    return a[1] <= b[0] and b[1] <= a[0] and a[3] <= b[2] and b[3] <= a[2]
+
+def getUnion(a, b):
+    return max(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])
+
+# Merge overlapping bounding boxes, while the merged boxes are smaller than a given size
+# Params :
+#   boxes : bounding boxes (north, south, east, west)
+#   max_size : maximum height and width of a merged box, in meters
+# Returns : the merged boxes, with the indexes of the boxes each one covers
+def mergeBoxes(boxes, max_size = config.prefetch_max_size):
+    groups = [(tuple(box), [i]) for i, box in sorted(enumerate(boxes), key=lambda item: (item[1][1], item[1][3]))]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for box, members in groups:
+            for i, (other, other_members) in enumerate(result):
+                if intersects(box, other):
+                    union = getUnion(box, other)
+                    if max(getBoxSize(union)) <= max_size:
+                        result[i] = (union, other_members + members)
+                        merged = True
+                        break
+            else:
+                result.append((box, members))
+        groups = result
+    return groups
+
+# Limit of the rate of the requests, shared by the threads : requests are spaced by an interval, doubled when the API
+# asks to wait, then slowly brought back to the maximum rate as requests succeed
+class RateLimiter():
+
+    # Params :
+    #   rate : maximum number of requests per second, no limit if None
+    def __init__(self, rate):
+        self.min_interval = 1 / rate if rate else 0
+        self.interval = self.min_interval
+        self.next = 0
+        self.paused = 0
+        self.lock = threading.Lock()
+
+    # Wait until a request can be sent
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                start = max(now, self.next, self.paused)
+                self.next = start + self.interval
+            time.sleep(start - now)
+            # the API may have asked to wait in the meantime
+            with self.lock:
+                if time.monotonic() >= self.paused:
+                    return
+
+    # The API asked to wait : every request waits for the delay, then they are sent at half the rate
+    def pause(self, delay):
+        with self.lock:
+            now = time.monotonic()
+            # the requests sent before the pause are answered the same way, they do not slow down further
+            if now >= self.paused:
+                self.interval = max(2 * self.interval, 0.1)
+            self.paused = max(self.paused, now + delay)
+
+    # A request succeeded
+    def succeeded(self):
+        with self.lock:
+            self.interval = max(self.min_interval, 0.95 * self.interval)
+
+class Prefetcher():
+
+    # Params :
+    #   overpass : use Overpass instead of the OSM api
+    #   url : url of the API (config.osm_api_url or config.overpass_url by default), for example the local stand-in
+    #   workers : number of requests sent at the same time
+    #   rate : maximum number of requests per second (config.prefetch_rate by default)
+    #   retries : number of retries of a failed request
+    #   backoff : delay before the first retry, in seconds, doubling at each retry
+    #   max_size : maximum size of the areas merged into one request, in meters (see mergeBoxes)
+    #   record : folder where the responses are recorded, to be replayed by the stand-in (see replayServer.py)
+    def __init__(self, overpass = False, url = None, workers = config.prefetch_workers, rate = None, retries = config.prefetch_retries, backoff = config.prefetch_backoff, max_size = config.prefetch_max_size, record = None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.overpass = overpass
+        self.url = (url if url else config.overpass_url if overpass else config.osm_api_url).rstrip("/")
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_size = max_size
+        self.record = record
+        self.limiter = RateLimiter(rate if rate is not None else config.prefetch_rate["overpass" if overpass else "osm"])
+        # ways requested from Overpass : those OSMnx requests for the network type of get_osm_data
+        self.osm_filter = None
+        if overpass:
+            import osmnx as ox
+            self.osm_filter = ox.downloader._get_osm_filter("all")
+
+        # one connection per thread, kept open between requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "CrossroadsDescriber (prefetcher)"
+
+        self.stats = {"areas" : 0, "requests" : 0, "sent" : 0, "retries" : 0, "split" : 0, "failed" : 0, "bytes" : 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, name, value = 1):
+        with self.stats_lock:
+            self.stats[name] += value
+
+    def getStats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    # Bounding box of the graph of a tile, as crseg.utils.Util.get_osm_data downloads it
+    # Params :
+    #   distance : distance from the center of the tile to the sides of the box, in meters
+    def getTileBox(self, latitude, longitude, distance):
+        if self.overpass:
+            return getBoundingBox(latitude, longitude, distance)
+        return getMercatorBoundingBox(latitude, longitude, distance)
+
+    # Bounding box of the data needed to build the graph of a bounding box (see getGraph) : from Overpass, OSMnx
+    # downloads a margin around it
+    def getDownloadBox(self, bbox):
+        return getBufferedBox(bbox, OVERPASS_BUFFER) if self.overpass else bbox
+
+    # Request of the OSM data of a bounding box : the map call of the OSM api, or the ways of the network and their
+    # nodes from Overpass
+    # Returns : method, url and form data
+    def getRequest(self, bbox):
+        north, south, east, west = bbox
+        if self.overpass:
+            query = '[out:xml][timeout:%s];(way%s(%.7f,%.7f,%.7f,%.7f);>;);out;'%(config.prefetch_timeout, self.osm_filter, south, west, north, east)
+            return "POST", self.url + "/interpreter", {"data" : query}
+        return "GET", self.url + "/map?bbox=%.7f,%.7f,%.7f,%.7f"%(west, south, east, north), None
+
+    # Delay before retrying a request, given by the Retry-After header if any
+    def getDelay(self, attempt, response = None):
+        if response is not None and response.headers.get("Retry-After", "").strip().isdigit():
+            return int(response.headers["Retry-After"])
+        return self.backoff * 2 ** attempt * random.uniform(1, 1.5)
+
+    # Download the OSM data of a bounding box, retrying while the API is busy or unreachable
+    # Returns : the OSM XML document
+    # Raises : requests.HTTPError if the API refuses the request (400 for too many nodes...) or keeps failing
+    def download(self, bbox):
+        import requests
+        method, url, data = self.getRequest(bbox)
+        self.count("requests")
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            self.count("sent")
+            try:
+                response = self.session.request(method, url, data=data, timeout=config.prefetch_timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                self.count("retries")
+                time.sleep(self.getDelay(attempt))
+                continue
+
+            if response.status_code == 200:
+                self.limiter.succeeded()
+                self.count("bytes", len(response.content))
+                if self.record:
+                    from .replayServer import getReplayKey, saveRecording
+                    parts = urlparse(url)
+                    saveRecording(self.record, getReplayKey(method, parts.path, parse_qsl(parts.query) + list((data or {}).items())), response.content)
+                return response.content
+            if attempt == self.retries or response.status_code not in BUSY_STATUSES + RETRY_STATUSES:
+                raise requests.HTTPError("%s %s : %s"%(response.status_code, response.reason, url), response=response)
+
+            self.count("retries")
+            if response.status_code in BUSY_STATUSES:
+                self.limiter.pause(self.getDelay(attempt, response))
+            else:
+                time.sleep(self.getDelay(attempt, response))
+
+    # Download the OSM data of several bounding boxes, the overlapping ones in one request (see mergeBoxes). A merged
+    # request refused by the API (too many nodes) is replaced by the requests of its boxes.
+    # Params :
+    #   boxes : bounding boxes (north, south, east, west)
+    # Yields : the indexes of the boxes covered by a request, and its OSM XML document (None if it failed), as requests
+    # end
+    def fetch(self, boxes):
+        import requests
+        self.count("areas", len(boxes))
+        with ThreadPoolExecutor(self.workers) as executor:
+            # the margin downloaded from Overpass around each area does not count in the size of the merged areas
+            max_size = self.max_size + (2 * OVERPASS_BUFFER if self.overpass else 0)
+            futures = {executor.submit(self.download, box) : (box, members) for box, members in mergeBoxes(boxes, max_size)}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    box, members = futures.pop(future)
+                    try:
+                        content = future.result()
+                    except requests.RequestException as error:
+                        if len(members) > 1 and error.response is not None and error.response.status_code == 400:
+                            self.count("split")
+                            for i in members:
+                                futures[executor.submit(self.download, boxes[i])] = (boxes[i], [i])
+                            continue
+                        self.count("failed")
+                        content = None
+                    yield members, content
+
+    # Graph of a bounding box, from the data of a request covering it, as crseg.utils.Util.get_osm_data builds it :
+    # ox.graph_from_xml on the map call of the box for the OSM api, ox.graph_from_point (graph_from_polygon steps,
+    # largest component) for Overpass
+    # Params :
+    #   elements : OSM elements of the request, as OSMnx reads them (ox.osm_xml._overpass_json_from_file)
+    #   G_all : graph of all the elements (Overpass only)
+    # Returns : the graph, None if the box has no way
+    def getGraph(self, bbox, elements, G_all = None):
+        import osmnx as ox
+        import networkx as nx
+        north, south, east, west = bbox
+        try:
+            if not self.overpass:
+                # elements a map call of the box returns : nodes inside it, ways using them, and the nodes of these ways
+                inside = set([element["id"] for element in elements if element["type"] == "node" and south <= element["lat"] <= north and west <= element["lon"] <= east])
+                ways = [element for element in elements if element["type"] == "way" and not inside.isdisjoint(element["nodes"])]
+                needed = inside.union(*[way["nodes"] for way in ways])
+                nodes = [element for element in elements if element["type"] == "node" and element["id"] in needed]
+                return ox.graph._create_graph([{"elements" : nodes + ways}], retain_all=True, bidirectional=False)
+
+            polygon = ox.utils_geo.bbox_to_poly(north, south, east, west)
+            polygon_utm, crs_utm = ox.projection.project_geometry(polygon)
+            polygon_buffer, _ = ox.projection.project_geometry(polygon_utm.buffer(500), crs=crs_utm, to_latlong=True)
+            G_buffer = ox.truncate.truncate_graph_polygon(G_all, polygon_buffer, True, True)
+            G = ox.truncate.truncate_graph_polygon(G_buffer, polygon, False, True)
+            nx.set_node_attributes(G, values=ox.stats.count_streets_per_node(G_buffer, nodes=G.nodes), name="street_count")
+            return G
+        except (ox._errors.EmptyOverpassResponse, ValueError):
+            # no element, or no node in the box
+            return None
+
+    # Download the graphs of several bounding boxes (see fetch), built as getGraph builds them. The graphs are built
+    # while the next requests are downloaded.
+    # Params :
+    #   boxes : bounding boxes (north, south, east, west), given by getTileBox
+    #   way_tags, node_tags : tags kept (see osmnxTags)
+    # Yields : the index of each bounding box and its graph (None if it could not be downloaded or has no way)
+    def getGraphs(self, boxes, way_tags = [], node_tags = []):
+        import osmnx as ox
+        from .utils import osmnxTags
+        for members, content in self.fetch([self.getDownloadBox(box) for box in boxes]):
+            graphs = [None] * len(members)
+            if content is not None:
+                with tempfile.NamedTemporaryFile(suffix=".osm") as f:
+                    f.write(content)
+                    f.flush()
+                    elements = ox.osm_xml._overpass_json_from_file(f.name)["elements"]
+                with osmnxTags(way_tags, node_tags):
+                    G_all = None
+                    if self.overpass and elements:
+                        G_all = ox.graph._create_graph([{"elements" : elements}], retain_all=True, bidirectional=False)
+                    graphs = [self.getGraph(boxes[i], elements, G_all) for i in members]
+            for i, G in zip(members, graphs):
+                yield i, G
@@ -0,0 +1,110 @@
+import threading
+from functools import lru_cache
+from .utils import tr
+
+#
+# Text realization with pyrealb
+#
+# pyrealb is imported and its lexicon loaded once per process, on first use, as importing pyrealb alone takes a large
+# part of the startup of the scripts. Realized phrases are memoized by their inputs : across the crossroads of a city,
+# almost all street names, numbers and lanes combinations come back.
+#
+
+_lexicon_lock = threading.Lock()
+_lexicon_loaded = False
+
+# pyrealb module, set by loadLexicon
+rb = None
+
+# Load PyRealB french lexicon and add missing words
+def loadLexicon():
+    global _lexicon_loaded, rb
+    if _lexicon_loaded:
+        return
+    with _lexicon_lock:
+        if _lexicon_loaded:
+            return
+        import pyrealb
+        rb = pyrealb
+        rb.loadFr()
+        rb.addToLexicon("pyramide", {"N":{"g":"f","tab":"n17"}})
+        rb.addToLexicon("croisement", {"N":{"g":"m","tab":"n3"}})
+        rb.addToLexicon("îlot", {"N":{"g":"m","tab":"n3"}})
+        rb.addToLexicon("tourne-à-gauche", {"N":{"g":"m","tab":"n3"}})
+        rb.addToLexicon("tourne-à-droite", {"N":{"g":"m","tab":"n3"}})
+        rb.addToLexicon("entrant", {"A":{"tab":"n28"}})
+        rb.addToLexicon("sortant", {"A":{"tab":"n28"}})
+        _lexicon_loaded = True
+
+# Number written in letters (ex. "trois")
+@lru_cache(maxsize=256)
+def realizeNumber(n):
+    return str(rb.NO(n).dOpt({"nat": True}))
+
+# Feminine number written in letters, for words such as "fois" (ex. "une")
+@lru_cache(maxsize=256)
+def realizeFeminineNumber(n):
+    return str(rb.NP(rb.NO(n).dOpt({"nat": True})).g("f"))
+
+# Streets of the crossroad (ex. "de la rue Blatin et de l'avenue Carnot")
+# Params :
+#   streets : tuple of (street type, street name) tuples
+@lru_cache(maxsize=4096)
+def realizeStreets(streets):
+    s = rb.CP(rb.C("et"))
+    for street in streets:
+        s.add(
+            rb.PP(
+                rb.P("de"), 
+                rb.NP(
+                    rb.D("le"), 
+                    rb.N(street[0]), 
+                    rb.Q(street[1])
+                )
+            )
+        )
+    return str(s)
+
+# Number of lanes of a branch (ex. "de trois voies")
+@lru_cache(maxsize=256)
+def realizeLanesNumber(n):
+    # temporary fix for pyrealb issue 4 (https://github.com/lapalme/pyrealb/issues/4)
+    if n == 8 : return "de huit voies"
+    return str(rb.PP(
+        rb.P("de"),
+        rb.NP(
+            rb.NO(n).dOpt({"nat": True}), 
+            rb.N("voie")
+        )
+    ))
+
+# Lanes of a branch in one direction, by type (ex. "deux voies de circulation et une voie de bus")
+# Params :
+#   channels : tuple of (channel type, number of lanes) tuples
+@lru_cache(maxsize=1024)
+def realizeChannels(channels):
+    channels_desc = rb.CP(rb.C("et"))
+    for type,n in channels:
+        channels_desc.add(
+            rb.NP(
+                rb.NO(n).dOpt({"nat": True}),
+                rb.N("voie"),
+                rb.PP(
+                    rb.P("de"),
+                    rb.N(tr(type))
+                )
+            )
+        )
+    return str(channels_desc)
+
+# Statistics of the realization caches
+# Returns : hits and misses for each realization function, and the overall hit rate
+def getRealizationStats():
+    stats = {}
+    for function in [realizeNumber, realizeFeminineNumber, realizeStreets, realizeLanesNumber, realizeChannels]:
+        info = function.cache_info()
+        stats[function.__name__] = {"hits" : info.hits, "misses" : info.misses, "size" : info.currsize}
+    hits = sum([s["hits"] for s in stats.values()])
+    calls = hits + sum([s["misses"] for s in stats.values()])
+    stats["hit_rate"] = hits / calls if calls else 0
+    return stats
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+from .model import CROSSWALK
+
+#
+# Headless rendering of described crossroads
+#
+# Draws the model of a crossroad : its ways and branches, the sidewalks and islands generated on each side of the ways
+# (as the QGIS models of the qgis folder do from the GeoJSON output), the crosswalks and the branch numbers. Only the
+# crossroad is drawn, not the whole loaded area, on a figure created once and reused for every image, without pyplot
+# so that no display is needed. matplotlib is imported when the first renderer is created.
+#
+
+class CrossroadRenderer():
+
+    colors = {
+        "branch" : "#333333",
+        "way" : "#999999",
+        "island" : "#e69f00",
+        "crosswalk" : "#0072b2",
+        "center" : "#d55e00"
+    }
+
+    # Params :
+    #   size : size of the images in inches
+    #   dpi : resolution of the images
+    #   offset : distance of the sidewalks and islands to their way, in meters
+    def __init__(self, size = 6, dpi = 100, offset = 3):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection
+        from matplotlib import colormaps
+        self.LineCollection = LineCollection
+        self.sidewalk_colors = colormaps["tab10"]
+        self.figure = Figure(figsize=(size, size), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_axes([0, 0, 1, 1])
+        self.offset = offset
+
+    # Draw a described crossroad and save the image
+    # Params :
+    #   crossroad : model of the crossroad (Description.crossroad, once computeModel is done)
+    #   path : path of the image, its format given by the extension
+    def render(self, crossroad, path):
+        axes = self.axes
+        axes.clear()
+        axes.set_axis_off()
+
+        # coordinates are projected in meters around the center of the crossroad
+        center_x, center_y = crossroad.center["x"], crossroad.center["y"]
+        scale_x = 111320 * math.cos(math.radians(center_y))
+        scale_y = 110540
+        project = lambda junction: ((junction.x - center_x) * scale_x, (junction.y - center_y) * scale_y)
+
+        branch_ways = set()
+        for branch in crossroad.branches:
+            branch_ways.update([id(way) for way in branch.ways])
+
+        ways = {"branch" : [], "way" : []}
+        sides = {"sidewalk" : [], "island" : []}
+        sides_colors = {"sidewalk" : [], "island" : []}
+        sidewalk_numbers = {}
+        for way in crossroad.ways.values():
+            start, end = np.array(project(way.junctions[0])), np.array(project(way.junctions[1]))
+            ways["branch" if id(way) in branch_ways else "way"].append((start, end))
+
+            # the sidewalks and islands are drawn parallel to the way, on its side (left first)
+            length = np.linalg.norm(end - start)
+            if length == 0:
+                continue
+            normal = np.array([start[1] - end[1], end[0] - start[0]]) / length * self.offset
+            for side, shift in [(0, normal), (1, -normal)]:
+                for kind, pedestrian_node in [("sidewalk", way.sidewalks[side]), ("island", way.islands[side])]:
+                    if pedestrian_node is not None:
+                        sides[kind].append((start + shift, end + shift))
+                        sides_colors[kind].append(self.sidewalk_colors(sidewalk_numbers.setdefault(pedestrian_node.id, len(sidewalk_numbers)) % 10) if kind == "sidewalk" else self.colors["island"])
+
+        axes.add_collection(self.LineCollection(ways["way"], colors=self.colors["way"], linewidths=4))
+        axes.add_collection(self.LineCollection(ways["branch"], colors=self.colors["branch"], linewidths=4))
+        axes.add_collection(self.LineCollection(sides["sidewalk"], colors=sides_colors["sidewalk"], linewidths=2))
+        axes.add_collection(self.LineCollection(sides["island"], colors=sides_colors["island"], linewidths=2, linestyles="dashed"))
+
+        crosswalks = np.array([project(junction) for junction in crossroad.junctions.values() if junction.has(CROSSWALK)]).reshape(-1, 2)
+        axes.scatter(crosswalks[:, 0], crosswalks[:, 1], s=30, c=self.colors["crosswalk"], zorder=3)
+        axes.scatter([0], [0], s=40, c=self.colors["center"], marker="x", zorder=3)
+
+        # branch numbers, at the junction of the branch farthest from the center
+        for branch in crossroad.branches:
+            x, y = max([project(junction) for way in branch.ways for junction in way.junctions], key=lambda p: p[0] ** 2 + p[1] ** 2)
+            axes.text(x, y, str(branch.number), fontsize=12, ha="center", va="center", zorder=4, bbox={"boxstyle" : "circle", "fc" : "white", "ec" : self.colors["branch"]})
+
+        axes.set_aspect("equal")
+        axes.margins(0.1)
+        axes.autoscale_view()
+        self.figure.savefig(path)
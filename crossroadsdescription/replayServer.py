@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from . import config
+
+#
+# Local stand-in of the OSM APIs
+#
+# Answers the requests of the Prefetcher (map calls of the OSM api and Overpass queries) without network access :
+# responses recorded by a Prefetcher (record parameter) are replayed, and the other requests are answered from a local
+# OSM file, if one is given. Like the real APIs, it can limit the rate of the requests (answering 429 with a Retry-After
+# header) and answer slowly, so that downloads can be tested and measured against it.
+#
+
+# Key of a recorded response : hash of the method, the path and the parameters (query and form data) of its request
+def getReplayKey(method, path, params):
+    return hashlib.sha1(json.dumps([method, path, sorted(params)]).encode()).hexdigest()
+
+def getRecordingPath(folder, key):
+    return os.path.join(folder, key + ".osm")
+
+def saveRecording(folder, key, content):
+    os.makedirs(folder, exist_ok=True)
+    with open(getRecordingPath(folder, key), "wb") as f:
+        f.write(content)
+
+# Bounding box of a request (north, south, east, west) : bbox parameter of a map call (west, south, east, north), or
+# first bounding box of an Overpass query (south, west, north, east)
+def getRequestBox(path, params):
+    params = dict(params)
+    if path.endswith("/map") and "bbox" in params:
+        west, south, east, north = [float(value) for value in params["bbox"].split(",")]
+        return north, south, east, west
+    if path.endswith("/interpreter") and "data" in params:
+        match = re.search(r"\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)", params["data"])
+        if match:
+            south, west, north, east = [float(value) for value in match.groups()]
+            return north, south, east, west
+    return None
+
+class ReplayServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    # Params :
+    #   address : (host, port) to listen on
+    #   folder : folder of the recorded responses
+    #   osm_file : OSM file answering the requests that were not recorded
+    #   rate : maximum number of requests per second, the others being answered 429
+    #   latency : time taken by each answer, in seconds
+    #   max_nodes : requests of areas having more nodes are answered 400, as the OSM api does (over 50000 nodes)
+    def __init__(self, address, folder = None, osm_file = None, rate = None, latency = 0, max_nodes = None):
+        ThreadingHTTPServer.__init__(self, address, ReplayHandler)
+        self.folder = folder
+        self.latency = latency
+        self.max_nodes = max_nodes
+        self.interval = 1 / rate if rate else 0
+        self.last = 0
+        self.lock = threading.Lock()
+        self.stats = {"requests" : 0, "replayed" : 0, "extracted" : 0, "limited" : 0, "refused" : 0, "unknown" : 0}
+
+        # the network of the file is kept in memory, with the tags kept by the description
+        self.extract = None
+        if osm_file:
+            from .osmReader import NetworkExtract
+            from .utils import osmnxTags
+            with osmnxTags(config.way_tags_to_keep, config.node_tags_to_keep):
+                self.extract = NetworkExtract(osm_file)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    # Whether a request goes over the rate limit
+    def isLimited(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last < self.interval:
+                return True
+            self.last = now
+            return False
+
+    # Answer a request
+    # Returns : the status and the content of the response
+    def answer(self, method, path, params):
+        self.count("requests")
+        if self.isLimited():
+            self.count("limited")
+            return 429, b"Too many requests"
+        time.sleep(self.latency)
+
+        if self.folder:
+            recording = getRecordingPath(self.folder, getReplayKey(method, path, params))
+            if os.path.exists(recording):
+                self.count("replayed")
+                with open(recording, "rb") as f:
+                    return 200, f.read()
+
+        bbox = getRequestBox(path, params)
+        if self.extract and bbox:
+            from .osmReader import writeXML
+            nodes, ways = self.extract.getElements(bbox)
+            if self.max_nodes is not None and len(nodes) > self.max_nodes:
+                self.count("refused")
+                return 400, b"You requested too many nodes (limit is %d)"%self.max_nodes
+            self.count("extracted")
+            return 200, writeXML(nodes, ways)
+
+        self.count("unknown")
+        return 404, b"No recorded response for this request"
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    def send(self, code, content, content_type = "text/xml; charset=utf-8"):
+        self.send_response(code)
+        if code == 429:
+            self.send_header("Retry-After", str(max(1, round(self.server.interval))))
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def handle_request(self, method, body = ""):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            return self.send(200, json.dumps(self.server.stats).encode("utf-8"), "application/json; charset=utf-8")
+        self.send(*self.server.answer(method, url.path, parse_qsl(url.query) + parse_qsl(body)))
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.handle_request("POST", self.rfile.read(length).decode("utf-8"))
+
+    # requests are counted in the stats instead
+    def log_message(self, format, *args):
+        pass
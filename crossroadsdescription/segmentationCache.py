@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+import crseg
+from .tileCache import DiskCache
+from . import config
+
+#
+# On-disk cache of the prepared graphs and their segmentations
+#
+# Loading a graph, preparing its network and segmenting it takes most of the time of a run, and only depends on the
+# input data, the tags kept and the segmentation parameters. An entry stores the prepared directed graph and the
+# segmentation, named after a hash of these inputs : the hash of the content of a file, or the key of a download. The
+# inputs are stored in the entry and checked when it is read, and the versions of OSMnx and crseg are part of them.
+#
+
+# version of the entries, to be increased when what they store changes
+ENTRY_VERSION = 1
+
+class SegmentationCache(DiskCache):
+
+    def __init__(self, folder = config.segmentation_cache_folder, max_size = config.segmentation_cache_max_size, ttl = config.segmentation_cache_ttl):
+        DiskCache.__init__(self, folder, max_size, ttl)
+        self.file_hashes = {}
+
+    # Hash of the content of a file, computed once for a given size and modification time of the file
+    def getFileHash(self, path):
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if file_key not in self.file_hashes:
+            file_hash = hashlib.sha1()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    file_hash.update(chunk)
+            self.file_hashes[file_key] = file_hash.hexdigest()
+        return self.file_hashes[file_key]
+
+    # Inputs of a segmentation
+    # Params :
+    #   source : what the graph is loaded from, as a dict that can be written in JSON (file hash, download key...)
+    def getInputs(self, source, way_tags = config.way_tags_to_keep, node_tags = config.node_tags_to_keep, parameters = config.segmentation_parameters):
+        from importlib.metadata import version
+        return {
+            "version" : ENTRY_VERSION,
+            "osmnx" : version("osmnx"),
+            "crseg" : getattr(crseg, "__version__", None),
+            "source" : source,
+            "way_tags" : sorted(way_tags),
+            "node_tags" : sorted(node_tags),
+            "ignored_highways" : sorted(config.ignored_highways),
+            "ignored_services" : sorted(config.ignored_services),
+            "parameters" : parameters
+        }
+
+    def getKey(self, inputs):
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    # Returns : the prepared graph and the segmentation computed from these inputs, or None if they are not in the cache
+    def getSegmentation(self, inputs):
+        entry = self.load(self.getKey(inputs), lambda entry: isinstance(entry, dict) and entry.get("inputs") == inputs)
+        return (entry["graph"], entry["segmentation"]) if entry else None
+
+    def saveSegmentation(self, inputs, G, segmentation):
+        self.save(self.getKey(inputs), {"inputs" : inputs, "graph" : G, "segmentation" : segmentation})
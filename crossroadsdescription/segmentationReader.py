@@ -18,14 +18,25 @@ class SegmentedBranch():
 
 class SegmentationReader():
 
-    def __init__(self, path):
-        json_file = open(path)
-        self.data = json.load(json_file)
-        json_file.close()
+    # segmentation can be :
+    #   the path of a JSON file produced by crseg (to_json or to_json_all)
+    #   the same data already in memory (a list of crossroads, or a single crossroad)
+    #   a crseg Segmentation object, in which case every crossroad of the segmentation is read
+    def __init__(self, segmentation):
+        if isinstance(segmentation, str):
+            json_file = open(segmentation)
+            self.data = json.load(json_file)
+            json_file.close()
+        elif hasattr(segmentation, "regions"):
+            self.data = [region.to_json_data() for region in segmentation.regions.values() if region.is_crossroad()]
+        else:
+            self.data = segmentation
         self.crossroads = []
 
         # If there is more than one crossroad
-        if isinstance(self.data[0], list):
+        if len(self.data) == 0:
+            pass
+        elif isinstance(self.data[0], list):
             for crossroad in self.data:
                 self.crossroads.append(self.__read_crossroad_data(crossroad))
         else:
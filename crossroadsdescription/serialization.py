@@ -0,0 +1,263 @@
+from .model import CROSSWALK, PEDESTRIAN_TRAFFIC_LIGHT
+from .writers import *
+
+#
+# Serialization of the descriptions
+#
+# The texts and geometries of the elements of a described crossroad (branches, ways, crosswalks, crossings) are
+# computed once by DescriptionElements, whatever the number of formats they are written in. Outputs writes the
+# described crossroads to several files at once, each one in the format given by its extension, as they are described.
+#
+
+# Coordinates are rounded as the geojson package does
+PRECISION = 6
+
+# Text of a crosswalk (ex. "Le passage piéton est protégé par un feu. Il y a des bandes d'éveil de vigilance.")
+def getCrosswalkText(crosswalk):
+    text = "Le passage piéton "
+
+    if crosswalk.has(PEDESTRIAN_TRAFFIC_LIGHT):
+        text += "est protégé par un feu"
+        if crosswalk.ptl_sound == "yes":
+            text += " sonore. "
+        else :
+            text += ". "
+    else:
+        text += "n'est pas protégé par un feu. "
+
+    if crosswalk.cw_tactile_paving == "yes":
+        text += "Il y a des bandes d'éveil de vigilance."
+    elif crosswalk.cw_tactile_paving == "incorrect":
+        text += "Il manque des bandes d'éveil de vigilance ou celles-ci sont dégradées."
+    else:
+        text += "Il n'y a pas de bandes d'éveil de vigilance."
+
+    return text
+
+# GeoJSON geometries, as built by the geojson package
+def getPoint(x, y):
+    return {"type" : "Point", "coordinates" : [round(x, PRECISION), round(y, PRECISION)]}
+
+def getLineString(points):
+    return {"type" : "LineString", "coordinates" : [[round(x, PRECISION), round(y, PRECISION)] for x, y in points]}
+
+def getFeature(geometry, properties):
+    return {"type" : "Feature", "geometry" : geometry, "properties" : properties}
+
+class DescriptionElements():
+
+    # Params :
+    #   crossroad : model of the crossroad (Description.crossroad)
+    #   description_structure : the non-concatenated description of the crossroad (see Description.generateDescription)
+    def __init__(self, crossroad, description_structure):
+        self.crossroad = crossroad
+        self.structure = description_structure
+        self.branches = list(zip(crossroad.branches, description_structure["branches_desc"], description_structure["crossings_desc"]))
+        branch_ways = set([id(way) for branch in crossroad.branches for way in branch.ways])
+        self.other_ways = [way for way in crossroad.ways.values() if id(way) not in branch_ways]
+        self.crosswalks = [(junction, getCrosswalkText(junction)) for junction in crossroad.junctions.values() if junction.has(CROSSWALK)]
+
+    # Returns : the description as a dict (see Description.getJSONData)
+    def getJSONData(self):
+        data = {}
+        data["introduction"] = self.structure["general_desc"]
+
+        data["branches"] = []
+        for branch, branch_desc, crossing_desc in self.branches:
+            crossing_desc = crossing_desc.split(" ")[4:]
+            crossing_desc.insert(0, "Elle")
+            data["branches"].append({
+                "nodes" : [[junction.id for junction in way.junctions] for way in branch.ways],
+                "text" : branch_desc + " " + " ".join(crossing_desc),
+                "tags" : {
+                    "auto" : "yes"
+                }
+            })
+
+        data["crossings"] = []
+        for crosswalk, text in self.crosswalks:
+            data["crossings"].append({
+                "node" : crosswalk.id,
+                "text" : text,
+                "tags" : {
+                    "auto" : "yes"
+                }
+            })
+
+        return data
+
+    # Properties of a way feature
+    def getWayProperties(self, way):
+        return {
+            "left_sidewalk" : way.sidewalks[0].id if way.sidewalks[0] else "",
+            "right_sidewalk" : way.sidewalks[1].id if way.sidewalks[1] else "",
+            "left_island" : way.islands[0].id if way.islands[0] else "",
+            "right_island" : way.islands[1].id if way.islands[1] else ""
+        }
+
+    # Returns : the GeoJSON features of the description, as dicts (see Description.getFeatures)
+    def getFeatures(self):
+        features = []
+
+        # Crossroad general description
+        features.append(getFeature(getPoint(self.crossroad.center["x"], self.crossroad.center["y"]), {
+            "id" : None,
+            "type" : "crossroads",
+            "description" : self.structure["general_desc"]
+        }))
+
+        # Crossroad branch description
+        for branch, branch_desc, crossing_desc in self.branches:
+            for way in branch.ways:
+                n1, n2 = way.junctions[0], way.junctions[1]
+                features.append(getFeature(getLineString([(n1.x, n1.y), (n2.x, n2.y)]), {
+                    "id" : "%s;%s"%(n1.id, n2.id),
+                    "type" : "branch",
+                    "name" : "branch n°%s | %s"%(branch.number, way.name),
+                    "description" : branch_desc,
+                    **self.getWayProperties(way)
+                }))
+
+        # Crossroad ways
+        for way in self.other_ways:
+            n1, n2 = way.junctions[0], way.junctions[1]
+            features.append(getFeature(getLineString([(n1.x, n1.y), (n2.x, n2.y)]), {
+                "id" : "%s;%s"%(n1.id, n2.id),
+                "type" : "way",
+                "name" : way.name,
+                **self.getWayProperties(way)
+            }))
+
+        # Single crosswalks descriptions
+        for crosswalk, text in self.crosswalks:
+            features.append(getFeature(getPoint(crosswalk.x, crosswalk.y), {
+                "id" : crosswalk.id,
+                "type" : "crosswalk",
+                "description" : text
+            }))
+
+        # Crossings description
+        for branch, branch_desc, crossing_desc in self.branches:
+            crossing = branch.crossing
+            if crossing is None:
+                continue
+            crosswalks = crossing.crosswalks
+            if len(crosswalks) > 1:
+                id = ";".join([str(crosswalk.id) for crosswalk in crosswalks])
+                geometry = getLineString([(crosswalk.x, crosswalk.y) for crosswalk in crosswalks])
+            else:
+                id = crosswalks[0].id
+                geometry = getPoint(crosswalks[0].x, crosswalks[0].y)
+            features.append(getFeature(geometry, {
+                "id" : id,
+                "type" : "crossing",
+                "description" : crossing_desc
+            }))
+
+        return features
+
+#
+# Output formats
+#
+
+FORMATS = {
+    "ndjson" : ["ndjson", "jsonl"],
+    "geojsons" : ["geojsons", "geojsonl", "geojsonseq"],
+    "json" : ["json"],
+    "geojson" : ["geojson"]
+}
+
+# Format of an output file, given by its extension : ndjson, geojsons, json, geojson, or text for the other extensions
+def getFormat(path):
+    extension = path.split('.')[-1].lower()
+    for format, extensions in FORMATS.items():
+        if extension in extensions:
+            return format
+    return "text"
+
+# Whether an output can be resumed (see RecordWriter)
+def isResumable(path):
+    return getFormat(path) in ["ndjson", "geojsons"]
+
+class Outputs():
+
+    # Params :
+    #   paths : paths of the output files
+    #   batch : several crossroads are written. Texts are preceded by the coordinates of their crossroad, JSON outputs
+    #   are arrays. Otherwise, the only crossroad is written as is.
+    #   resume : append to partial outputs (.ndjson and .geojsons only, see RecordWriter)
+    #   encoder : JSON encoder (see getJSONEncoder)
+    def __init__(self, paths, batch = True, resume = False, encoder = None):
+        self.batch = batch
+        self.writers = []
+        for path in paths:
+            format = getFormat(path)
+            if format == "ndjson":
+                writer = NDJSONWriter(path, key=lambda record: tuple(record["coordinates"]), resume=resume, encoder=encoder)
+            elif format == "geojsons":
+                writer = GeoJSONSeqWriter(path, key=lambda feature: tuple(feature["properties"]["crossroad"]), resume=resume, grouped=True, encoder=encoder)
+            elif format == "json":
+                writer = JSONArrayWriter(path, encoder=encoder) if batch else DocumentWriter(path, encoder=encoder)
+            elif format == "geojson":
+                writer = FeatureCollectionWriter(path, encoder=encoder)
+            else:
+                writer = TextWriter(path)
+            self.writers.append((format, writer))
+
+    # Crossroads already written to every output, by coordinates
+    def getDone(self):
+        writers = [writer for format, writer in self.writers]
+        if not writers or not all([isResumable(writer.path) for writer in writers]):
+            return set()
+        return set.intersection(*[writer.done for writer in writers])
+
+    # Formats of the outputs
+    def getFormats(self):
+        return set([format for format, writer in self.writers])
+
+    # Write a described crossroad to every output
+    # Params :
+    #   coordinates : coordinates of the crossroad, [latitude, longitude]
+    #   desc : the Description of the crossroad
+    #   description : the description returned by Description.generateDescription
+    def write(self, coordinates, desc, description):
+        elements = desc.getElements(description["structure"])
+        pending = [format for format, writer in self.writers if tuple(coordinates) not in writer.done]
+        data = elements.getJSONData() if set(pending) & {"ndjson", "json"} else None
+        features = elements.getFeatures() if set(pending) & {"geojsons", "geojson"} else None
+        self.writeParts(coordinates, description["text"], data, features)
+
+    # Write a crossroad described elsewhere (see tiling.describeTile) to every output
+    # Params :
+    #   coordinates : coordinates of the crossroad, [latitude, longitude]
+    #   text : text of the description
+    #   data : the description as a dict (see DescriptionElements.getJSONData), if there is a JSON output
+    #   features : the GeoJSON features of the description (see DescriptionElements.getFeatures), if there is a
+    #   GeoJSON output
+    def writeParts(self, coordinates, text, data, features):
+        for format, writer in self.writers:
+            if tuple(coordinates) in writer.done:
+                continue
+
+            if format == "ndjson":
+                writer.write({"coordinates" : coordinates, **data})
+            elif format == "geojsons":
+                writer.writeAll([{**feature, "properties" : {**feature["properties"], "crossroad" : coordinates}} for feature in features])
+            elif format == "json":
+                writer.write(data)
+            elif format == "geojson":
+                writer.writeAll(features)
+            elif self.batch:
+                writer.write("== Carrefour %s %s ==\n\n%s"%(coordinates[0], coordinates[1], text))
+            else:
+                writer.write(text)
+
+    def close(self):
+        for format, writer in self.writers:
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,135 @@
+import threading
+from collections import OrderedDict
+import osmnx as ox
+import crseg.segmentation as cs
+from .description import Description
+from .model import JunctionTable
+from .tileCache import TileCache
+from .spatialIndex import SpatialIndex
+from .utils import osmnxTags
+from .osmReader import graphFromFile
+from . import config
+
+#
+# Description service keeping its state warm between requests
+#
+# The graphs and segmentations of the recently used regions are kept in memory, as well as the recently generated
+# descriptions, so that a request only computes what has not been computed yet. A region is a tile of region_size
+# meters : its graph is loaded with a radius covering region_radius meters around any coordinate of the tile.
+# The service can be used from several threads, at most max_concurrency descriptions being computed at the same time.
+#
+
+class DescriptionService():
+
+    formats = ["text", "json", "geojson"]
+
+    def __init__(self, osm_file = None, overpass = False, max_regions = 8, max_descriptions = 1024, max_concurrency = 4, region_size = 300, region_radius = 300, tile_cache = None, segmentation_cache = None):
+        self.osm_file = osm_file
+        self.overpass = overpass
+        self.max_regions = max_regions
+        self.max_descriptions = max_descriptions
+        self.region_radius = region_radius
+        self.tile_cache = tile_cache
+        if self.tile_cache is None and not self.osm_file:
+            self.tile_cache = TileCache(tile_size = region_size)
+        self.segmentation_cache = segmentation_cache
+        self.regions = OrderedDict()
+        self.descriptions = OrderedDict()
+        self.region_locks = {}
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.stats = {"requests" : 0, "regions_loaded" : 0, "descriptions_cached" : 0}
+
+        # with a local file, there is only one region, loaded once
+        if self.osm_file:
+            self.getRegion(None)
+
+    # Load the graph of a region, prepare and segment it, or get them from the segmentation cache if there is one
+    # Returns : the directed graph used by the description, the segmentation, the junction table of the graph and the
+    # spatial index of its crossroads
+    def loadRegion(self, key):
+        cached = None
+        if self.segmentation_cache:
+            if self.osm_file:
+                source = {"file" : self.segmentation_cache.getFileHash(self.osm_file), "bbox" : None}
+            else:
+                source = {"tile" : self.tile_cache.getKey(self.tile_cache.getTile(key[0], key[1]), self.region_radius, self.overpass, config.way_tags_to_keep, config.node_tags_to_keep)}
+            inputs = self.segmentation_cache.getInputs(source)
+            cached = self.segmentation_cache.getSegmentation(inputs)
+
+        if cached:
+            G, seg = cached
+        else:
+            if self.osm_file:
+                with osmnxTags(config.way_tags_to_keep, config.node_tags_to_keep):
+                    G = graphFromFile(self.osm_file)
+            else:
+                # the download does not hold the lock of the OSMnx settings, which getGraph only takes to build the graph
+                G = self.tile_cache.getGraph(key[0], key[1], self.region_radius, self.overpass, config.way_tags_to_keep, config.node_tags_to_keep)
+            G = cs.Segmentation.prepare_network(G)
+            seg = cs.Segmentation(ox.utils_graph.get_undirected(G), **config.segmentation_parameters)
+            seg.process()
+            if self.segmentation_cache:
+                self.segmentation_cache.saveSegmentation(inputs, G, seg)
+        return G, seg, JunctionTable(G), SpatialIndex(seg)
+
+    # Get a region from memory, loading it if needed. Only one thread loads a given region.
+    def getRegion(self, key):
+        with self.lock:
+            if key in self.regions:
+                self.regions.move_to_end(key)
+                return self.regions[key]
+            region_lock = self.region_locks.setdefault(key, threading.Lock())
+        with region_lock:
+            with self.lock:
+                if key in self.regions:
+                    return self.regions[key]
+            region = self.loadRegion(key)
+            with self.lock:
+                self.regions[key] = region
+                self.stats["regions_loaded"] += 1
+                while len(self.regions) > self.max_regions:
+                    evicted, _ = self.regions.popitem(last=False)
+                    self.region_locks.pop(evicted, None)
+            return region
+
+    # Describe the crossroad nearest to the given coordinates
+    # Params :
+    #   format : "text", "json" (see Description.descriptionToJSON) or "geojson" (see Description.getGeoJSON)
+    # Returns : the description as a string
+    def describe(self, latitude, longitude, format = "text"):
+        if format not in DescriptionService.formats:
+            raise ValueError("Unknown format %s, expected one of %s"%(format, ", ".join(DescriptionService.formats)))
+
+        with self.slots:
+            key = None if self.osm_file else self.tile_cache.getTile(latitude, longitude)
+            G, seg, table, index = self.getRegion(key)
+            crossroad = index.getCrossroad(longitude, latitude)
+
+            # the description is identified by the region and the center of the crossroad
+            description_key = (key, crossroad[0].get_center(), format)
+            with self.lock:
+                self.stats["requests"] += 1
+                if description_key in self.descriptions:
+                    self.descriptions.move_to_end(description_key)
+                    self.stats["descriptions_cached"] += 1
+                    return self.descriptions[description_key]
+
+            desc = Description()
+            desc.computeModel(G, [cr.to_json_data() for cr in crossroad], table = table)
+            description = desc.generateDescription()
+            result = description["text"]
+            if format == "json":
+                result = desc.descriptionToJSON(description["structure"])
+            if format == "geojson":
+                result = desc.getGeoJSON(description["structure"])
+
+            with self.lock:
+                self.descriptions[description_key] = result
+                while len(self.descriptions) > self.max_descriptions:
+                    self.descriptions.popitem(last=False)
+            return result
+
+    def getStats(self):
+        with self.lock:
+            return {**self.stats, "regions" : len(self.regions), "descriptions" : len(self.descriptions), "tile_cache" : self.tile_cache.getStats() if self.tile_cache else None, "segmentation_cache" : self.segmentation_cache.getStats() if self.segmentation_cache else None}
@@ -0,0 +1,98 @@
+import numpy as np
+from .utils import EARTH_RADIUS
+
+#
+# Spatial index of the crossroads of a segmentation
+#
+# Segmentation.get_crossroad compares the coordinates to the center of every crossroad of the segmentation, which is
+# fine on the small graph around one crossroad, but not when a whole region is segmented once and queried many times.
+# This index keeps the centers of the crossroads in a KD-tree, as points on the unit sphere so that the nearest center
+# for the straight-line (chord) distance is the nearest one for the great circle distance used by get_crossroad. The
+# convex hull of the nodes of each crossroad is kept as well, to find the crossroads covering a point.
+#
+
+class SpatialIndex():
+
+    # Params :
+    #   seg : processed segmentation (crseg)
+    def __init__(self, seg):
+        from scipy.spatial import cKDTree
+        from shapely.geometry import MultiPoint
+        self.seg = seg
+        self.crossroads = [region for region in seg.regions.values() if region.is_crossroad()]
+
+        G = seg.G
+        coordinates = np.array([[G.nodes[crossroad.get_center()]["y"], G.nodes[crossroad.get_center()]["x"]] for crossroad in self.crossroads]).reshape(-1, 2)
+        self.tree = cKDTree(SpatialIndex.toCartesian(coordinates)) if len(self.crossroads) > 0 else None
+
+        # hulls, and distance from the center to the farthest node of each crossroad
+        self.hulls = {}
+        self.radius = 0
+        for crossroad, center in zip(self.crossroads, coordinates):
+            points = [(G.nodes[node]["x"], G.nodes[node]["y"]) for node in crossroad.nodes]
+            self.hulls[crossroad.id] = MultiPoint(points).convex_hull
+            distances = SpatialIndex.toMeters(np.linalg.norm(SpatialIndex.toCartesian(np.array([[y, x] for x, y in points])) - SpatialIndex.toCartesian(center.reshape(1, 2)), axis=1))
+            self.radius = max(self.radius, distances.max())
+
+    # Params :
+    #   coordinates : array of (latitude, longitude)
+    # Returns : array of the points on the unit sphere
+    def toCartesian(coordinates):
+        latitudes = np.radians(coordinates[:, 0])
+        longitudes = np.radians(coordinates[:, 1])
+        return np.column_stack((np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes), np.sin(latitudes)))
+
+    # Great circle distance in meters of chord distances on the unit sphere
+    def toMeters(chords):
+        return 2 * EARTH_RADIUS * np.arcsin(np.minimum(np.asarray(chords) / 2, 1))
+
+    # Chord distance on the unit sphere of a great circle distance in meters
+    def toChord(meters):
+        return 2 * np.sin(min(meters / EARTH_RADIUS, np.pi) / 2)
+
+    def __len__(self):
+        return len(self.crossroads)
+
+    # Nearest crossroads of a point
+    # Params :
+    #   k : number of crossroads
+    # Returns : list of (crossroad, distance in meters), nearest first
+    def nearest(self, latitude, longitude, k = 1):
+        if self.tree is None:
+            return []
+        k = min(k, len(self.crossroads))
+        chords, indices = self.tree.query(SpatialIndex.toCartesian(np.array([[latitude, longitude]]))[0], k = k)
+        chords, indices = np.atleast_1d(chords), np.atleast_1d(indices)
+        return [(self.crossroads[i], float(d)) for i, d in zip(indices, SpatialIndex.toMeters(chords))]
+
+    # Crossroads whose center is within a radius around a point
+    # Params :
+    #   radius : radius in meters
+    # Returns : list of (crossroad, distance in meters), nearest first
+    def within(self, latitude, longitude, radius):
+        if self.tree is None:
+            return []
+        point = SpatialIndex.toCartesian(np.array([[latitude, longitude]]))[0]
+        indices = self.tree.query_ball_point(point, SpatialIndex.toChord(radius))
+        distances = SpatialIndex.toMeters(np.linalg.norm(self.tree.data[indices] - point, axis=1)) if indices else []
+        return sorted([(self.crossroads[i], float(d)) for i, d in zip(indices, distances)], key=lambda item: item[1])
+
+    # Crossroads whose convex hull covers a point
+    # Returns : list of crossroads, nearest center first
+    def covering(self, latitude, longitude):
+        from shapely.geometry import Point
+        point = Point(longitude, latitude)
+        return [crossroad for crossroad, d in self.within(latitude, longitude, self.radius) if self.hulls[crossroad.id].covers(point)]
+
+    # Crossroad nearest to a point, as Segmentation.get_crossroad
+    # Params :
+    #   multiscale : add the inner regions of the crossroad
+    # Returns : list of the crossroad (and its inner regions), or None if there is no crossroad in the segmentation
+    def getCrossroad(self, longitude, latitude, multiscale = False):
+        nearest = self.nearest(latitude, longitude)
+        if not nearest:
+            return None
+        result = [nearest[0][0]]
+        if multiscale:
+            result += [region for region in self.seg.inner_regions.values() if result[0].contains(region)]
+        return result
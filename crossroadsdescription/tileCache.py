@@ -0,0 +1,178 @@
+import os
+import math
+import json
+import time
+import pickle
+import hashlib
+import tempfile
+from . import config
+
+#
+# On-disk cache of pickled objects
+#
+# Entries are named after a key (a hash of everything they depend on), expire after a TTL, and the least recently used
+# ones are removed when the cache exceeds its maximum size. Entries are written under a temporary name then renamed, so
+# that concurrent readers never see a partial file.
+#
+
+class DiskCache():
+
+    def __init__(self, folder, max_size, ttl):
+        self.folder = folder
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = {"hits" : 0, "misses" : 0, "expired" : 0, "evicted" : 0, "invalid" : 0}
+        os.makedirs(self.folder, exist_ok=True)
+
+    def getPath(self, key):
+        return os.path.join(self.folder, key + ".pickle")
+
+    # Read an entry
+    # Params :
+    #   validate : function telling whether the object read can be used
+    # Returns : the object stored under the key, or None if there is none, if it has expired or if it is not valid
+    def load(self, key, validate = None):
+        path = self.getPath(key)
+
+        # mtime is the writing time (for the TTL), atime the last use (for the LRU eviction)
+        now = time.time()
+        try:
+            mtime = os.path.getmtime(path)
+            if now - mtime < self.ttl:
+                with open(path, "rb") as f:
+                    data = pickle.load(f)
+                if validate is None or validate(data):
+                    os.utime(path, (now, mtime))
+                    self.stats["hits"] += 1
+                    return data
+                self.stats["invalid"] += 1
+            else:
+                self.stats["expired"] += 1
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+        self.stats["misses"] += 1
+        return None
+
+    # Whether an entry that has not expired exists, without reading it
+    def has(self, key):
+        try:
+            return time.time() - os.path.getmtime(self.getPath(key)) < self.ttl
+        except OSError:
+            return False
+
+    # Write an entry, then evict the entries that do not fit in the cache anymore
+    def save(self, key, data):
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.folder)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.getPath(key))
+        self.evict()
+
+    # Remove expired entries, then the least recently used ones until the cache fits in its maximum size
+    def evict(self):
+        now = time.time()
+        entries = []
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(".pickle"):
+                continue
+            path = os.path.join(self.folder, filename)
+            try:
+                stat = os.stat(path)
+                if now - stat.st_mtime >= self.ttl:
+                    os.remove(path)
+                    self.stats["expired"] += 1
+                else:
+                    entries.append([stat.st_atime, stat.st_size, path])
+            except OSError:
+                pass # removed by another process
+
+        size = sum([entry[1] for entry in entries])
+        for atime, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                self.stats["evicted"] += 1
+            except OSError:
+                pass
+            size -= entry_size
+
+    def getStats(self):
+        requests = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate" : self.stats["hits"] / requests if requests else 0}
+
+#
+# On-disk cache of the graphs downloaded from OSM
+#
+# Requested coordinates are snapped to tiles of config.tile_size meters, and the graph downloaded around the center of the
+# tile covers the requested radius for any coordinate of the tile, so that nearby requests share the same download.
+# Entries are named after a hash of everything the download depends on (tile, radius, backend, tags).
+#
+
+class TileCache(DiskCache):
+
+    def __init__(self, folder = config.tile_cache_folder, max_size = config.tile_cache_max_size, ttl = config.tile_cache_ttl, tile_size = config.tile_size):
+        DiskCache.__init__(self, folder, max_size, ttl)
+        self.tile_size = tile_size
+
+    # Snap coordinates to the center of their tile
+    # Returns : latitude and longitude of the tile center
+    def getTile(self, latitude, longitude):
+        lat_step = self.tile_size / 111320
+        tile_latitude = (math.floor(latitude / lat_step) + 0.5) * lat_step
+        lon_step = self.tile_size / (111320 * math.cos(math.radians(tile_latitude)))
+        tile_longitude = (math.floor(longitude / lon_step) + 0.5) * lon_step
+        return tile_latitude, tile_longitude
+
+    # Key of a download : hash of the tile, the radius, the backend and the tags kept
+    def getKey(self, tile, radius, overpass, way_tags, node_tags):
+        key = {
+            "tile" : ["%.7f"%tile[0], "%.7f"%tile[1]],
+            "radius" : radius,
+            "backend" : "overpass" if overpass else "osm",
+            "way_tags" : sorted(way_tags),
+            "node_tags" : sorted(node_tags)
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    # Get the graph of the given radius around the coordinates, from the cache or by downloading it. The graph is the one
+    # crseg.utils.Util.get_osm_data downloads, but the OSMnx settings are only locked while it is built (see osmnxTags),
+    # not during the download.
+    # Params : the same as crseg.utils.Util.get_osm_data
+    def getGraph(self, latitude, longitude, radius, overpass, way_tags = [], node_tags = []):
+        tile = self.getTile(latitude, longitude)
+        key = self.getKey(tile, radius, overpass, way_tags, node_tags)
+        G = self.load(key)
+        if G is not None:
+            return G
+
+        # the downloaded radius covers the requested one from anywhere in the tile
+        tile_radius = radius + self.tile_size * math.sqrt(2) / 2
+        from .prefetcher import Prefetcher
+        prefetcher = Prefetcher(overpass, workers = 1)
+        for i, G in prefetcher.getGraphs([prefetcher.getTileBox(tile[0], tile[1], tile_radius)], way_tags, node_tags):
+            if G is not None:
+                self.save(key, G)
+            return G
+
+    # Download the tiles of many coordinates at once (see Prefetcher), so that getGraph finds them in the cache. The
+    # graphs cover the same area and are built the same way as the graphs getGraph downloads.
+    # Params :
+    #   coordinates : coordinates of the crossroads, [latitude, longitude]
+    #   prefetcher : Prefetcher downloading the tiles, from the OSM api or Overpass
+    #   radius, way_tags, node_tags : the same as getGraph
+    # Returns : the number of tiles requested, and the number of them downloaded (the others being already cached)
+    def prefetch(self, coordinates, radius, prefetcher, way_tags = [], node_tags = []):
+        tiles = {}
+        for latitude, longitude in coordinates:
+            tile = self.getTile(latitude, longitude)
+            tiles[self.getKey(tile, radius, prefetcher.overpass, way_tags, node_tags)] = tile
+        missing = [key for key in tiles if not self.has(key)]
+
+        tile_radius = radius + self.tile_size * math.sqrt(2) / 2
+        downloaded = 0
+        for i, G in prefetcher.getGraphs([prefetcher.getTileBox(*tiles[key], tile_radius) for key in missing], way_tags, node_tags):
+            if G is not None:
+                self.save(missing[i], G)
+                downloaded += 1
+        return len(tiles), downloaded
@@ -0,0 +1,305 @@
+import gc
+import importlib
+import tempfile
+import math
+import time
+import multiprocessing
+import multiprocessing.connection
+from collections import deque
+from .description import Description
+from .model import JunctionTable
+from .utils import osmnxTags
+from .realization import loadLexicon
+from . import config
+
+#
+# Tiled processing of large areas
+#
+# A large area (bounding box or OSM file) is split into tiles, each one processed on its own : the graph of the tile
+# and of a buffer around it is loaded and segmented, and the crossroads whose center is in the tile are described. With
+# a buffer larger than a crossroad, each crossroad is entirely in the graph of the tile owning it. Crossroads found
+# twice (center on the border of two tiles) are removed by their nodes.
+#
+# Each tile is processed in a new process forked from the main one, so that the memory of a tile is released once it is
+# done, and can be bounded : a tile going over the memory limit, or having too many nodes, is split in four. The tiles
+# done by an interrupted run are skipped when it is resumed.
+#
+
+# meters in a degree of latitude
+METERS_PER_DEGREE = 111320
+
+class Tile():
+
+    __slots__ = ("inner", "outer", "buffer", "depth")
+
+    # Params :
+    #   inner : bounding box of the tile (north, south, east, west)
+    #   buffer : margin loaded around the tile, in meters
+    #   depth : number of splits that gave this tile
+    def __init__(self, inner, buffer, depth = 0):
+        self.inner = inner
+        self.buffer = buffer
+        self.depth = depth
+        north, south, east, west = inner
+        lat_margin = buffer / METERS_PER_DEGREE
+        lon_margin = buffer / (METERS_PER_DEGREE * math.cos(math.radians(max(abs(north), abs(south)))))
+        self.outer = (north + lat_margin, south - lat_margin, east + lon_margin, west - lon_margin)
+
+    def contains(self, latitude, longitude):
+        north, south, east, west = self.inner
+        return south <= latitude <= north and west <= longitude <= east
+
+    # Returns : the four quarters of the tile
+    def split(self):
+        north, south, east, west = self.inner
+        middle_lat, middle_lon = (north + south) / 2, (east + west) / 2
+        return [Tile(inner, self.buffer, self.depth + 1) for inner in [
+            (north, middle_lat, middle_lon, west), (north, middle_lat, east, middle_lon),
+            (middle_lat, south, middle_lon, west), (middle_lat, south, east, middle_lon)
+        ]]
+
+    # Key of the tile in the list of the tiles done (see TileScheduler)
+    def getKey(self):
+        return tuple([round(value, 7) for value in self.inner])
+
+    def __repr__(self):
+        return "(%.5f, %.5f, %.5f, %.5f)"%self.inner
+
+# Split a bounding box into tiles
+# Params :
+#   bbox : bounding box (north, south, east, west)
+#   tile_size : size of the tiles, in meters
+#   buffer : margin loaded around each tile, in meters
+# Returns : the tiles, by rows from the south west
+def getTiles(bbox, tile_size = config.area_tile_size, buffer = config.area_tile_buffer):
+    north, south, east, west = bbox
+    lat_step = tile_size / METERS_PER_DEGREE
+    rows = max(1, math.ceil((north - south) / lat_step))
+    lat_step = (north - south) / rows
+    tiles = []
+    for row in range(rows):
+        tile_south = south + row * lat_step
+        tile_north = north if row == rows - 1 else tile_south + lat_step
+        lon_step = tile_size / (METERS_PER_DEGREE * math.cos(math.radians((tile_north + tile_south) / 2)))
+        columns = max(1, math.ceil((east - west) / lon_step))
+        lon_step = (east - west) / columns
+        for column in range(columns):
+            tile_west = west + column * lon_step
+            tile_east = east if column == columns - 1 else tile_west + lon_step
+            tiles.append(Tile((tile_north, tile_south, tile_east, tile_west), buffer))
+    return tiles
+
+# Split the tiles whose graph would have too many nodes
+# Params :
+#   countNodes : function giving the number of nodes in a bounding box
+#   max_nodes : maximum number of nodes in the outer bounding box of a tile
+#   max_depth : maximum number of splits of a tile
+def splitLargeTiles(tiles, countNodes, max_nodes = config.area_tile_max_nodes, max_depth = 4):
+    result = []
+    pending = deque(tiles)
+    while pending:
+        tile = pending.popleft()
+        if tile.depth < max_depth and countNodes(tile.outer) > max_nodes:
+            pending.extendleft(reversed(tile.split()))
+        else:
+            result.append(tile)
+    return result
+
+# A tile whose data is refused by the API (too many nodes), to be split
+class TileTooLarge(Exception):
+    pass
+
+# Download the graph of a bounding box from the OSM api (map call), built as the graphs of OSM files are (see
+# NetworkExtract.getGraph) : the ways of the network having a node in the box, with all their nodes. It must be called
+# within osmnxTags.
+# Raises : TileTooLarge if the API refuses the box
+def downloadGraph(bbox):
+    import requests
+    from .osmReader import NetworkExtract
+    from .prefetcher import Prefetcher
+    try:
+        content = Prefetcher(workers = 1).download(bbox)
+    except requests.HTTPError as error:
+        if error.response is not None and error.response.status_code == 400:
+            raise TileTooLarge(str(error))
+        raise
+    with tempfile.NamedTemporaryFile(suffix=".osm") as f:
+        f.write(content)
+        f.flush()
+        return NetworkExtract(f.name).getGraph(bbox)
+
+# Key of a crossroad : its inner and border nodes (crossroads of dual carriageways may have no inner node)
+def getCrossroadKey(segmentation):
+    nodes = segmentation[0]["nodes"]
+    return tuple(sorted(nodes["inner"])), tuple(sorted(nodes["border"]))
+
+# Describe the crossroads of a tile
+# Params :
+#   loadGraph : function giving the graph of a bounding box (NetworkExtract.getGraph or downloadGraph), called within
+#   osmnxTags
+#   formats : formats of the outputs (see Outputs.getFormats), giving the parts of the descriptions to compute
+# Returns : the described crossroads, as (key, coordinates, text, JSON data, GeoJSON features), and the number of
+# crossroads that could not be described
+def describeTile(tile, loadGraph, formats):
+    import osmnx as ox
+    import crseg.segmentation as cs
+
+    with osmnxTags(config.way_tags_to_keep, config.node_tags_to_keep):
+        G = loadGraph(tile.outer)
+    if G is None or len(G) == 0:
+        return [], 0
+    G = cs.Segmentation.prepare_network(G)
+    seg = cs.Segmentation(ox.utils_graph.get_undirected(G), **config.segmentation_parameters)
+    seg.process()
+
+    # crossroads owned by the tile
+    segmentations = []
+    for region in seg.regions.values():
+        if region.is_crossroad():
+            center = seg.G.nodes[region.get_center()]
+            if tile.contains(center["y"], center["x"]):
+                segmentations.append(([center["y"], center["x"]], region.to_json_data()))
+
+    desc = Description()
+    table = JunctionTable(G)
+    results = []
+    errors = 0
+    for coordinates, segmentation in segmentations:
+        try:
+            desc.computeModel(G, [segmentation], table = table)
+            description = desc.generateDescription()
+        except Exception:
+            errors += 1
+            continue
+        elements = desc.getElements(description["structure"])
+        data = elements.getJSONData() if formats & {"ndjson", "json"} else None
+        features = elements.getFeatures() if formats & {"geojson", "geojsons"} else None
+        results.append((getCrossroadKey(segmentation), coordinates, description["text"], data, features))
+    return results, errors
+
+#
+# Scheduler
+#
+
+# Limit the memory of the process of a tile to the memory it shares with the main process, plus a given size
+def _limitMemory(limit):
+    if limit is None:
+        return
+    import resource
+    with open("/proc/self/statm") as f:
+        size = int(f.read().split()[0]) * resource.getpagesize()
+    resource.setrlimit(resource.RLIMIT_AS, (size + limit * 1024 * 1024, resource.RLIM_INFINITY))
+
+# Process of a tile : sends ("done", result), ("memory", None), ("large", message) or ("error", traceback) to the main
+# process
+def _processTile(tile, loadGraph, formats, memory_limit, connection):
+    try:
+        _limitMemory(memory_limit)
+        connection.send(("done", describeTile(tile, loadGraph, formats)))
+    except MemoryError:
+        connection.send(("memory", None))
+    except TileTooLarge as error:
+        connection.send(("large", str(error)))
+    except Exception:
+        import traceback
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+class TileScheduler():
+
+    # Params :
+    #   loadGraph : function giving the graph of a bounding box (NetworkExtract.getGraph or downloadGraph). Tiles whose
+    #   data is too large (TileTooLarge) are split.
+    #   formats : formats of the outputs (see describeTile)
+    #   workers : number of tiles processed at the same time
+    #   memory_limit : memory a tile can use on top of the memory shared with the main process, in MB. A tile going
+    #   over it is split in four (Linux only).
+    #   max_depth : maximum number of splits of a tile
+    #   done : keys of the tiles done by an interrupted run (see Tile.getKey), which are skipped
+    def __init__(self, loadGraph, formats, workers = 1, memory_limit = None, max_depth = 4, done = set()):
+        self.loadGraph = loadGraph
+        self.formats = formats
+        self.workers = workers
+        self.memory_limit = memory_limit
+        self.max_depth = max_depth
+        self.done = done
+        self.seen = set()
+        self.stats = {"tiles" : 0, "skipped" : 0, "split" : 0, "crossroads" : 0, "duplicates" : 0, "errors" : 0}
+
+    # Whether a tile was done by an interrupted run, itself or split in smaller tiles
+    def isDone(self, tile):
+        if tile.getKey() in self.done:
+            return True
+        return tile.depth < self.max_depth and len(self.done) > 0 and all([self.isDone(quarter) for quarter in tile.split()])
+
+    # Process tiles, splitting those going over the memory limit
+    # Yields : each processed tile, its crossroads not found in a previous tile (see describeTile) and the duration
+    def run(self, tiles):
+        # the modules used by every tile (imported by describeTile) are loaded once, before forking, so that the processes
+        # of the tiles share them instead of importing them again
+        for module in ["osmnx", "crseg.segmentation"]:
+            importlib.import_module(module)
+        loadLexicon()
+        # keep the shared objects out of the garbage collector so that it does not write to (and copy) their pages
+        gc.freeze()
+        context = multiprocessing.get_context("fork")
+        pending = deque(tiles)
+        running = {}
+        try:
+            while pending or running:
+                # each tile has its own process, so that its memory is given back when the tile is done
+                while pending and len(running) < self.workers:
+                    tile = pending.popleft()
+                    if self.isDone(tile):
+                        self.stats["skipped"] += 1
+                        continue
+                    receiver, sender = context.Pipe(duplex=False)
+                    process = context.Process(target=_processTile, args=(tile, self.loadGraph, self.formats, self.memory_limit, sender), daemon=True)
+                    process.start()
+                    sender.close()
+                    running[receiver] = (tile, process, time.perf_counter())
+                if not running:
+                    break
+
+                for receiver in multiprocessing.connection.wait(list(running)):
+                    tile, process, start = running.pop(receiver)
+                    try:
+                        status, result = receiver.recv()
+                    except EOFError:
+                        # the process died without a result : killed for lack of memory
+                        status, result = "memory", None
+                    receiver.close()
+                    process.join()
+
+                    if status == "done":
+                        yield tile, self.deduplicate(*result), time.perf_counter() - start
+                    # without memory, libraries may fail with other errors than MemoryError : with a memory limit, any
+                    # failure of a tile is retried on smaller tiles
+                    elif tile.depth < self.max_depth and (status in ["memory", "large"] or self.memory_limit is not None):
+                        self.stats["split"] += 1
+                        pending.extendleft(reversed(tile.split()))
+                    elif status == "memory":
+                        raise MemoryError("Tile %s is over the memory limit"%tile)
+                    elif status == "large":
+                        raise RuntimeError("Tile %s is too large for the API : %s"%(tile, result))
+                    else:
+                        raise RuntimeError("Tile %s failed :\n%s"%(tile, result))
+        finally:
+            for tile, process, start in running.values():
+                process.kill()
+            gc.unfreeze()
+
+    # Remove the crossroads already found in another tile
+    def deduplicate(self, results, errors):
+        self.stats["tiles"] += 1
+        self.stats["errors"] += errors
+        unique = []
+        for result in results:
+            if result[0] in self.seen:
+                self.stats["duplicates"] += 1
+                continue
+            self.seen.add(result[0])
+            unique.append(result)
+        self.stats["crossroads"] += len(unique)
+        return unique
@@ -0,0 +1,373 @@
+import pickle
+import numpy as np
+from xml.etree.ElementTree import iterparse
+from .description import Description
+from .osmReader import isNetworkWay, openFile
+from .spatialIndex import SpatialIndex
+from .utils import greatCircleDistances
+from . import config
+
+#
+# Incremental updates
+#
+# The descriptions of a list of crossroads are kept up to date from OSM change files (.osc) instead of being computed
+# again from scratch. The state of the updates is the prepared graph of the region, and an index from the OSM nodes and
+# ways to the crossroads using them. When a change only touches tags that are not read by crseg (config.segmentation_*_tags),
+# the topology is unchanged : the crossroads using the changed elements are described again from their segmentation.
+# Otherwise, the graph around each crossroad using the changed elements is segmented again (config.update_radius).
+#
+
+# OSM values of the oneway tag, as read by OSMnx
+ONEWAY_VALUES = {"yes", "true", "1", "-1", "reverse", "T", "F"}
+REVERSED_VALUES = {"-1", "reverse", "T"}
+
+# Content of an osmChange file : the last version of each node and way, as (action, (lat, lon), tags) for nodes and
+# (action, node ids, tags) for ways, the action being "create", "modify" or "delete"
+class OSMChange():
+
+    def __init__(self):
+        self.nodes = {}
+        self.ways = {}
+
+# Read an osmChange file (possibly compressed in .bz2 or .gz). Relations are ignored.
+def readChange(path, change = None):
+    change = change if change is not None else OSMChange()
+    versions = {}
+    action = None
+    with openFile(str(path)) as f:
+        context = iterparse(f, events=("start", "end"))
+        event, root = next(context)
+        for event, element in context:
+            if event == "start":
+                if element.tag in ["create", "modify", "delete"]:
+                    action = element.tag
+                continue
+            if element.tag not in ["node", "way"]:
+                if element.tag in ["create", "modify", "delete", "relation"]:
+                    root.clear()
+                continue
+
+            # a diff covering a long period can hold several versions of an element : the last one is kept
+            key = (element.tag, int(element.get("id")))
+            version = int(element.get("version", 0))
+            if versions.get(key, -1) <= version:
+                versions[key] = version
+                tags = {tag.get("k") : tag.get("v") for tag in element.iter("tag")}
+                if element.tag == "node":
+                    location = (float(element.get("lat")), float(element.get("lon"))) if element.get("lat") is not None else None
+                    change.nodes[key[1]] = (action, location, tags)
+                else:
+                    change.ways[key[1]] = (action, [int(nd.get("ref")) for nd in element.iter("nd")], tags)
+    return change
+
+# Edges of a way, as OSMnx adds them to a graph
+def getPathEdges(node_ids, tags):
+    import osmnx as ox
+    nodes = [node_id for i, node_id in enumerate(node_ids) if i == 0 or node_ids[i - 1] != node_id]
+    oneway = ox.graph._is_path_one_way(tags, False, ONEWAY_VALUES)
+    if oneway and ox.graph._is_path_reversed(tags, REVERSED_VALUES):
+        nodes.reverse()
+    edges = list(zip(nodes[:-1], nodes[1:]))
+    if not oneway:
+        edges += [(v, u) for u, v in edges]
+    return edges
+
+#
+# Index from the OSM elements to the crossroads using them
+#
+
+class CrossroadIndex():
+
+    def __init__(self):
+        # by crossroad : the ids of its nodes and ways, and its segmentation (as given by crseg to_json_data)
+        self.crossroads = {}
+        self.nodes = {}
+        self.ways = {}
+
+    # Params :
+    #   key : identifier of the crossroad (its requested coordinates)
+    #   crossroad : model of the crossroad (Description.crossroad)
+    #   segmentation : segmentation of the crossroad
+    def add(self, key, crossroad, segmentation):
+        self.remove(key)
+        node_ids = set(crossroad.junctions.keys())
+        way_ids = set()
+        for way in crossroad.ways.values():
+            node_ids.update([junction.id for junction in way.junctions])
+            way_ids.add(way.id)
+        self.crossroads[key] = {"nodes" : node_ids, "ways" : way_ids, "segmentation" : segmentation}
+        for node_id in node_ids:
+            self.nodes.setdefault(node_id, set()).add(key)
+        for way_id in way_ids:
+            self.ways.setdefault(way_id, set()).add(key)
+
+    def remove(self, key):
+        crossroad = self.crossroads.pop(key, None)
+        if crossroad is None:
+            return
+        for ids, index in [(crossroad["nodes"], self.nodes), (crossroad["ways"], self.ways)]:
+            for element_id in ids:
+                index[element_id].discard(key)
+                if not index[element_id]:
+                    del index[element_id]
+
+    # Returns : the keys of the crossroads using one of these nodes or ways
+    def getCrossroads(self, node_ids, way_ids):
+        keys = set()
+        for node_id in node_ids:
+            keys.update(self.nodes.get(node_id, ()))
+        for way_id in way_ids:
+            keys.update(self.ways.get(way_id, ()))
+        return keys
+
+    def __len__(self):
+        return len(self.crossroads)
+
+#
+# Descriptions kept up to date
+#
+
+class IncrementalDescriber():
+
+    # Params :
+    #   G : prepared graph of the region (see Segmentation.prepare_network)
+    def __init__(self, G):
+        self.G = G
+        self.index = CrossroadIndex()
+        self.stats = {}
+
+    # Describe crossroads from a segmentation of the whole graph, and index them
+    # Params :
+    #   coordinates : [latitude, longitude] of each crossroad
+    #   seg : crseg segmentation of self.G
+    # Yields : the key of each crossroad (its coordinates as a tuple) and its record : its coordinates and its
+    # description (see Description.getJSONData)
+    def describeAll(self, coordinates, seg):
+        spatial_index = SpatialIndex(seg)
+        segmentations = [spatial_index.getCrossroad(c[1], c[0])[0].to_json_data() for c in coordinates]
+        desc = Description()
+        for c, segmentation, description in zip(coordinates, segmentations, desc.computeModels(self.G, segmentations)):
+            self.index.add(tuple(c), desc.crossroad, segmentation)
+            yield tuple(c), {"coordinates" : c, **desc.getJSONData(description["structure"])}
+
+    # Apply an osmChange to the graph, and describe again the crossroads it changes
+    # Yields : the key and the record of each changed crossroad, as describeAll. The record is None when there is no
+    # crossroad around the coordinates anymore.
+    def applyChange(self, change):
+        import osmnx as ox
+        import crseg.segmentation as cs
+        tag_nodes, tag_ways, topology_nodes, topology_ways = self.updateGraph(change)
+        topology_keys = self.index.getCrossroads(topology_nodes, topology_ways)
+        tag_keys = self.index.getCrossroads(tag_nodes, tag_ways) - topology_keys
+        self.stats = {
+            "nodes" : len(change.nodes), "ways" : len(change.ways),
+            "tags_only" : len(tag_keys), "segmented_again" : len(topology_keys), "removed" : 0
+        }
+
+        # same topology : the crossroad is described again from its segmentation
+        desc = Description()
+        for key in sorted(tag_keys):
+            desc.computeModel(self.G, [self.index.crossroads[key]["segmentation"]])
+            description = desc.generateDescription()
+            yield key, {"coordinates" : list(key), **desc.getJSONData(description["structure"])}
+
+        # changed topology : the graph around the crossroad is segmented again
+        if topology_keys:
+            node_ids = np.array(list(self.G.nodes))
+            latitudes = np.array([self.G.nodes[node_id]["y"] for node_id in node_ids])
+            longitudes = np.array([self.G.nodes[node_id]["x"] for node_id in node_ids])
+        for key in sorted(topology_keys):
+            latitude, longitude = key
+            north, south, east, west = ox.utils_geo.bbox_from_point((latitude, longitude), dist=config.update_radius)
+            inside = node_ids[(latitudes >= south) & (latitudes <= north) & (longitudes >= west) & (longitudes <= east)]
+
+            # the edges having a node around the crossroad, as a download with truncate_by_edge
+            edges = list(self.G.edges(inside.tolist(), keys=True)) + list(self.G.in_edges(inside.tolist(), keys=True))
+            G = cs.Segmentation.prepare_network(self.G.edge_subgraph(edges).copy())
+            seg = cs.Segmentation(ox.utils_graph.get_undirected(G), **config.segmentation_parameters)
+            seg.process()
+            # the nearest crossroad can be a neighbour of a crossroad that was removed or merged
+            crossroad = seg.get_crossroad(longitude, latitude) if any([region.is_crossroad() for region in seg.regions.values()]) else None
+            if not crossroad or not self.isSameCrossroad(key, seg, crossroad[0]):
+                self.index.remove(key)
+                self.stats["removed"] += 1
+                yield key, None
+                continue
+
+            segmentation = crossroad[0].to_json_data()
+            desc.computeModel(G, [segmentation])
+            description = desc.generateDescription()
+            self.index.add(key, desc.crossroad, segmentation)
+            yield key, {"coordinates" : list(key), **desc.getJSONData(description["structure"])}
+
+    # Whether a crossroad found after a change is the indexed one : it keeps one of its nodes, or its center is close to
+    # its coordinates (the nodes of the crossroad were drawn again)
+    # Params :
+    #   key : identifier of the indexed crossroad (its coordinates)
+    #   seg : crseg segmentation of the graph around the crossroad
+    #   region : crossroad found around the coordinates
+    def isSameCrossroad(self, key, seg, region):
+        nodes = region.to_json_data()[0]["nodes"]
+        indexed = self.index.crossroads[key]["segmentation"][0]["nodes"]
+        if set(nodes["inner"] + nodes["border"]) & set(indexed["inner"] + indexed["border"]):
+            return True
+        center = seg.G.nodes[region.get_center()]
+        return greatCircleDistances(key[0], key[1], center["y"], center["x"]) <= config.update_match_distance
+
+    # Edges of each way of the graph
+    def getWayEdges(self):
+        way_edges = {}
+        for u, v, k, osmid in self.G.edges(keys=True, data="osmid"):
+            way_edges.setdefault(osmid, []).append((u, v, k))
+        return way_edges
+
+    # Apply an osmChange to the graph
+    # Returns : the ids of the nodes and ways whose tags only changed, and the ids of those whose topology changed
+    def updateGraph(self, change):
+        import osmnx as ox
+        G = self.G
+        node_tags = ox.settings.useful_tags_node
+        way_tags = [tag for tag in ox.settings.useful_tags_way if tag != "oneway"]
+        tag_nodes, tag_ways, topology_nodes, topology_ways = set(), set(), set(), set()
+
+        for node_id, (action, location, tags) in change.nodes.items():
+            if node_id not in G:
+                # created nodes are added with their ways
+                continue
+            if action == "delete":
+                G.remove_node(node_id)
+                topology_nodes.add(node_id)
+                continue
+            node = G.nodes[node_id]
+            tags = {tag : tags[tag] for tag in node_tags if tag in tags}
+            # the crossing set by prepare_network at the end of the footways is kept
+            if "highway" not in tags and node.get("highway") == "crossing":
+                tags["highway"] = "crossing"
+            changed = set([tag for tag in node_tags if node.get(tag) != tags.get(tag)])
+            for tag in changed:
+                if tag in tags:
+                    node[tag] = tags[tag]
+                else:
+                    del node[tag]
+            moved = (node["y"], node["x"]) != location
+            if moved:
+                node["y"], node["x"] = location
+                ox.distance.add_edge_lengths(G, edges=list(G.in_edges(node_id, keys=True)) + list(G.out_edges(node_id, keys=True)))
+            if moved or changed & set(config.segmentation_node_tags):
+                topology_nodes.add(node_id)
+            elif changed:
+                tag_nodes.add(node_id)
+
+        way_edges = self.getWayEdges() if change.ways else {}
+        added_nodes = []
+        for way_id, (action, node_ids, tags) in change.ways.items():
+            edges = way_edges.get(way_id, [])
+
+            # same edges : only the tags of the way have changed
+            if edges and action != "delete" and isNetworkWay(tags) and set([(u, v) for u, v, k in edges]) == set(getPathEdges(node_ids, tags)):
+                data = G.edges[edges[0]]
+                changed = set([tag for tag in way_tags if data.get(tag) != tags.get(tag)])
+                for u, v, k in edges:
+                    for tag in changed:
+                        if tag in tags:
+                            G.edges[u, v, k][tag] = tags[tag]
+                        else:
+                            del G.edges[u, v, k][tag]
+                if changed & set(config.segmentation_way_tags):
+                    topology_ways.add(way_id)
+                elif changed:
+                    tag_ways.add(way_id)
+                continue
+
+            G.remove_edges_from(edges)
+            updated = len(edges) > 0
+            if action != "delete" and self.addWay(way_id, node_ids, tags, change):
+                updated = True
+                added_nodes += node_ids
+            if updated:
+                topology_ways.add(way_id)
+                topology_nodes.update([u for u, v, k in edges] + [v for u, v, k in edges] + node_ids)
+
+        G.remove_nodes_from([node_id for node_id in topology_nodes if node_id in G and G.degree(node_id) == 0])
+        if topology_nodes:
+            topology_nodes.update(self.prepareNetwork(added_nodes))
+        return tag_nodes, tag_ways, topology_nodes, topology_ways
+
+    # Apply the rules of Segmentation.prepare_network that depend on the rest of the graph, after ways were added or
+    # removed : one way between two nodes (the others being supplementary highways, see
+    # prepare_network_remove_supplementary_highways), and only the largest connected component
+    # Params :
+    #   node_ids : nodes of the added ways
+    # Returns : the nodes removed from the graph
+    def prepareNetwork(self, node_ids):
+        import networkx as nx
+        import crseg.segmentation as cs
+        G = self.G
+
+        # supplementary highways between the nodes of the added ways, chosen as in the whole graph
+        H = G.subgraph([node_id for node_id in dict.fromkeys(node_ids) if node_id in G]).copy()
+        edges = set(H.edges(keys=True))
+        cs.Segmentation.prepare_network_remove_supplementary_highways(H)
+        G.remove_edges_from(edges - set(H.edges(keys=True)))
+        # one edge between two nodes, with the key 0, as prepare_network leaves them
+        for u, v, k in H.edges(keys=True):
+            if k != 0 and not G.has_edge(u, v, 0):
+                G.add_edge(u, v, 0, **G.edges[u, v, k])
+                G.remove_edge(u, v, k)
+
+        # ways that are not connected to the graph anymore, or were added apart from it
+        removed = []
+        components = list(nx.weakly_connected_components(G))
+        if len(components) > 1:
+            largest = max(components, key=len)
+            removed = [node_id for component in components if component is not largest for node_id in component]
+            G.remove_nodes_from(removed)
+        return removed
+
+    # Add a way of an osmChange to the graph, following the rules of Segmentation.prepare_network
+    # Returns : True if the graph has changed
+    def addWay(self, way_id, node_ids, tags, change):
+        import osmnx as ox
+        G = self.G
+        if not isNetworkWay(tags):
+            return False
+
+        # the nodes of a footway are crossings, the footway itself being removed
+        updated = False
+        psv = tags.get("psv") == "yes"
+        if "footway" in tags or tags["highway"] == "footway":
+            for node_id in node_ids:
+                if node_id in G and "highway" not in G.nodes[node_id]:
+                    G.nodes[node_id]["highway"] = "crossing"
+                    updated = True
+            if not psv:
+                return updated
+        if (tags["highway"] in ["path", "pedestrian", "steps"] and not psv) or tags["highway"] == "cycleway" or tags.get("service") == "parking_aisle":
+            return updated
+
+        # nodes that are neither in the graph nor created by the change are unknown, and left out
+        nodes = {}
+        for node_id in node_ids:
+            if node_id not in G and node_id in change.nodes and change.nodes[node_id][0] != "delete":
+                action, location, node_tags = change.nodes[node_id]
+                nodes[node_id] = {"y" : location[0], "x" : location[1], **{tag : node_tags[tag] for tag in ox.settings.useful_tags_node if tag in node_tags}}
+        node_ids = [node_id for node_id in node_ids if node_id in G or node_id in nodes]
+        if len(set(node_ids)) < 2:
+            return updated
+        for node_id in node_ids:
+            if node_id not in G:
+                G.add_node(node_id, **nodes[node_id])
+
+        path = {"osmid" : way_id, "nodes" : node_ids, **{tag : tags[tag] for tag in ox.settings.useful_tags_way if tag in tags}}
+        ox.graph._add_paths(G, [path])
+        edges = [(u, v, k) for u, v in set(getPathEdges(node_ids, tags)) for k in G[u][v] if G[u][v][k]["osmid"] == way_id]
+        ox.distance.add_edge_lengths(G, edges=edges)
+        return True
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
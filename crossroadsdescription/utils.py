@@ -1,9 +1,67 @@
-from scipy.stats import circmean
-import osmnx as ox
-import networkx as nx
-import pandas as pd
+import numpy as np
 import operator
-import copy
+import json
+import csv
+import threading
+import weakref
+from . import config
+from contextlib import contextmanager
+
+_osmnx_settings_lock = threading.RLock()
+
+# OSMnx reads the tags to keep from its global settings. This context manager sets them only while the graph is loaded,
+# holding a lock so that concurrent loadings do not see each other's tags. It should not be held during downloads :
+# TileCache.getGraph only takes it to build the graph. The lock is reentrant, so that a thread holding it can still call
+# TileCache.getGraph.
+# Params :
+#   way_tags : tags to keep on ways, in addition to the OSMnx defaults
+#   node_tags : tags to keep on nodes, in addition to the OSMnx defaults
+@contextmanager
+def osmnxTags(way_tags, node_tags):
+    import osmnx as ox
+    with _osmnx_settings_lock:
+        useful_tags_way = ox.settings.useful_tags_way
+        useful_tags_node = ox.settings.useful_tags_node
+        ox.settings.useful_tags_way = list(dict.fromkeys(useful_tags_way + way_tags))
+        ox.settings.useful_tags_node = list(dict.fromkeys(useful_tags_node + node_tags))
+        try:
+            yield
+        finally:
+            ox.settings.useful_tags_way = useful_tags_way
+            ox.settings.useful_tags_node = useful_tags_node
+
+#
+# Geodesic computations
+#
+# The formulas of ox.bearing.calculate_bearing and ox.distance.great_circle_vec, so that describing a crossroad does
+# not load OSMnx (and its plotting and GeoPandas dependencies) when the graph is already built.
+#
+
+# earth radius in meters, as used by OSMnx
+EARTH_RADIUS = 6371009
+
+# Compass bearings between pairs of points
+# Params : latitudes and longitudes of the points, as floats or numpy arrays
+# Returns : the bearings in degrees, clockwise from the north
+def calculateBearings(lat1, lng1, lat2, lng2):
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    d_lng = np.radians(lng2 - lng1)
+    y = np.sin(d_lng) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(d_lng)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+# Great circle distances between pairs of points (haversine formula)
+# Params : latitudes and longitudes of the points, as floats or numpy arrays
+# Returns : the distances in meters
+def greatCircleDistances(lat1, lng1, lat2, lng2):
+    y1 = np.deg2rad(lat1)
+    y2 = np.deg2rad(lat2)
+    x1 = np.deg2rad(lng1)
+    x2 = np.deg2rad(lng2)
+    h = np.sin((y2 - y1) / 2) ** 2 + np.cos(y1) * np.cos(y2) * np.sin((x2 - x1) / 2) ** 2
+    h = np.minimum(1, h)
+    return 2 * np.arcsin(np.sqrt(h)) * EARTH_RADIUS
 
 # Compute mean coordinates of a list of nodes
 # Params :
@@ -19,65 +77,216 @@ def meanCoordinates(G, nodes):
     return crossroad_center
 
 # Compute mean angle (azimuth) of a branch (represented by its border nodes) from the center of the crossroad
-def meanAngle(G, border_nodes, crossroad_center):
-    angles = []
-    for border_node in border_nodes:
-        border_node = G.nodes[border_node]
-        angles.append(ox.bearing.calculate_bearing(crossroad_center["y"], crossroad_center["x"], border_node["y"], border_node["x"]))
-    mean_angle = circmean(angles, 0, 360)
-    return mean_angle
-
-# Remove edges that are not part of the crossroads
-def cleanGraph(G, crossroad_edges):
-    clean_G = G.copy()
-    to_remove = []
-    for (n1, n2, edge) in G.edges(data=True):
-        if "%s%s"%(n1,n2) not in crossroad_edges.keys() and "%s%s"%(n2,n1) not in crossroad_edges.keys():
-            to_remove.append([n1,n2])
-    clean_G.remove_edges_from(to_remove)
-    clean_G = ox.utils_graph.remove_isolated_nodes(clean_G)
-    return clean_G 
+def meanAngle(context, border_nodes, crossroad_center):
+    center = (crossroad_center["x"], crossroad_center["y"])
+    angles = np.radians(context.getBearings([center] * len(border_nodes), [context.getCoordinates(node) for node in border_nodes]))
+    # circular mean
+    mean_angle = np.degrees(np.arctan2(np.sin(angles).sum(), np.cos(angles).sum())) % 360
+    return float(mean_angle)
+
+#
+# Edge index
+#
+# Values (ways, branch edges...) indexed by the two nodes of an edge. Keys are normalized so that an edge is found
+# from either orientation, and the orientation the edge was added with is kept.
+#
+
+class EdgeIndex():
+
+    def __init__(self):
+        self.edges = {}
+
+    @staticmethod
+    def getKey(n1, n2):
+        return (n1, n2) if n1 <= n2 else (n2, n1)
+
+    def add(self, n1, n2, value):
+        self.edges[EdgeIndex.getKey(n1, n2)] = ((n1, n2), value)
+
+    def get(self, n1, n2, default = None):
+        edge = self.edges.get(EdgeIndex.getKey(n1, n2))
+        return edge[1] if edge is not None else default
+
+    # Returns : True if the edge was added as n1 -> n2, False if it was added as n2 -> n1, None if it does not exist
+    def isForward(self, n1, n2):
+        edge = self.edges.get(EdgeIndex.getKey(n1, n2))
+        return edge[0] == (n1, n2) if edge is not None else None
+
+    def __contains__(self, edge):
+        return EdgeIndex.getKey(edge[0], edge[1]) in self.edges
+
+    def __len__(self):
+        return len(self.edges)
+
+    # edges, as (n1, n2) tuples in the orientation they were added with
+    def keys(self):
+        return [edge[0] for edge in self.edges.values()]
+
+    def values(self):
+        return [edge[1] for edge in self.edges.values()]
+
+    def items(self):
+        return list(self.edges.values())
+
+#
+# Crossroad context
+#
+# Built once per described crossroad, it gives the geometric functions below a view of the crossroad and its branches
+# instead of the whole downloaded graph, along with their undirected adjacency, node coordinates and edge lengths.
+# Nothing is copied from the input graph, which is only read around the external nodes of the branches.
+#
+
+# position of each node in its graph, computed once per graph (and again if the graph was edited)
+_node_ranks = weakref.WeakKeyDictionary()
+
+def getNodeRanks(G):
+    ranks = _node_ranks.get(G)
+    if ranks is None or len(ranks) != len(G):
+        ranks = {node : i for i, node in enumerate(G)}
+        _node_ranks[G] = ranks
+    return ranks
+
+class CrossroadContext():
+
+    # Params :
+    #   G : osmnx graph
+    #   crossroad_edges : EdgeIndex of the ways of the crossroad and its branches
+    #   inner_nodes, border_nodes, external_nodes : node ids of the crossroad, of its border, and of the ends of its branches
+    def __init__(self, G, crossroad_edges, inner_nodes, border_nodes, external_nodes):
+        self.G = G
+        self.inner_nodes = set(inner_nodes)
+        self.border_nodes = set(border_nodes)
+        self.external_nodes = list(external_nodes)
+        self.crossroad_nodes = self.inner_nodes | self.border_nodes
+
+        # directed view of the crossroad edges, in both orientations when they exist
+        edges = []
+        pairs = set()
+        for (n1, n2) in crossroad_edges.keys():
+            for (u, v) in [(n1, n2), (n2, n1)]:
+                if (u, v) not in pairs and G.has_edge(u, v):
+                    pairs.add((u, v))
+                    edges += [(u, v, k) for k in G[u][v]]
+        self.graph = G.edge_subgraph(edges)
+
+        # undirected adjacency of the view, in the order of the input graph
+        self.adjacency = {}
+        for (u, v) in self.graph.edges():
+            for (a, b) in [(u, v), (v, u)]:
+                neighbors = self.adjacency.setdefault(a, [])
+                if b not in neighbors:
+                    neighbors.append(b)
+
+        self.coordinates = {node : (self.G.nodes[node]["x"], self.G.nodes[node]["y"]) for node in self.graph.nodes}
+        self.lengths = {}
+
+        # rotation system : neighbors of each node in clockwise order, in the crossroad view and (computed when needed) in the whole graph
+        self.rotations = {}
+        self.graph_rotations = {}
+        self.computeRotations(self.adjacency, self.rotations)
+
+    def getCoordinates(self, node):
+        if node not in self.coordinates:
+            self.coordinates[node] = (self.G.nodes[node]["x"], self.G.nodes[node]["y"])
+        return self.coordinates[node]
+
+    # Successors of each node of the crossroad view, the nodes and their successors being in the order of the input graph
+    def getSuccessors(self):
+        ranks = getNodeRanks(self.G)
+        return {node : [neighbor for neighbor in self.G.succ[node] if self.graph.has_edge(node, neighbor)] for node in sorted(self.graph.nodes, key=lambda node: ranks.get(node, len(ranks)))}
+
+    # Neighbors of a node, in the crossroad view or in the whole input graph
+    def getNeighbors(self, node, crossroad_only = True):
+        if crossroad_only:
+            return self.adjacency.get(node, [])
+        return list(dict.fromkeys(list(self.G.successors(node)) + list(self.G.predecessors(node))))
+
+    # Bearings from each origin to the matching destination, computed at once
+    # Params :
+    #   origins, destinations : lists of (x, y) coordinates
+    # Returns : numpy array of bearings, in degrees
+    def getBearings(self, origins, destinations):
+        o = np.array(origins, dtype=float).reshape(-1, 2)
+        d = np.array(destinations, dtype=float).reshape(-1, 2)
+        return calculateBearings(o[:, 1], o[:, 0], d[:, 1], d[:, 0])
+
+    # Sort the neighbors of every node of an adjacency by bearing (clockwise, starting from the north)
+    def computeRotations(self, adjacency, rotations):
+        pairs = [(node, neighbor) for node, neighbors in adjacency.items() for neighbor in neighbors]
+        if len(pairs) == 0:
+            return
+        bearings = self.getBearings([self.getCoordinates(n1) for n1, n2 in pairs], [self.getCoordinates(n2) for n1, n2 in pairs])
+        i = 0
+        for node, neighbors in adjacency.items():
+            order = np.argsort(bearings[i:i+len(neighbors)], kind="stable")
+            rotations[node] = [neighbors[j] for j in order]
+            i += len(neighbors)
+
+    # Neighbors of a node in clockwise order, in the crossroad view or in the whole input graph
+    def getRotation(self, node, crossroad_only = True):
+        if crossroad_only:
+            return self.rotations.get(node, [])
+        if node not in self.graph_rotations:
+            self.graph_rotations[node] = []
+            self.computeRotations({node : self.getNeighbors(node, False)}, self.graph_rotations)
+        return self.graph_rotations[node]
+
+    # Great circle lengths of edges, rounded as osmnx does
+    # Params :
+    #   edges : list of (n1, n2) tuples
+    def getLengths(self, edges):
+        missing = [edge for edge in edges if edge not in self.lengths]
+        if missing:
+            c = np.array([self.getCoordinates(n1)[::-1] + self.getCoordinates(n2)[::-1] for (n1, n2) in missing])
+            dists = greatCircleDistances(c[:, 0], c[:, 1], c[:, 2], c[:, 3]).round(3)
+            dists[np.isnan(dists)] = 0
+            for (n1, n2), dist in zip(missing, dists):
+                self.lengths[(n1, n2)] = self.lengths[(n2, n1)] = float(dist)
+        return [self.lengths[edge] for edge in edges]
 
 # Get the cycle path that represents the border of the crossroads
-def getBorderPath(G, crossroad_inner_nodes, crossroad_border_nodes, crossroad_external_nodes, crossroad_edges):
+def getBorderPath(context):
 
-    G = ox.utils_graph.get_undirected(G)
+    # the walk starts in the whole graph, to find which neighbor of the first external node is outside of the crossroad,
+    # then goes on in the crossroad only
+    crossroad_only = False
 
-    n1 = list(crossroad_external_nodes.keys())[0]
+    n1 = context.external_nodes[0]
     path = [n1]
     while True:
-        neighbors = [neighbor for neighbor in G.neighbors(path[-1])]
-        azimuth_by_node = [[next_node, ox.bearing.calculate_bearing(G.nodes[path[-1]]["y"], G.nodes[path[-1]]["x"], G.nodes[next_node]["y"], G.nodes[next_node]["x"])] for next_node in neighbors]
-        azimuth_by_node.sort(key=lambda x: x[1]) # format : [[n1, azimuth], [n2, azimuth],...]
+        rotation = context.getRotation(path[-1], crossroad_only) # neighbors in clockwise order
         if len(path) > 1: # if we started the path, the next node corresponds to the index next the n-2 node
-            if path[-1] in list(crossroad_external_nodes.keys()): # if encountering an external border node, we go back
+            if path[-1] in context.external_nodes: # if encountering an external border node, we go back
                 next_node = path[-2]
             else:
-                next_node = azimuth_by_node[([el[0] for el in azimuth_by_node].index(path[-2]) + 1) % len(azimuth_by_node)][0]
+                next_node = rotation[(rotation.index(path[-2]) + 1) % len(rotation)]
         else : # the first node of the path
-            if len(azimuth_by_node) == 1: # if there's only one neighbour, it's the next node
-                next_node = azimuth_by_node[0][0]
+            if len(rotation) == 1: # if there's only one neighbour, it's the next node
+                next_node = rotation[0]
             else: # else we grab an external node and use it to find the next node
                 external = None
                 nodes = []
-                for el in azimuth_by_node:
-                    if el[0] not in (list(crossroad_border_nodes.keys()) + list(crossroad_inner_nodes.keys())):
+                for node in rotation:
+                    if node not in context.crossroad_nodes:
                         if external is None:
-                            external = el[0]
-                            nodes.append(el)
+                            external = node
+                            nodes.append(node)
                     else:
-                        nodes.append(el)  
-                next_node = nodes[([el[0] for el in nodes].index(external) + 1) % len(nodes)][0]
-                G = cleanGraph(G, crossroad_edges)
+                        nodes.append(node)  
+                next_node = nodes[(nodes.index(external) + 1) % len(nodes)]
+                crossroad_only = True
         path.append(next_node)
         if path[-1] == n1: return path
 
 def getBranchesEdges(border_path, seg_crossroad_branches, external_nodes):
     
     branch_edges = []
+    edge_index = EdgeIndex()
     for branch in seg_crossroad_branches:
         for edge in branch.edges_by_nodes:
-            branch_edges.append({'branch_id' : branch.id, 'edge_id' : "%s%s"%(edge[0],edge[1]), 'order' : None})
+            branch_edge = {'branch_id' : branch.id, 'edge' : (edge[0], edge[1]), 'order' : None}
+            branch_edges.append(branch_edge)
+            edge_index.add(edge[0], edge[1], branch_edge)
     
     # How it works : 
     # Follow the border path, check if the edge (current node + next node) is part of a branch. If yes, ordering it starting from 0.
@@ -87,41 +296,146 @@ def getBranchesEdges(border_path, seg_crossroad_branches, external_nodes):
     order = 0
     first_branch = None
     flag = False
+    external_nodes = set(external_nodes)
     for i in range(len(border_path)):
         if border_path[i] in external_nodes:
-            for edge in branch_edges:
-                next_i = i-1 if i == len(border_path)-1 else i+1
-                if edge["edge_id"] in ["%s%s"%(border_path[i], border_path[next_i]), "%s%s"%(border_path[next_i], border_path[i])] and edge["order"] is None:
-                        if first_branch is None:
-                            first_branch = edge["branch_id"]
-                        if flag == False and edge["branch_id"] != first_branch:
-                            flag = True
-                        if flag and edge["branch_id"] == first_branch:
-                            edge["order"] = -(len(branch_edges)-order)
-                        else:
-                            edge["order"] = order
-                        order += 1
+            next_i = i-1 if i == len(border_path)-1 else i+1
+            edge = edge_index.get(border_path[i], border_path[next_i])
+            if edge is not None and edge["order"] is None:
+                if first_branch is None:
+                    first_branch = edge["branch_id"]
+                if flag == False and edge["branch_id"] != first_branch:
+                    flag = True
+                if flag and edge["branch_id"] == first_branch:
+                    edge["order"] = -(len(branch_edges)-order)
+                else:
+                    edge["order"] = order
+                order += 1
 
     branch_edges.sort(key=operator.itemgetter('order'))
 
     return branch_edges
 
 # Detect islands by closing branches with multiple ways, then by detecting faces
-def getIslands(G, branches, crossroad_border_nodes):
-    tG = copy.deepcopy(G)
+# Params :
+#   algorithm : "faces" to walk the faces of the planar graph, "cycle_basis" to use the minimum cycle basis of the graph
+#   (former algorithm, kept for parity testing), config.islands_algorithm when it is read by default
+# Returns : the islands, as lists of node ids in clockwise order
+def getIslands(context, branches, algorithm = None):
+    if algorithm is None:
+        algorithm = config.islands_algorithm
+
+    # neighbors of each node of the crossroad, in the order of the input graph, so that the cycle basis (and the
+    # numbering of the islands) is the one of the graph the crossroad was cut from
+    successors = context.getSuccessors()
 
+    closing_edges = []
     for i, branch in enumerate(branches): 
         border_nodes = []
         for j, way in enumerate(branch.ways):
             for junction in way.junctions:
-                if junction.id not in crossroad_border_nodes.keys():
+                if junction.id not in context.border_nodes:
                     border_nodes.append(junction)    
         # Create faces for islands not closed in the graph (border islands)
         for j in range(len(border_nodes)-1):
-            tG.add_edge(border_nodes[j].id, border_nodes[j+1].id)
-    ox.distance.add_edge_lengths(tG)
+            closing_edges.append((border_nodes[j].id, border_nodes[j+1].id))
+            if border_nodes[j+1].id not in successors[border_nodes[j].id]:
+                successors[border_nodes[j].id].append(border_nodes[j+1].id)
+
+    if algorithm == "cycle_basis":
+        return getIslandsFromCycleBasis(context, successors)
+    return getIslandsFromFaces(context, closing_edges)
+
+# Walk the faces of the crossroad, embedded in the plane by its node coordinates. Each directed edge belongs to exactly
+# one face : from an edge u -> v, the next edge of the face leaves v towards the neighbor that follows u in clockwise
+# order (the leftmost turn). Bounded faces are walked counterclockwise and the outer face clockwise, so the islands are
+# the faces with a positive area.
+def getIslandsFromFaces(context, closing_edges):
+
+    # rotation system of the crossroad, updated around the closing edges
+    rotations = context.rotations
+    if closing_edges:
+        adjacency = {}
+        for (n1, n2) in closing_edges:
+            if n1 == n2:
+                continue
+            for (a, b) in [(n1, n2), (n2, n1)]:
+                neighbors = adjacency.setdefault(a, list(context.adjacency.get(a, [])))
+                if b not in neighbors:
+                    neighbors.append(b)
+        rotations = dict(context.rotations)
+        context.computeRotations(adjacency, rotations)
+    positions = {node : {neighbor : i for i, neighbor in enumerate(rotation)} for node, rotation in rotations.items()}
+
+    faces = []
+    flat_faces = []
+    visited = set()
+    for node, rotation in rotations.items():
+        for neighbor in rotation:
+            if (node, neighbor) in visited:
+                continue
+            face = []
+            edge = (node, neighbor)
+            while edge not in visited:
+                visited.add(edge)
+                face.append(edge[0])
+                n1, n2 = edge
+                edge = (n2, rotations[n2][(positions[n2][n1] + 1) % len(rotations[n2])])
+            face = removeSpikes(face)
+            if len(face) < 3:
+                continue
+            area = getSignedArea(face, context)
+            # flat faces (aligned nodes) are kept once, as islands closed along an existing way
+            if area > 0 or (area == 0 and len(set(face)) == len(face) and set(face) not in flat_faces):
+                if area == 0:
+                    flat_faces.append(set(face))
+                faces.append(face[::-1])
+
+    return faces
+
+# Remove the dead ends (u, v, u) of a closed walk
+def removeSpikes(face):
+    walk = []
+    for node in face:
+        if len(walk) >= 2 and walk[-2] == node:
+            walk.pop()
+        else:
+            walk.append(node)
+    # the walk is closed : dead ends may also lie across its start
+    while len(walk) > 2:
+        if walk[-1] == walk[1]:
+            walk = walk[1:-1]
+        elif walk[-2] == walk[0]:
+            walk = walk[:-2]
+        else:
+            break
+    return walk
+
+# Signed area of a polygon in the coordinates plane, positive if its nodes are in counterclockwise order
+def getSignedArea(polygon, context):
+    coordinates = [context.getCoordinates(node) for node in polygon]
+    area = 0
+    for i in range(len(coordinates)):
+        x1, y1 = coordinates[i-1]
+        x2, y2 = coordinates[i]
+        area += x1*y2 - x2*y1
+    return area / 2
+
+def getIslandsFromCycleBasis(context, successors):
+    import networkx as nx
+
+    # undirected graph weighted by the edges length
+    edges = []
+    seen = set()
+    for n1, nodes in successors.items():
+        for n2 in nodes:
+            if (n1, n2) not in seen:
+                edges.append((n1, n2))
+                seen.add((n2, n1))
+    tG = nx.Graph()
+    tG.add_nodes_from(successors)
+    tG.add_weighted_edges_from([(n1, n2, length) for (n1, n2), length in zip(edges, context.getLengths(edges))], "length")
 
-    tG = nx.Graph(tG)
     faces = []
     for cycle in nx.minimum_cycle_basis(tG, "length"):
         ordered = []
@@ -132,23 +446,25 @@ def getIslands(G, branches, crossroad_border_nodes):
             neighbors = list(set(tG.neighbors(to_handle)).intersection(cycle))
             if len(neighbors) > 0:
                 to_handle = neighbors[0]
+        if not isPolygonClockwiseOrdered(ordered, context):
+            ordered = list(reversed(ordered))
         faces.append(ordered)
 
     return faces
 
 # Get sidewalks by following the border path of the intersection
-def getSidewalks(border_path, branches, external_nodes):
+def getSidewalks(context, border_path, branches):
 
     branch_nodes = []
-    sidewalk_nodes = []
+    sidewalk_nodes = set()
     for branch in branches:
         ways = [branch.ways[0]]
         if len(branch.ways) > 1: ways.append(branch.ways[-1])
         nodes = []
         for way in ways:
             for junction in way.junctions:
-                if junction.id in external_nodes and junction.id not in nodes: nodes.append(junction.id)
-        sidewalk_nodes += nodes
+                if junction.id in context.external_nodes and junction.id not in nodes: nodes.append(junction.id)
+        sidewalk_nodes.update(nodes)
         branch_nodes.append(nodes)
 
     sidewalks = []
@@ -162,24 +478,21 @@ def getSidewalks(border_path, branches, external_nodes):
 
     return sidewalks
 
-def isPolygonClockwiseOrdered(polygon, G):
-    polygon = list(polygon)
-    for i in range(len(polygon)):
-        id = polygon[i]
-        polygon[i] = {"x":G.nodes[id]["x"],"y":G.nodes[id]["y"]}
+def isPolygonClockwiseOrdered(polygon, context):
+    polygon = [context.getCoordinates(id) for id in polygon]
     # we close the polygon if it's not closed
     if polygon[0] != polygon[-1]:
         polygon.append(polygon[0])
     sum = 0
     for i in range(len(polygon)-1):
-        x1 = polygon[i]["x"]
-        x2 = polygon[i+1]["x"]
-        y1 = polygon[i]["y"]
-        y2 = polygon[i+1]["y"]
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[i+1]
         sum += (x2 - x1)*(y2 + y1)
     return sum >= 0
 
 def displayPath(G, path):
+    import osmnx as ox
+    import pandas as pd
     ec = {}
 
     edges = []
@@ -198,4 +511,28 @@ def tr(word):
     if word == "Road":
         return "circulation"
     if word == "Bus":
-        return "bus"
\ No newline at end of file
+        return "bus"
+
+# Load a list of coordinates from a CSV file (latitude and longitude columns, with or without header) or from a GeoJSON file of points
+# Returns : a list of [latitude, longitude]
+def loadCoordinates(path):
+    coordinates = []
+    if path.split('.')[-1].lower() in ["geojson", "json"]:
+        with open(path) as f:
+            data = json.load(f)
+        features = data["features"] if data["type"] == "FeatureCollection" else [data]
+        for feature in features:
+            longitude, latitude = feature["geometry"]["coordinates"][:2]
+            coordinates.append([latitude, longitude])
+    else:
+        with open(path, newline='') as f:
+            rows = [row for row in csv.reader(f) if row]
+        lat_col, lon_col = 0, 1
+        header = [col.strip().lower() for col in rows[0]]
+        if "lat" in header or "latitude" in header:
+            lat_col = header.index("lat") if "lat" in header else header.index("latitude")
+            lon_col = [header.index(name) for name in ["lon", "lng", "longitude"] if name in header][0]
+            rows = rows[1:]
+        for row in rows:
+            coordinates.append([float(row[lat_col]), float(row[lon_col])])
+    return coordinates
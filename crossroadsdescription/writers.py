@@ -0,0 +1,171 @@
+import json
+import os
+
+#
+# Streaming writers
+#
+# Write records (crossroads, features...) one by one to a file, flushing each of them, so that a long run keeps a
+# constant memory and an interrupted run keeps what was written. In resume mode, the records of a partial output are
+# read back : a truncated last record is removed, and the keys of the complete records are kept in done so that the
+# caller can skip them.
+#
+
+# JSON encoder of the records
+# Params :
+#   name : "json" (standard library) or "orjson" (faster, if installed, writing JSON without spaces)
+# Returns : a function encoding a record to a string
+def getJSONEncoder(name = "json"):
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            raise ImportError("The orjson encoder requires orjson (pip install orjson)")
+        return lambda record: orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    if name != "json":
+        raise ValueError("Unknown JSON encoder %s, expected json or orjson"%name)
+    return lambda record: json.dumps(record, ensure_ascii=False)
+
+class RecordWriter():
+
+    # text written before each record
+    prefix = ""
+
+    # Params :
+    #   path : path of the output file
+    #   key : function giving the key of a record, used by resume mode
+    #   resume : append to a partial output instead of replacing it
+    #   grouped : records are written by groups sharing the same key (see writeAll). In resume mode, the last group
+    #   may be incomplete, so its records are removed as well.
+    #   encoder : JSON encoder of the records (see getJSONEncoder), the standard library one by default
+    def __init__(self, path, key = None, resume = False, grouped = False, encoder = None):
+        self.path = path
+        self.key = key
+        self.grouped = grouped
+        self.encoder = encoder if encoder else getJSONEncoder()
+        self.done = set()
+        if resume and os.path.exists(path):
+            self.recover()
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    # Split the content of a file into records
+    # Returns : the records as (start offset, end offset, text)
+    def split(self, content):
+        records = []
+        start = 0
+        while start < len(content):
+            end = content.find(b"\n", start)
+            if end == -1:
+                break
+            records.append((start, end + 1, content[start:end + 1]))
+            start = end + 1
+        return records
+
+    # Read the complete records of a partial output, and truncate it after the last one
+    def recover(self):
+        with open(self.path, "rb") as f:
+            content = f.read()
+
+        valid_end = 0
+        groups = []
+        for start, end, text in self.split(content):
+            try:
+                record = json.loads(text[len(self.prefix):].decode("utf-8"))
+            except ValueError:
+                break
+            key = self.key(record) if self.key else None
+            if not groups or groups[-1][0] != key:
+                groups.append((key, start))
+            valid_end = end
+
+        if self.grouped and groups:
+            valid_end = groups.pop()[1]
+        self.done = set([key for key, start in groups])
+
+        if valid_end < len(content):
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+
+    def write(self, record):
+        self.writeAll([record])
+
+    # Write several records at once, as a group in resume mode
+    def writeAll(self, records):
+        self.file.write("".join([self.prefix + self.encoder(record) + "\n" for record in records]))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Newline delimited JSON : one record per line
+class NDJSONWriter(RecordWriter):
+    pass
+
+# GeoJSON text sequence (RFC 8142) : each record is a GeoJSON text preceded by a record separator and followed by a
+# line feed
+class GeoJSONSeqWriter(RecordWriter):
+
+    prefix = "\x1e"
+
+    def split(self, content):
+        records = []
+        start = content.find(b"\x1e")
+        while start != -1:
+            next_start = content.find(b"\x1e", start + 1)
+            end = len(content) if next_start == -1 else next_start
+            # a record without its final line feed is truncated
+            if not content[start:end].endswith(b"\n"):
+                break
+            records.append((start, end, content[start:end]))
+            start = next_start
+        return records
+
+# Document holding the records between an opening and a closing text, separated from each other. It is the same as
+# encoding the whole document at once, but only valid once closed, so it can not be resumed.
+class DocumentWriter(RecordWriter):
+
+    opening = ""
+    separator = ""
+    closing = ""
+
+    def __init__(self, path, encoder = None):
+        RecordWriter.__init__(self, path, encoder = encoder)
+        self.count = 0
+        self.file.write(self.opening)
+
+    def writeAll(self, records):
+        if not records:
+            return
+        self.file.write((self.separator if self.count else "") + self.separator.join([self.encoder(record) for record in records]))
+        self.file.flush()
+        self.count += len(records)
+
+    def close(self):
+        self.file.write(self.closing)
+        RecordWriter.close(self)
+
+# JSON array of the records
+class JSONArrayWriter(DocumentWriter):
+
+    opening = "["
+    separator = ", "
+    closing = "]"
+
+# GeoJSON FeatureCollection, the records being its features
+class FeatureCollectionWriter(JSONArrayWriter):
+
+    opening = '{"type": "FeatureCollection", "features": ['
+    closing = "]}"
+
+# Text records, one after the other on separate lines
+class TextWriter(DocumentWriter):
+
+    separator = "\n"
+
+    def __init__(self, path):
+        DocumentWriter.__init__(self, path, encoder = str)
@@ -1,17 +1,19 @@
 #!/usr/bin/env python3
 
-from audioop import cross
 import shutil
 import argparse
 import json
 import random
-from copy import deepcopy
+import time
+import gc
+import multiprocessing
+import cProfile
+import pstats
 import osmnx as ox
 import crseg.segmentation as cs
-import crdesc.description as cd
-from crdesc.model import Junction
-import crdesc.utils
-import crdesc.config as config
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as config
+from crossroadsdescription.segmentationCache import SegmentationCache
 
 #
 # Configuration
@@ -20,18 +22,27 @@ import crdesc.config as config
 # configure arg parser
 parser = argparse.ArgumentParser(description="Create an evaluation file for the crossroads descriptions provided by crdesc.")
 parser.add_argument('-c', '--by-coordinates', nargs=2, help='Load input from OSM using the given latitude', type=float)
-parser.add_argument('-f', '--file', nargs=1, help='Load .osm file instead of using Overpass', type=str)
+parser.add_argument('-f', '--file', nargs=1, help='Load .osm file (possibly compressed in .bz2 or .gz, or .osm.pbf if pyosmium is installed) instead of using Overpass', type=str)
+parser.add_argument('--clip', help='With -f, only load the ways within the radius around the coordinates', action='store_true')
 parser.add_argument('-r', '--radius', nargs=1, help='Give a radius to load the data from.', type=float)
 parser.add_argument('-n', '--number', nargs=1, help='Set the number of crossroads to evaluate.', type=int)
 parser.add_argument('-nc', '--no-clear-cache', help='Do not clear cached datas', action='store_true')
-parser.add_argument('-o', '--output', nargs='*', help='Output the JSON evaluation file.', type=str)
+parser.add_argument('--no-cache', help='Always load, prepare and segment the graph instead of using the persistent cache of segmentations', action='store_true')
+parser.add_argument('-o', '--output', nargs='*', help='Output the JSON evaluation file. With a .ndjson or .jsonl extension, crossroads are written one per line as soon as they are described.', type=str)
+parser.add_argument('--resume', help='Resume an interrupted evaluation written as NDJSON : crossroads already in the output file are kept and not described again.', action='store_true')
+parser.add_argument('-w', '--workers', nargs=1, help='Number of processes describing crossroads in parallel (default 1). The graph is shared read-only with the workers.', type=int, default=[1])
+parser.add_argument('--profile', nargs=1, help='Profile the descriptions with cProfile (in this process, -w is ignored) : statistics are written to this file (in the data folder) and the slowest functions are printed', type=str)
+parser.add_argument('--timings', nargs='?', help='Print the duration of each stage for each crossroad, store it in the evaluation file and write the stages as JSON lines to this file (in the data folder, default timings.jsonl)', type=str, const="timings.jsonl")
 args = parser.parse_args()
 
-# create / clean basic folder structure
-folders = ["data", "output"]
+# create / clean basic folder structure (the evaluation being resumed is kept)
+folders = ["output"]
+if not args.resume:
+    folders.append("data")
 if not args.no_clear_cache:
     folders.append("cache")
 for dir in  folders : shutil.rmtree(dir, ignore_errors=True), shutil.os.mkdir(dir) 
+shutil.os.makedirs("data", exist_ok=True)
 
 # use coordinates in parameters if presents, else use the coordinates of this intersection : https://www.openstreetmap.org/#map=19/45.77351/3.09015
 if args.by_coordinates:
@@ -50,15 +61,47 @@ else:
 # OSM data download
 #
 
-# OSMnx configuration
-ox.config(use_cache=True, useful_tags_way = list(set(ox.settings.useful_tags_way + config.way_tags_to_keep)), useful_tags_node = list(set(ox.settings.useful_tags_node + config.node_tags_to_keep)))
+# OSMnx configuration : the tags to keep are only set while loading the graph
+ox.settings.use_cache = True
+
+# the prepared graph and its segmentation are cached, identified by the input data (content of the file or downloaded
+# area), the tags kept and the segmentation parameters
+bbox = ox.utils_geo.bbox_from_point((latitude, longitude), dist=radius) if args.file and args.clip else None
+segmentation_cache = None
+cached = None
+if not args.no_cache:
+    segmentation_cache = SegmentationCache()
+    if args.file:
+        source = {"file" : segmentation_cache.getFileHash(args.file[0]), "bbox" : bbox}
+    else:
+        source = {"point" : [latitude, longitude], "radius" : radius, "network_type" : "all"}
+    inputs = segmentation_cache.getInputs(source)
+    cached = segmentation_cache.getSegmentation(inputs)
+    print("Segmentation cache : %s"%("hit" if cached else "miss"))
 
-xmlfile = None
-if args.file :
-    xmlfile = args.file[0]
-    G = ox.graph_from_xml(args.file[0], simplify=False)
-else :
-    G = ox.graph_from_point((latitude, longitude), dist=radius, network_type="all", retain_all=False, truncate_by_edge=True, simplify=False)
+if cached:
+    G, seg = cached
+else:
+    xmlfile = None
+    with cd.osmnxTags(config.way_tags_to_keep, config.node_tags_to_keep):
+        if args.file :
+            xmlfile = args.file[0]
+            G = cd.graphFromFile(args.file[0], bbox)
+        else :
+            G = ox.graph_from_point((latitude, longitude), dist=radius, network_type="all", retain_all=False, truncate_by_edge=True, simplify=False)
+
+    # graph segmentation (from https://gitlab.limos.fr/jmafavre/crossroads-segmentation/-/blob/master/src/get-crossroad-description.py)
+
+    # prepare network by removing unwanted ways
+    G = cs.Segmentation.prepare_network(G)
+    # build an undirected version of the graph
+    undirected_G = ox.utils_graph.get_undirected(G)
+    # segment it using topology and semantic
+    seg = cs.Segmentation(undirected_G, **config.segmentation_parameters)
+    seg.process()
+
+    if segmentation_cache:
+        segmentation_cache.saveSegmentation(inputs, G, seg)
 
 if not args.output :
     print("You must give an output filename.")
@@ -68,57 +111,111 @@ if not args.output :
     print("You must give a number of crossroads.")
     exit()
 
-# graph segmentation (from https://gitlab.limos.fr/jmafavre/crossroads-segmentation/-/blob/master/src/get-crossroad-description.py)
+# generate evaluation file, the segmentation being read directly from memory
+crossroads = cd.SegmentationReader(seg).data
+
+n = args.number[0]
+if n > len(crossroads):
+    print("Warning : number of available crossroads inferior to the number of wanted crossroads.")
+    n = len(crossroads)
+
+# a crossroad is identified by its border nodes, so that it is found again when the segmentation is computed again
+def getCrossroadKey(crossroad):
+    return tuple(sorted(crossroad[0]["nodes"]["border"]))
+
+# NDJSON output is written while crossroads are described. When resuming, the crossroads already written are kept.
+writer = None
+extension = args.output[0].split('.')[-1].lower()
+if extension in ["ndjson", "jsonl"]:
+    writer = cd.NDJSONWriter("data/%s"%args.output[0], key=getCrossroadKey, resume=args.resume)
+elif args.resume:
+    print("Only an evaluation written as NDJSON (.ndjson or .jsonl) can be resumed.")
+    exit()
+
+remaining = range(len(crossroads))
+if writer and writer.done:
+    remaining = [i for i in remaining if getCrossroadKey(crossroads[i]) not in writer.done]
+    print("Resuming : %s crossroads already evaluated"%(len(crossroads) - len(remaining)))
+    n = max(0, n - (len(crossroads) - len(remaining)))
+
+crossroads_numbers = sorted(random.sample(remaining,n))
+
+# describe one crossroad and measure the time spent, with the spans of its stages when timings are asked. In parallel
+# mode, it runs in a forked worker process that reads G and crossroads from the memory of the main process
+# (copy-on-write) instead of receiving a copy of them.
+def describe(number):
+    start = time.perf_counter()
+    desc = cd.Description()
+    if args.timings:
+        desc.instrumentation = cd.Instrumentation(cd.MemorySink())
+    try:
+        desc.computeModel(G, [crossroads[number]])
+        description = desc.generateDescription()["text"]
+    except:
+        description = "error"
+    spans = desc.instrumentation.sink.spans if args.timings else []
+    return description, time.perf_counter() - start, spans
+
+evaluated = []
+
+profiler = None
+if args.profile:
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+timings_file = None
+if args.timings:
+    timings_file = cd.JSONLinesSink("data/%s"%args.timings)
+
+pool = None
+if args.workers[0] > 1 and not args.profile:
+    # keep the shared objects out of the garbage collector so that it does not write to (and copy) their pages
+    gc.freeze()
+    pool = multiprocessing.get_context("fork").Pool(args.workers[0])
+    results = pool.imap(describe, crossroads_numbers)
+else:
+    results = map(describe, crossroads_numbers)
+
+# results are collected in the order of the crossroads
+start = time.perf_counter()
+for i, (number, (description, duration, spans)) in enumerate(zip(crossroads_numbers, results)):
+    crossroad = crossroads[number]
+    crossroad[0]["description"] = description
+    crossroad[0]["time"] = duration
+
+    print("Crossroads %s / %s (%.2f s)"%(i+1,n,duration))
+
+    # stages of the crossroad, identified by its number in the segmentation
+    if args.timings:
+        stages = {}
+        for span in spans:
+            span.attributes["crossroad"] = number
+            timings_file.record(span)
+            stages[span.name] = stages.get(span.name, 0) + span.duration
+        crossroad[0]["stages"] = stages
+        print("  %s"%cd.formatDurations(stages))
+
+    if writer:
+        writer.write(crossroad)
+    else:
+        evaluated.append(crossroad)
 
-# remove sidewalks, cycleways, service ways
-G = cs.Segmentation.remove_footways_and_parkings(G, False)
-G = crdesc.utils.remove_unwanted_ways(G)
-# build an undirected version of the graph
-G = ox.utils_graph.get_undirected(G)
-# segment it using topology and semantic
-seg = cs.Segmentation(G, C0 = 2, C1 = 2, C2 = 4, max_cycle_elements = 10)
-seg.process()
-seg.to_json_all("data/intersection.json", False)
+if pool:
+    pool.close()
+    pool.join()
+print("%s crossroads described in %.2f s"%(n, time.perf_counter() - start))
+
+if timings_file:
+    timings_file.close()
+if profiler:
+    profiler.disable()
+    profiler.dump_stats("data/%s"%args.profile[0])
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
 
 # generate evaluation file
-with open("data/intersection.json") as json_file:
-
-    crossroads = json.load(json_file)
-
-    n = args.number[0]
-    if n > len(crossroads):
-        print("Warning : number of available crossroads inferior to the number of wanted crossroads.")
-        n = len(crossroads)
-
-    crossroads_numbers = random.sample(range(len(crossroads)),n)
-
-    evaluated = []
-
-    i = 1
-    for number, crossroad in enumerate(crossroads):
-
-        if number in crossroads_numbers:
-            # generate single crossroad json file
-            with open("data/evaluated.json", "w") as evaluated_crossroad:
-                json.dump([crossroad], evaluated_crossroad)
-                evaluated_crossroad.close()
-
-            # then generate the description
-            try:
-                crdesc.model._junctions.clear()
-                desc = cd.Description()
-                desc.computeModel(deepcopy(G), "data/evaluated.json", None)
-                description = desc.generateDescription("http://localhost:8081")
-                crossroad[0]["description"] = description["text"]
-            except:
-                crossroad[0]["description"] = "error"
-            
-            evaluated.append(crossroad)
-
-            print("Crossroads %s / %s"%(i,n))
-            i += 1
-                    
-    # generate single crossroad json file
+if writer:
+    writer.close()
+else:
     with open("data/%s"%args.output[0], "w") as evaluation_file:
         json.dump(evaluated, evaluation_file)
         evaluation_file.close()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import subprocess
+import sys
+
+#
+# Configuration
+#
+
+# import time budget of each module, in milliseconds, and the heavy dependencies it must not load when imported : they
+# are only imported by the code paths that use them (loading a graph, segmenting it, realizing the text...)
+HEAVY = ["osmnx", "crseg.segmentation", "geopandas", "pandas", "networkx", "scipy", "shapely", "matplotlib", "pyrealb", "geojson"]
+MODULES = {
+    "crossroadsdescription.description" : {"budget" : 250, "forbidden" : HEAVY},
+    "crossroadsdescription.tileCache" : {"budget" : 50, "forbidden" : HEAVY},
+    "crossroadsdescription.segmentationCache" : {"budget" : 50, "forbidden" : HEAVY},
+    "crossroadsdescription.writers" : {"budget" : 50, "forbidden" : HEAVY},
+    "crossroadsdescription.prefetcher" : {"budget" : 50, "forbidden" : HEAVY + ["requests"]},
+    "crossroadsdescription.spatialIndex" : {"budget" : 150, "forbidden" : HEAVY}
+}
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Measure the import time of the modules of the package (python -X importtime), and check it against their budgets. Exits with status 1 if a module is over its budget or loads a heavy dependency.")
+parser.add_argument('-m', '--modules', nargs='+', help='Modules to measure (default : %s)'%", ".join(MODULES), type=str, default=list(MODULES))
+parser.add_argument('-n', '--repeat', nargs=1, help='Number of imports of each module, in a new interpreter each time, the fastest one being kept (default 5)', type=int, default=[5])
+parser.add_argument('-s', '--slowest', nargs=1, help='Number of slowest imports to print for each module (default 10)', type=int, default=[10])
+parser.add_argument('-o', '--output', nargs=1, help='Output the results to this JSON file', type=str)
+args = parser.parse_args()
+
+#
+# Measure
+#
+
+# Import a module in a new interpreter
+# Returns : the import times (self and cumulative, in milliseconds) of the module and of the modules it imported, by
+# name. The modules imported by the interpreter at startup are left out.
+def measure(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError("Importing %s failed :\n%s"%(module, result.stderr))
+
+    # imports are listed once done, indented by depth : the module comes after the modules it imported
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = len(name) - len(name.lstrip())
+        if depth == 1 and name.strip() != module:
+            times = {}
+        else:
+            times[name.strip()] = (int(fields[0]) / 1000, int(fields[1]) / 1000)
+            if name.strip() == module:
+                return times
+    return times
+
+results = {}
+failed = False
+for module in args.modules:
+    runs = [measure(module) for i in range(args.repeat[0])]
+    fastest = min(runs, key=lambda times: times[module][1])
+    total = fastest[module][1]
+    budget = MODULES.get(module, {}).get("budget")
+    loaded = [name for name in MODULES.get(module, {}).get("forbidden", []) if name in fastest]
+    over = budget is not None and total > budget
+    failed = failed or over or len(loaded) > 0
+    results[module] = {"time" : total, "budget" : budget, "heavy_dependencies" : loaded}
+
+    print("%s : %.1f ms%s%s"%(module, total, "" if budget is None else " (budget %s ms)%s"%(budget, " OVER BUDGET" if over else ""), "" if not loaded else ", loads " + ", ".join(loaded)))
+    for name, (own, cumulative) in sorted(fastest.items(), key=lambda item: item[1][0], reverse=True)[:args.slowest[0]]:
+        print("  %-50s %8.1f ms (with its imports %.1f ms)"%(name, own, cumulative))
+
+if args.output:
+    with open(args.output[0], "w") as f:
+        json.dump(results, f, indent=2)
+
+exit(1 if failed else 0)
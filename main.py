@@ -3,11 +3,18 @@
 import shutil
 import argparse
 import tempfile
+import atexit
+import cProfile
+import pstats
+from contextlib import nullcontext
 import osmnx as ox
 import crseg.utils as u
 import crseg.segmentation as cs
 import crossroadsdescription.description as cd
 import crossroadsdescription.config as cg
+from crossroadsdescription.tileCache import TileCache
+from crossroadsdescription.segmentationCache import SegmentationCache
+from crossroadsdescription.spatialIndex import SpatialIndex
 
 #
 # Configuration
@@ -16,17 +23,72 @@ import crossroadsdescription.config as cg
 # configure arg parser
 parser = argparse.ArgumentParser(description="Build a basic description of the crossroad located at the requested coordinate.")
 parser.add_argument('-c', '--by-coordinates', nargs=2, help='Load input from OSM using the given latitude', type=float)
-parser.add_argument('-f', '--file', nargs=1, help='Load .osm file instead of downloading data', type=str)
+parser.add_argument('-b', '--batch', nargs=1, help='Describe every crossroad listed in a CSV (latitude, longitude) or GeoJSON (points) file, using one shared graph', type=str)
+parser.add_argument('-f', '--file', nargs=1, help='Load .osm file (possibly compressed in .bz2 or .gz, or .osm.pbf if pyosmium is installed) instead of downloading data', type=str)
+parser.add_argument('--clip', help='With -f, only load the ways around the coordinates (the radius of a download)', action='store_true')
 parser.add_argument('--overpass', help='Use Overpass to download data instead of the OSM api', action='store_true')
 parser.add_argument('-k', '--keep-cache', help='Do not clear cached datas', action='store_true')
-parser.add_argument('-o', '--output', nargs='*', help='Output files containing the description in text, JSON or GeoJSON format (according to the extension of the file).', type=str)
+parser.add_argument('--no-tile-cache', help='Always download data instead of using the persistent tiles cache', action='store_true')
+parser.add_argument('--no-cache', help='Always load, prepare and segment the graph instead of using the persistent cache of segmentations', action='store_true')
+parser.add_argument('-o', '--output', nargs='*', help='Output files containing the description in text, JSON, GeoJSON, .ndjson (one JSON description per line) or .geojsons (GeoJSON text sequence) format, according to the extension of each file. All the files are written in one pass, as crossroads are described.', type=str)
+parser.add_argument('--json-encoder', help='JSON encoder of the outputs : json (standard library) or orjson (faster, if installed, without spaces)', type=str, choices=["json", "orjson"], default=cg.json_encoder)
+parser.add_argument('--resume', help='In batch mode, resume an interrupted run written to a .ndjson or .geojsons file : crossroads already in the file are not described again', action='store_true')
+parser.add_argument('--profile', nargs=1, help='Profile the run with cProfile : statistics are written to this file (in the output folder) and the slowest functions are printed', type=str)
+parser.add_argument('--timings', nargs='?', help='Print the duration of each stage for each crossroad, and write the stages as JSON lines to this file (in the output folder, default timings.jsonl)', type=str, const="timings.jsonl")
+parser.add_argument('--images', nargs='?', help='Draw each described crossroad (ways, branches, sidewalks, islands and crosswalks) to a PNG image in this folder (in the output folder, default images)', type=str, const="images")
+parser.add_argument('--render', help='Save an image of the segmentation of the loaded area to output/crossroad.png (not in batch mode)', action='store_true')
 args = parser.parse_args()
 
-# create / clean basic folder structure
-folders = ["data", "output"]
+# only the streaming outputs of the batch mode can be resumed
+if args.resume and not (args.batch and args.output and all([cd.isResumable(path) for path in args.output])):
+    print("Only a batch run written to .ndjson or .geojsons files can be resumed.")
+    exit()
+json_encoder = cd.getJSONEncoder(args.json_encoder)
+
+# create / clean basic folder structure (the output being resumed is kept)
+folders = []
+if not args.resume:
+    folders.append("output")
 if not args.keep_cache:
     folders.append("cache")
 for dir in  folders : shutil.rmtree(dir, ignore_errors=True), shutil.os.mkdir(dir) 
+shutil.os.makedirs("output", exist_ok=True)
+
+# images of the described crossroads, drawn by one renderer
+renderer = None
+if args.images:
+    shutil.os.makedirs("output/"+args.images, exist_ok=True)
+    renderer = cd.CrossroadRenderer()
+
+# Path of the image of the crossroad at the given coordinates
+def getImagePath(latitude, longitude):
+    return "output/%s/%s_%s.png"%(args.images, latitude, longitude)
+
+# profiling : statistics are written when the script exits
+if args.profile:
+    profiler = cProfile.Profile()
+    def dumpProfile():
+        profiler.disable()
+        profiler.dump_stats("output/"+args.profile[0])
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+    atexit.register(dumpProfile)
+    profiler.enable()
+
+# timings : stages are written as they end, and printed by crossroad when the script exits
+instrumentation = None
+if args.timings:
+    timings = cd.MemorySink()
+    timings_file = cd.JSONLinesSink("output/"+args.timings)
+    instrumentation = cd.Instrumentation(cd.MultiSink(timings, timings_file))
+    def printTimings():
+        timings_file.close()
+        for crossroad, durations in timings.getDurationsBy("crossroad").items():
+            print("Timings%s : %s"%("" if crossroad is None else " (crossroad %s)"%crossroad, cd.formatDurations(durations)))
+    atexit.register(printTimings)
+
+# time a stage of the script, when timings are asked
+def stage(name):
+    return instrumentation.span(name) if instrumentation else nullcontext()
 
 # use coordinates in parameters if presents, else use the coordinates of this intersection : https://www.openstreetmap.org/#map=19/45.77351/3.09015
 if args.by_coordinates:
@@ -36,59 +98,121 @@ else:
     latitude = 45.77351
     longitude = 3.09015
 
+# in batch mode, the graph is centered on the requested crossroads and its radius covers all of them
+radius = 150
+coordinates = [[latitude, longitude]]
+if args.batch:
+    coordinates = cd.loadCoordinates(args.batch[0])
+    latitude = sum([c[0] for c in coordinates]) / len(coordinates)
+    longitude = sum([c[1] for c in coordinates]) / len(coordinates)
+    radius += max([ox.distance.great_circle_vec(latitude, longitude, c[0], c[1]) for c in coordinates])
+
 #
 # OSM data download
 #
 
-# OSMnx configuration
-ox.settings.useful_tags_way = ox.settings.useful_tags_way + cg.way_tags_to_keep
-ox.settings.useful_tags_node = ox.settings.useful_tags_way + cg.node_tags_to_keep
-
-xmlfile = None
-if args.file :
-    if args.by_coordinates:
-        xmlfile = args.file[0]
-        G = ox.graph_from_xml(args.file[0], simplify=False)
-    else :
-        print("You need to give the coordinate of the main crossroad to proceed.")
-        exit
+# with a file, the ways can be clipped around the coordinates
+bbox = ox.utils_geo.bbox_from_point((latitude, longitude), dist=radius) if args.file and args.clip else None
+tile_cache = TileCache() if not args.file and not args.no_tile_cache else None
+
+# the prepared graph and its segmentation are cached, identified by the input data (content of the file or downloaded
+# tile), the tags kept and the segmentation parameters. Data downloaded without the tiles cache is not cached.
+segmentation_cache = None
+cached = None
+if not args.no_cache and (args.file or tile_cache):
+    segmentation_cache = SegmentationCache()
+    with stage("segmentation_cache"):
+        if args.file:
+            source = {"file" : segmentation_cache.getFileHash(args.file[0]), "bbox" : bbox}
+        else:
+            source = {"tile" : tile_cache.getKey(tile_cache.getTile(latitude, longitude), radius, args.overpass, cg.way_tags_to_keep, cg.node_tags_to_keep)}
+        inputs = segmentation_cache.getInputs(source)
+        cached = segmentation_cache.getSegmentation(inputs)
+    print("Segmentation cache : %s"%("hit" if cached else "miss"))
+
+if cached:
+    G, seg = cached
+    undirected_G = seg.G
 else:
-    G = u.Util.get_osm_data(latitude, longitude, 150, args.overpass, cg.way_tags_to_keep, cg.node_tags_to_keep, tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=".xml", dir="cache"))
+    # OSMnx configuration : the tags to keep are only set while loading the graph
+    xmlfile = None
+    with stage("load_graph"), cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        if args.file :
+            if args.by_coordinates or args.batch:
+                xmlfile = args.file[0]
+                G = cd.graphFromFile(args.file[0], bbox)
+            else :
+                print("You need to give the coordinate of the main crossroad to proceed.")
+                exit
+        elif args.no_tile_cache:
+            G = u.Util.get_osm_data(latitude, longitude, radius, args.overpass, cg.way_tags_to_keep, cg.node_tags_to_keep, tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=".xml", dir="cache"))
+        else:
+            G = tile_cache.getGraph(latitude, longitude, radius, args.overpass, cg.way_tags_to_keep, cg.node_tags_to_keep)
+            print("Tiles cache : %(hits)s hit(s), %(misses)s miss(es)"%tile_cache.getStats())
+
+    # graph segmentation (from https://gitlab.limos.fr/jmafavre/crossroads-segmentation/-/blob/master/src/get-crossroad-description.py)
+
+    with stage("prepare_network"):
+        # prepae network by removing unwanted ways
+        G = cs.Segmentation.prepare_network(G)
+    with stage("segmentation"):
+        # build an undirected version of the graph
+        undirected_G = ox.utils_graph.get_undirected(G)
+        # segment it using topology and semantic
+        seg = cs.Segmentation(undirected_G, **cg.segmentation_parameters)
+        seg.process()
+
+    if segmentation_cache:
+        with stage("segmentation_cache"):
+            segmentation_cache.saveSegmentation(inputs, G, seg)
 
-# graph segmentation (from https://gitlab.limos.fr/jmafavre/crossroads-segmentation/-/blob/master/src/get-crossroad-description.py)
+# batch mode : describe every requested crossroad from the shared graph and segmentation
+if args.batch:
 
-# prepae network by removing unwanted ways
-G = cs.Segmentation.prepare_network(G)
-# build an undirected version of the graph
-undirected_G = ox.utils_graph.get_undirected(G)
-# segment it using topology and semantic
-seg = cs.Segmentation(undirected_G, C0 = 2, C1 = 2, C2 = 4, max_cycle_elements = 10)
-seg.process()
-seg.to_json("data/intersection.json", longitude, latitude)
+    # outputs are written crossroad by crossroad, each one identified by its coordinates
+    outputs = cd.Outputs(["output/"+path for path in args.output or []], resume=args.resume, encoder=json_encoder)
+    done = outputs.getDone()
+    if done:
+        print("Resuming : %s crossroads already described"%len(done))
+        coordinates = [c for c in coordinates if tuple(c) not in done]
+
+    desc = cd.Description()
+    desc.instrumentation = instrumentation
+    spatial_index = SpatialIndex(seg)
+    for c, description in zip(coordinates, desc.computeModels(G, [spatial_index.getCrossroad(c[1], c[0])[0].to_json_data() for c in coordinates])):
+        print("== Carrefour %s %s ==\n"%(c[0], c[1]))
+        print(description["text"])
+        if renderer:
+            with stage("render"):
+                renderer.render(desc.crossroad, getImagePath(c[0], c[1]))
+        with stage("serialization"):
+            outputs.write(c, desc, description)
+
+    outputs.close()
+    exit()
 
 desc = cd.Description()
-desc.computeModel(G, "data/intersection.json")
+desc.instrumentation = instrumentation
+desc.computeModel(G, [cr.to_json_data() for cr in seg.get_crossroad(longitude, latitude)])
 description = desc.generateDescription()
 
 print(description["text"])
 
+if renderer:
+    with stage("render"):
+        renderer.render(desc.crossroad, getImagePath(latitude, longitude))
+
 # File output
 if args.output:
-    filename = args.output[0]
-    extension = filename.split('.')[-1].lower()
-    with open("output/"+args.output[0], "w") as f:
-        content = description["text"]
-        if extension == "geojson":
-            content = desc.getGeoJSON(description["structure"])
-        if extension == "json":
-            content = desc.descriptionToJSON(description["structure"])
-        f.write(content)
-        f.close()
-
-# display crossroad and save image
+    with cd.Outputs(["output/"+path for path in args.output], batch=False, encoder=json_encoder) as outputs:
+        outputs.write([latitude, longitude], desc, description)
+
+# display the segmentation and save image
+if not args.render:
+    exit()
 for edge, color in seg.get_regions_colors_from_crossroad(seg.get_crossroad(longitude, latitude)).items():
     if color == (0.5, 0.5, 0.5, 0.1): undirected_G.remove_edge(edge[0], edge[1])
 cr = seg.get_crossroad(longitude, latitude)
 ec = seg.get_regions_colors_from_crossroad(cr)
 nc = seg.get_nodes_regions_colors_from_crossroad(cr)
-ox.plot.plot_graph(undirected_G, edge_color=ec, node_color=nc, save=True, filepath="output/crossroad.png")
\ No newline at end of file
+ox.plot.plot_graph(undirected_G, edge_color=ec, node_color=nc, save=True, show=False, close=True, filepath="output/crossroad.png")
\ No newline at end of file
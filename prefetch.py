@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import time
+import argparse
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as cg
+from crossroadsdescription.tileCache import TileCache
+from crossroadsdescription.prefetcher import Prefetcher
+
+#
+# Configuration
+#
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Download the data of many crossroads at once to the tiles cache, so that describing them (main.py -c, server.py) does not wait for the downloads. Overlapping tiles are merged into fewer requests, sent concurrently at the rate allowed by the API.")
+parser.add_argument('-b', '--batch', nargs=1, help='CSV (latitude, longitude) or GeoJSON (points) file of the crossroads', type=str, required=True)
+parser.add_argument('-r', '--radius', nargs=1, help='Radius of the data around each crossroad, in meters (default 150, as main.py ; 300 for server.py)', type=float, default=[150])
+parser.add_argument('--tile-size', nargs=1, help='Size of the tiles of the cache, in meters (default %s, as main.py ; 300 for server.py)'%cg.tile_size, type=float, default=[cg.tile_size])
+parser.add_argument('--overpass', help='Use Overpass to download data instead of the OSM api', action='store_true')
+parser.add_argument('-w', '--workers', nargs=1, help='Number of requests sent at the same time (default %s)'%cg.prefetch_workers, type=int, default=[cg.prefetch_workers])
+parser.add_argument('--rate', nargs=1, help='Maximum number of requests per second (default %s for the OSM api, %s for Overpass)'%(cg.prefetch_rate["osm"], cg.prefetch_rate["overpass"]), type=float)
+parser.add_argument('--max-size', nargs=1, help='Maximum size of the areas merged into one request, in meters (default %s)'%cg.prefetch_max_size, type=float, default=[cg.prefetch_max_size])
+parser.add_argument('--url', nargs=1, help='Url of the API, for example the local stand-in started by replay.py (http://localhost:8000/api/0.6 or http://localhost:8000/api for Overpass)', type=str)
+parser.add_argument('--record', nargs=1, help='Record the responses to this folder, to be replayed by replay.py', type=str)
+args = parser.parse_args()
+
+coordinates = cd.loadCoordinates(args.batch[0])
+tile_cache = TileCache(tile_size = args.tile_size[0])
+prefetcher = Prefetcher(args.overpass, args.url[0] if args.url else None, args.workers[0], args.rate[0] if args.rate else None, max_size = args.max_size[0], record = args.record[0] if args.record else None)
+
+start = time.perf_counter()
+tiles, downloaded = tile_cache.prefetch(coordinates, args.radius[0], prefetcher, cg.way_tags_to_keep, cg.node_tags_to_keep)
+stats = prefetcher.getStats()
+
+print("%s crossroads, %s tiles : %s already cached, %s downloaded"%(len(coordinates), tiles, tiles - stats["areas"], downloaded))
+print("%(requests)s requests (%(sent)s sent, %(retries)s retries, %(split)s split, %(failed)s failed), %(bytes)s bytes"%stats)
+print("Done in %.1f s"%(time.perf_counter() - start))
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+import argparse
+from crossroadsdescription.replayServer import ReplayServer
+
+#
+# Configuration
+#
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Local stand-in of the OSM api and Overpass : replays the responses recorded by prefetch.py --record, and answers the other requests from a local OSM file.")
+parser.add_argument('--host', help='Address to listen on (default localhost)', type=str, default="localhost")
+parser.add_argument('-p', '--port', help='Port to listen on (default 8000)', type=int, default=8000)
+parser.add_argument('-d', '--recordings', nargs=1, help='Folder of the recorded responses', type=str)
+parser.add_argument('-f', '--file', nargs=1, help='Answer the requests that were not recorded from this .osm file', type=str)
+parser.add_argument('--rate', nargs=1, help='Maximum number of requests per second, the others being answered 429 (Too many requests)', type=float)
+parser.add_argument('--latency', nargs=1, help='Time taken by each answer, in seconds (default 0)', type=float, default=[0])
+parser.add_argument('--max-nodes', nargs=1, help='Answer 400 (Bad request) to the requests of areas having more nodes, as the OSM api does over 50000 nodes', type=int)
+args = parser.parse_args()
+
+server = ReplayServer((args.host, args.port), args.recordings[0] if args.recordings else None, args.file[0] if args.file else None, args.rate[0] if args.rate else None, args.latency[0], args.max_nodes[0] if args.max_nodes else None)
+
+print("Listening on http://%s:%s (OSM api : http://%s:%s/api/0.6, Overpass : http://%s:%s/api, statistics : /stats)"%(args.host, args.port, args.host, args.port, args.host, args.port))
+server.serve_forever()
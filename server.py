@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import json
+import argparse
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from crossroadsdescription.service import DescriptionService
+from crossroadsdescription.segmentationCache import SegmentationCache
+
+#
+# Configuration
+#
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Serve crossroads descriptions over HTTP, keeping data and segmentations in memory between requests.")
+parser.add_argument('--host', help='Address to listen on (default localhost)', type=str, default="localhost")
+parser.add_argument('-p', '--port', help='Port to listen on (default 8080)', type=int, default=8080)
+parser.add_argument('-f', '--file', nargs=1, help='Serve the crossroads of this .osm file instead of downloading data', type=str)
+parser.add_argument('--overpass', help='Use Overpass to download data instead of the OSM api', action='store_true')
+parser.add_argument('--no-cache', help='Always load, prepare and segment the graphs instead of using the persistent cache of segmentations', action='store_true')
+parser.add_argument('-w', '--workers', help='Maximum number of descriptions computed at the same time (default 4)', type=int, default=4)
+parser.add_argument('-r', '--regions', help='Maximum number of regions kept in memory (default 8)', type=int, default=8)
+args = parser.parse_args()
+
+service = DescriptionService(args.file[0] if args.file else None, args.overpass, max_regions = args.regions, max_concurrency = args.workers, segmentation_cache = None if args.no_cache else SegmentationCache())
+
+content_types = {
+    "text" : "text/plain; charset=utf-8",
+    "json" : "application/json; charset=utf-8",
+    "geojson" : "application/geo+json; charset=utf-8"
+}
+
+#
+# Requests handling
+#
+# GET /describe?lat=45.77351&lon=3.09015&format=text|json|geojson : description of the crossroad nearest to the coordinates
+# GET /stats : state of the service
+#
+
+class Handler(BaseHTTPRequestHandler):
+
+    def send(self, code, content, content_type = "text/plain; charset=utf-8"):
+        content = content.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/stats":
+            return self.send(200, json.dumps(service.getStats()), content_types["json"])
+        if url.path != "/describe":
+            return self.send(404, "Unknown path %s"%url.path)
+        try:
+            latitude = float(params["lat"][0])
+            longitude = float(params["lon"][0])
+        except (KeyError, ValueError):
+            return self.send(400, "lat and lon parameters are required")
+        format = params["format"][0] if "format" in params else "text"
+        if format not in content_types:
+            return self.send(400, "format must be one of %s"%", ".join(content_types.keys()))
+        try:
+            description = service.describe(latitude, longitude, format)
+        except Exception as e:
+            return self.send(500, "Unable to describe this crossroad : %s"%e)
+        self.send(200, description, content_types[format])
+
+print("Listening on http://%s:%s"%(args.host, args.port))
+ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
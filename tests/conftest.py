@@ -0,0 +1,22 @@
+import pytest
+import osmnx as ox
+import crseg.segmentation as cs
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as cg
+
+# Prepared graph of a fixture file and its segmentation, loaded once per file for all the tests
+@pytest.fixture(scope="session")
+def segmented():
+    loaded = {}
+
+    def load(path):
+        if path not in loaded:
+            with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+                G = cd.graphFromFile(path)
+            G = cs.Segmentation.prepare_network(G)
+            seg = cs.Segmentation(ox.utils_graph.get_undirected(G), **cg.segmentation_parameters)
+            seg.process()
+            loaded[path] = (G, seg)
+        return loaded[path]
+
+    return load
@@ -0,0 +1,57 @@
+import os
+import sys
+import glob
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import osmnx as ox
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as cg
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "benchmark", "fixtures", "*.osm")))
+
+# Text and JSON description of a crossroad, by its own Description
+def describe(G, segmentation):
+    desc = cd.Description()
+    desc.computeModel(G, [segmentation])
+    description = desc.generateDescription()
+    return description["text"], json.dumps(desc.getJSONData(description["structure"]), sort_keys=True)
+
+# The crossroads of a graph described by many threads at once are described as one after the other
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_concurrent_descriptions(path, segmented):
+    G, seg = segmented(path)
+    segmentations = [region.to_json_data() for region in seg.regions.values() if region.is_crossroad()]
+    assert segmentations
+    sequential = [describe(G, segmentation) for segmentation in segmentations]
+
+    # threads switching as often as possible, for their descriptions to interleave
+    tasks = segmentations * 8
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            concurrent = list(executor.map(describe, [G] * len(tasks), tasks))
+    finally:
+        sys.setswitchinterval(interval)
+    assert concurrent == sequential * 8
+
+# The tags of the OSMnx settings are only changed while the graph is loaded, also when loading fails
+def test_osmnx_tags_restored():
+    useful_tags_way = list(ox.settings.useful_tags_way)
+    useful_tags_node = list(ox.settings.useful_tags_node)
+
+    def load(path):
+        with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+            assert set(cg.way_tags_to_keep) <= set(ox.settings.useful_tags_way)
+            assert set(cg.node_tags_to_keep) <= set(ox.settings.useful_tags_node)
+            return len(cd.graphFromFile(path))
+
+    with ThreadPoolExecutor(4) as executor:
+        assert all(executor.map(load, FIXTURES * 2))
+    with pytest.raises(ValueError):
+        with cd.osmnxTags(["width"], ["crossing"]):
+            raise ValueError()
+
+    assert ox.settings.useful_tags_way == useful_tags_way
+    assert ox.settings.useful_tags_node == useful_tags_node
@@ -0,0 +1,21 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+# The modules of the package are imported within their budgets, without loading their heavy dependencies (see
+# importtime.py)
+def test_import_time_budgets(tmp_path):
+    output = str(tmp_path / "importtime.json")
+    # the fastest of several imports of each module is compared to its budget
+    result = subprocess.run([sys.executable, "importtime.py", "-n", "7", "-o", output], cwd=ROOT, capture_output=True, text=True)
+    with open(output) as f:
+        results = json.load(f)
+
+    assert results, result.stderr
+    for module, measure in results.items():
+        assert measure["heavy_dependencies"] == [], "%s loads %s"%(module, ", ".join(measure["heavy_dependencies"]))
+        assert measure["time"] <= measure["budget"], "%s is imported in %.1f ms (budget %s ms)"%(module, measure["time"], measure["budget"])
+    assert result.returncode == 0, result.stdout
@@ -0,0 +1,92 @@
+import os
+import math
+import time
+import tempfile
+import threading
+import pytest
+import requests
+import crseg.utils as u
+import crossroadsdescription.config as cg
+from crossroadsdescription.utils import osmnxTags
+from crossroadsdescription.replayServer import ReplayServer
+from crossroadsdescription.prefetcher import Prefetcher
+from crossroadsdescription.tileCache import TileCache
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "benchmark", "fixtures", "islands.osm")
+# crossroads of the fixture, in different tiles of the cache
+COORDINATES = [[45.77351, 3.09015], [45.77441, 3.09015], [45.77261, 3.09015], [45.77351, 3.09144], [45.77351, 3.08886]]
+
+# Local stand-in of the OSM api answering from the fixture
+@pytest.fixture
+def server():
+    server = ReplayServer(("127.0.0.1", 0), osm_file=FIXTURE, rate=5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def getUrl(server):
+    return "http://127.0.0.1:%s/api/0.6"%server.server_address[1]
+
+# Concurrent requests over the rate limit of the API are retried, and every tile ends in the cache
+def test_prefetch_rate_limit(server, tmp_path):
+    cache = TileCache(str(tmp_path))
+    prefetcher = Prefetcher(url=getUrl(server), workers=4, rate=100, max_size=0)
+    tiles, downloaded = cache.prefetch(COORDINATES, 150, prefetcher, cg.way_tags_to_keep, cg.node_tags_to_keep)
+
+    stats = prefetcher.getStats()
+    assert tiles == downloaded == len(COORDINATES)
+    assert stats["requests"] == len(COORDINATES)
+    assert stats["retries"] > 0 and server.stats["limited"] == stats["retries"]
+    assert stats["failed"] == 0
+    for latitude, longitude in COORDINATES:
+        key = cache.getKey(cache.getTile(latitude, longitude), 150, False, cg.way_tags_to_keep, cg.node_tags_to_keep)
+        assert cache.has(key)
+        assert len(cache.load(key)) > 0
+
+    # cached tiles are not downloaded again
+    assert cache.prefetch(COORDINATES, 150, prefetcher, cg.way_tags_to_keep, cg.node_tags_to_keep) == (len(COORDINATES), 0)
+
+# The prefetched graphs are the ones crseg.utils.Util.get_osm_data downloads from the same API, also when they only
+# cover a part of the fixture
+@pytest.mark.parametrize("radius", [150, 20])
+def test_prefetched_graphs(server, tmp_path, monkeypatch, radius):
+    # get_osm_data does not retry the requests over the rate limit
+    server.interval = 0
+    get = requests.get
+    monkeypatch.setattr(u.requests, "get", lambda url, **kwargs: get(url.replace("https://www.openstreetmap.org/api/0.6", getUrl(server)), **kwargs))
+    prefetched = TileCache(str(tmp_path))
+    prefetched.prefetch(COORDINATES, radius, Prefetcher(url=getUrl(server), rate=4), cg.way_tags_to_keep, cg.node_tags_to_keep)
+
+    for latitude, longitude in COORDINATES:
+        tile = prefetched.getTile(latitude, longitude)
+        with osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+            G = u.Util.get_osm_data(tile[0], tile[1], radius + prefetched.tile_size * math.sqrt(2) / 2, False, cg.way_tags_to_keep, cg.node_tags_to_keep, tempfile.NamedTemporaryFile(suffix=".xml", dir=str(tmp_path)))
+        G_prefetched = prefetched.load(prefetched.getKey(tile, radius, False, cg.way_tags_to_keep, cg.node_tags_to_keep))
+        assert list(G_prefetched.nodes(data=True)) == list(G.nodes(data=True))
+        assert list(G_prefetched.edges(keys=True, data=True)) == list(G.edges(keys=True, data=True))
+
+# TileCache.getGraph downloads the graph get_osm_data downloads, without locking the OSMnx settings during the download
+def test_tile_cache_download(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(cg, "osm_api_url", getUrl(server))
+    server.interval = 0
+    server.latency = 1
+    cache = TileCache(str(tmp_path))
+    graphs = []
+    thread = threading.Thread(target=lambda: graphs.append(cache.getGraph(*COORDINATES[0], 20, False, cg.way_tags_to_keep, cg.node_tags_to_keep)))
+    thread.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    with osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        assert time.perf_counter() - start < 0.5
+    thread.join()
+
+    server.latency = 0
+    get = requests.get
+    monkeypatch.setattr(u.requests, "get", lambda url, **kwargs: get(url.replace("https://www.openstreetmap.org/api/0.6", getUrl(server)), **kwargs))
+    tile = cache.getTile(*COORDINATES[0])
+    with osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        G = u.Util.get_osm_data(tile[0], tile[1], 20 + cache.tile_size * math.sqrt(2) / 2, False, cg.way_tags_to_keep, cg.node_tags_to_keep, tempfile.NamedTemporaryFile(suffix=".xml", dir=str(tmp_path)))
+    assert list(graphs[0].nodes(data=True)) == list(G.nodes(data=True))
+    assert list(graphs[0].edges(keys=True, data=True)) == list(G.edges(keys=True, data=True))
@@ -0,0 +1,49 @@
+import os
+import pytest
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as cg
+from crossroadsdescription.tiling import TileScheduler, getTiles
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "benchmark", "fixtures")
+
+# Crossroads of a file described from the segmentation of the whole graph, as (coordinates, text)
+def describeWholeGraph(G, seg):
+    desc = cd.Description()
+    results = []
+    for region in seg.regions.values():
+        if region.is_crossroad():
+            center = seg.G.nodes[region.get_center()]
+            desc.computeModel(G, [region.to_json_data()])
+            results.append(([center["y"], center["x"]], desc.generateDescription()["text"]))
+    return sorted(results)
+
+# The crossroads of the dual carriageway have no inner node : they must not be taken for the same crossroad
+@pytest.mark.parametrize("tile_size", [5000, 100])
+def test_tiles_give_whole_graph_descriptions(tile_size, segmented):
+    path = os.path.join(FIXTURES, "dual_carriageway.osm")
+    with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        extract = cd.NetworkExtract(path)
+    scheduler = TileScheduler(extract.getGraph, {"text"})
+    results = []
+    for tile, crossroads, duration in scheduler.run(getTiles(extract.getBounds(), tile_size)):
+        results += [(coordinates, text) for key, coordinates, text, data, features in crossroads]
+
+    whole = describeWholeGraph(*segmented(path))
+    assert len(whole) == 2
+    assert sorted(results) == whole
+    assert scheduler.stats["errors"] == 0
+
+# A resumed run skips the tiles done, and the tiles whose quarters are all done
+def test_resume_skips_done_tiles():
+    path = os.path.join(FIXTURES, "dual_carriageway.osm")
+    with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        extract = cd.NetworkExtract(path)
+    tiles = getTiles(extract.getBounds(), 100)
+    done = set([tile.getKey() for tile in tiles[1:]] + [quarter.getKey() for quarter in tiles[0].split()])
+    scheduler = TileScheduler(extract.getGraph, {"text"}, done = done)
+    assert list(scheduler.run(tiles)) == []
+    assert scheduler.stats["skipped"] == len(tiles)
+
+    scheduler = TileScheduler(extract.getGraph, {"text"}, done = set([tile.getKey() for tile in tiles[1:]]))
+    assert [tile.getKey() for tile, crossroads, duration in scheduler.run(tiles)] == [tiles[0].getKey()]
+    assert scheduler.stats["skipped"] == len(tiles) - 1
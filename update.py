@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import time
+import argparse
+import osmnx as ox
+import crseg.segmentation as cs
+import crossroadsdescription.description as cd
+import crossroadsdescription.config as cg
+from crossroadsdescription.segmentationCache import SegmentationCache
+from crossroadsdescription.updates import IncrementalDescriber, readChange
+
+#
+# Configuration
+#
+
+# configure arg parser
+parser = argparse.ArgumentParser(description="Keep the descriptions of a list of crossroads up to date from OSM change files, only describing again the crossroads that changed.")
+parser.add_argument('-s', '--state', nargs=1, help='State of the updates : prepared graph of the region and index of the crossroads (created with -f and -b, then updated by -c)', type=str, required=True)
+parser.add_argument('-f', '--file', nargs=1, help='Create the state from this .osm file (possibly compressed in .bz2 or .gz, or .osm.pbf if pyosmium is installed)', type=str)
+parser.add_argument('-b', '--batch', nargs=1, help='With -f, crossroads to describe, listed in a CSV (latitude, longitude) or GeoJSON (points) file', type=str)
+parser.add_argument('-c', '--changes', nargs='+', help='OSM change files (.osc, possibly compressed in .bz2 or .gz) to apply, in order', type=str)
+parser.add_argument('-o', '--output', nargs=1, help='NDJSON file of the descriptions (one JSON description per line, with its coordinates), written by -f and updated by -c', type=str, required=True)
+parser.add_argument('--no-cache', help='Always load, prepare and segment the graph instead of using the persistent cache of segmentations', action='store_true')
+args = parser.parse_args()
+
+if bool(args.file) != bool(args.batch) or not (args.file or args.changes):
+    print("Give either a file and crossroads (-f and -b) to create the state, or change files (-c) to apply.")
+    exit()
+
+# Write the records to the output, atomically
+def writeRecords(records):
+    tmp_path = args.output[0] + ".tmp"
+    with cd.NDJSONWriter(tmp_path) as writer:
+        writer.writeAll(records)
+    os.replace(tmp_path, args.output[0])
+
+#
+# State creation : every crossroad is described from a segmentation of the whole graph, as by main.py in batch mode
+#
+
+if args.file:
+    start = time.perf_counter()
+    segmentation_cache = None if args.no_cache else SegmentationCache()
+    cached = None
+    if segmentation_cache:
+        inputs = segmentation_cache.getInputs({"file" : segmentation_cache.getFileHash(args.file[0]), "bbox" : None})
+        cached = segmentation_cache.getSegmentation(inputs)
+    if cached:
+        G, seg = cached
+    else:
+        with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+            G = cd.graphFromFile(args.file[0])
+        G = cs.Segmentation.prepare_network(G)
+        seg = cs.Segmentation(ox.utils_graph.get_undirected(G), **cg.segmentation_parameters)
+        seg.process()
+        if segmentation_cache:
+            segmentation_cache.saveSegmentation(inputs, G, seg)
+
+    describer = IncrementalDescriber(G)
+    writeRecords([record for key, record in describer.describeAll(cd.loadCoordinates(args.batch[0]), seg)])
+    describer.save(args.state[0])
+    print("%s crossroads described in %.2f s"%(len(describer.index), time.perf_counter() - start))
+
+#
+# Updates : the crossroads using the changed elements are described again
+#
+
+if args.changes:
+    start = time.perf_counter()
+    if not args.file:
+        describer = IncrementalDescriber.load(args.state[0])
+
+    records = {}
+    with open(args.output[0]) as f:
+        for line in f:
+            record = json.loads(line)
+            records[tuple(record["coordinates"])] = record
+
+    # the tags of the changed elements are read as when loading the graph
+    with cd.osmnxTags(cg.way_tags_to_keep, cg.node_tags_to_keep):
+        for path in args.changes:
+            for key, record in describer.applyChange(readChange(path)):
+                if record is None:
+                    records.pop(key, None)
+                else:
+                    records[key] = record
+            stats = describer.stats
+            print("%s : %s node(s) and %s way(s) changed, %s crossroad(s) described again with new tags, %s segmented again (%s removed)"%(path, stats["nodes"], stats["ways"], stats["tags_only"], stats["segmented_again"], stats["removed"]))
+
+    writeRecords(records.values())
+    describer.save(args.state[0])
+    print("Updated in %.2f s"%(time.perf_counter() - start))